@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-18 23:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_alter_companyprofile_ice_number_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='companyprofile',
+            index=models.Index(fields=['updated_at', 'id'], name='accounts_co_updated_663d05_idx'),
+        ),
+    ]
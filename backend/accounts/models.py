@@ -48,6 +48,9 @@ class CompanyProfile(models.Model):
     class Meta:
         verbose_name = "Profil Entreprise"
         verbose_name_plural = "Profils Entreprises"
+        indexes = [
+            models.Index(fields=['updated_at', 'id']),
+        ]
 
     def __str__(self):
         return self.business_name
@@ -102,8 +105,10 @@ class Employee(models.Model):
                 certification_request=certification_request,
                 number=f"CERT-{certification_request.id}-{timezone.now().year}",
                 treatment_type=certification_request.treatment_type,
-                pdf_file=None  # Sera généré plus tard
+                pdf_file=None  # Rendu en arrière-plan après validation de la transaction
             )
+            from certifications.tasks import enqueue_certificate_render
+            enqueue_certificate_render(certificat.id)
             return certificat
         return None
     
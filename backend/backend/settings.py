@@ -136,6 +136,40 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+STORAGES = {
+    # Disque local avec URL signées servies par l'application (remplaçant local du stockage S3)
+    'default': {'BACKEND': 'certifications.object_storage.LocalObjectStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # Documents téléversés : un seul exemplaire par contenu (SHA-256), partagé entre demandes et archives
+    'documents': {'BACKEND': 'certifications.storage.ContentAddressedStorage'},
+}
+
+# Stockage objet compatible S3 (nécessite boto3) : utilisé à la place de MEDIA_ROOT si un bucket est défini
+OBJECT_STORAGE = {
+    'BUCKET': os.environ.get('OBJECT_STORAGE_BUCKET', ''),
+    'ENDPOINT_URL': os.environ.get('OBJECT_STORAGE_ENDPOINT_URL') or None,  # MinIO, Ceph... ; vide pour AWS
+    'REGION': os.environ.get('OBJECT_STORAGE_REGION') or None,
+    'ACCESS_KEY': os.environ.get('OBJECT_STORAGE_ACCESS_KEY') or None,
+    'SECRET_KEY': os.environ.get('OBJECT_STORAGE_SECRET_KEY') or None,
+    'PREFIX': os.environ.get('OBJECT_STORAGE_PREFIX', ''),
+}
+if OBJECT_STORAGE['BUCKET']:
+    STORAGES['default'] = {'BACKEND': 'certifications.object_storage.S3Storage', 'OPTIONS': {'alias': 'default'}}
+    STORAGES['documents'] = {
+        'BACKEND': 'certifications.storage.ContentAddressedObjectStorage', 'OPTIONS': {'alias': 'documents'}
+    }
+# Durée de validité des URL signées : téléchargements et dépôts directs (secondes)
+PRESIGNED_URL_EXPIRY = 300
+PRESIGNED_UPLOAD_EXPIRY = 3600
+
+# Cache partagé entre les processus (Redis, nécessite redis) : sans CACHE_URL, cache mémoire propre
+# à chaque processus, et les données publiques de vérification ne sont gardées que quelques secondes
+CACHE_URL = os.environ.get('CACHE_URL', '')
+if CACHE_URL:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}
+    }
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -160,6 +194,9 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
 ]
+# En-têtes des téléversements fractionnés (position et empreinte des fragments)
+from corsheaders.defaults import default_headers
+CORS_ALLOW_HEADERS = [*default_headers, 'content-range', 'x-chunk-sha256']
 
 # JWT settings
 from datetime import timedelta
@@ -167,3 +204,57 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
 }
+
+# Téléversements fractionnés des documents justificatifs (octets)
+UPLOAD_MAX_SIZE = 500 * 1024 * 1024
+UPLOAD_CHUNK_MAX_SIZE = 8 * 1024 * 1024
+# Taille maximale par type de contenu détecté (les autres types : UPLOAD_MAX_SIZE)
+UPLOAD_SIZE_LIMITS = {
+    'image/jpeg': 20 * 1024 * 1024,
+    'image/png': 20 * 1024 * 1024,
+    'application/msword': 50 * 1024 * 1024,
+    'application/vnd.ms-excel': 50 * 1024 * 1024,
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': 50 * 1024 * 1024,
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': 50 * 1024 * 1024,
+}
+# Contrôle du contenu (signature, taille, empreinte) pendant la réception des fichiers
+FILE_UPLOAD_HANDLERS = [
+    'certifications.upload_handlers.ValidatingMemoryFileUploadHandler',
+    'certifications.upload_handlers.ValidatingTemporaryFileUploadHandler',
+]
+# Écritures simultanées dans le stockage lors des envois de plusieurs documents
+UPLOAD_WRITE_WORKERS = 4
+# Stockage froid : archives compressées des documents des demandes clôturées, hors de MEDIA_ROOT
+COLD_STORAGE_ROOT = os.path.join(BASE_DIR, 'cold_storage')
+COLD_STORAGE_AFTER_MONTHS = 12
+COLD_STORAGE_PACK_MAX_SIZE = 1024 * 1024 * 1024
+
+# Aperçus des documents justificatifs : plus grand côté (pixels) et durée de cache navigateur (secondes)
+DOCUMENT_PREVIEW_MAX_SIZE = 480
+DOCUMENT_PREVIEW_CACHE_SECONDS = 365 * 24 * 3600
+
+# Rendu des certificats PDF en arrière-plan
+CERTIFICATE_RENDER_WORKERS = 2
+# Encodage ASCII85 des flux PDF par ReportLab (réglage global du processus, appliqué au démarrage
+# par certifications.apps) : désactivé, les PDF sont servis en HTTP et non insérés dans du texte
+# 7 bits, et les flux compressés restent binaires, environ 25 % plus petits (certificats, rapports)
+REPORTLAB_USE_A85 = False
+# Nombre maximal de certificats par téléchargement groupé (autorités)
+CERTIFICATE_BULK_DOWNLOAD_LIMIT = 1000
+
+# Flux de notifications (Server-Sent Events) : courtier en mémoire (un seul processus) ou
+# 'certifications.notification_stream.RedisBroker' (plusieurs processus ou serveurs, nécessite redis)
+NOTIFICATION_BROKER = 'certifications.notification_stream.LocalBroker'
+NOTIFICATION_BROKER_URL = os.environ.get('NOTIFICATION_BROKER_URL', 'redis://localhost:6379/0')
+# Le flux est servi sans thread bloqué en ASGI (backend.asgi, avec uvicorn ou daphne) ; en WSGI, il
+# n'est servi que par un serveur multithread (runserver, gunicorn --threads), un thread par onglet ouvert
+# Validité du ticket de connexion, intervalle des keep-alive et durée de vie d'une connexion (secondes)
+NOTIFICATION_STREAM_TICKET_AGE = 60
+NOTIFICATION_STREAM_KEEPALIVE = 20
+NOTIFICATION_STREAM_MAX_AGE = 300
+
+# Envoi des fichiers protégés : None (FileResponse + Range), 'x-accel-redirect' (nginx), 'x-sendfile' (Apache)
+# ou 'presigned' (redirection vers une URL signée du stockage, pour un stockage objet)
+FILE_SERVING_BACKEND = None
+# Emplacement interne nginx correspondant à MEDIA_ROOT (location ... { internal; alias MEDIA_ROOT; })
+FILE_SERVING_INTERNAL_URL = '/protected-media/'
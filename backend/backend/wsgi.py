@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Vérification publique des certificats servie avant Django (route la plus sollicitée)
+from certifications.verification import VerificationFastPath  # noqa: E402
+
+application = VerificationFastPath(application)
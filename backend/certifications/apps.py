@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CertificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'certifications'
+
+    def ready(self):
+        from django.conf import settings
+        from reportlab import rl_config
+        from . import signals  # noqa: F401
+
+        # ReportLab ne permet pas ce réglage par document : il s'applique à tout le processus
+        rl_config.useA85 = int(getattr(settings, 'REPORTLAB_USE_A85', False))
@@ -0,0 +1,118 @@
+"""Téléchargement groupé des certificats (PDF fusionné ou archive ZIP)"""
+import json
+from concurrent.futures import as_completed
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from .certificate_generator import CertificateGenerator, certificate_render_key
+from .models import Certificate
+from .streaming import iter_file
+from .tasks import get_executor, render_certificate
+
+
+def filter_certificates(queryset, params):
+    """Appliquer les filtres du téléchargement groupé (type, période d'émission, entreprises)"""
+    treatment_type = params.get('treatment_type')
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    companies = params.get('companies')
+
+    if treatment_type:
+        queryset = queryset.filter(treatment_type=treatment_type)
+    if start_date:
+        queryset = queryset.filter(issue_date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(issue_date__lte=end_date)
+    if companies:
+        company_ids = [int(value) for value in companies.split(',') if value.strip()]
+        queryset = queryset.filter(certification_request__company_id__in=company_ids)
+    return queryset.order_by('issue_date', 'pk')
+
+
+def is_rendered(certificate):
+    """Vérifier si le PDF stocké correspond aux données actuelles du certificat"""
+    return bool(
+        certificate.pdf_file
+        and certificate.render_key == certificate_render_key(certificate)
+        and certificate.pdf_file.storage.exists(certificate.pdf_file.name)
+    )
+
+
+def _certificate_member(certificate, entry, missing):
+    """Membre ZIP pour le PDF stocké d'un certificat, ou None s'il est illisible"""
+    try:
+        file = certificate.pdf_file.open('rb')
+    except (OSError, ValueError):
+        missing.append(entry)
+        return None
+    entry['path'] = f'certificat_{certificate.number}.pdf'
+    return (entry['path'], iter_file(file), False)
+
+
+def iter_certificate_bundle(certificates):
+    """Membres d'une archive de certificats PDF suivis d'un manifest.json
+
+    Les PDF déjà rendus et à jour sont envoyés immédiatement pendant que les
+    manquants sont rendus en parallèle sur le pool de rendu ; ils sont ajoutés à
+    l'archive au fur et à mesure qu'ils sont prêts.
+    """
+    manifest = {'generated_at': timezone.now().isoformat(), 'certificates': [], 'missing': []}
+    missing = manifest['missing']
+
+    pending = []
+    ready = []
+    for certificate in certificates:
+        (ready if is_rendered(certificate) else pending).append(certificate)
+
+    executor = get_executor()
+    futures = {
+        executor.submit(render_certificate, certificate.id): certificate
+        for certificate in pending
+    }
+
+    def describe(certificate, rendered):
+        return {
+            'number': certificate.number,
+            'company': certificate.certification_request.company.business_name,
+            'ice': certificate.certification_request.company.ice_number,
+            'treatment_type': certificate.treatment_type,
+            'issue_date': certificate.issue_date,
+            'expiry_date': certificate.expiry_date,
+            'status': certificate.status,
+            'rendered_on_demand': rendered,
+        }
+
+    for certificate in ready:
+        entry = describe(certificate, False)
+        member = _certificate_member(certificate, entry, missing)
+        if member:
+            manifest['certificates'].append(entry)
+            yield member
+
+    for future in as_completed(futures):
+        certificate = Certificate.objects.select_related(
+            'certification_request__company'
+        ).filter(id=futures[future].id).first()
+        if certificate is None:
+            continue
+        entry = describe(certificate, True)
+        if not is_rendered(certificate):
+            missing.append(entry)
+            continue
+        member = _certificate_member(certificate, entry, missing)
+        if member:
+            manifest['certificates'].append(entry)
+            yield member
+
+    def manifest_chunks():
+        yield json.dumps(manifest, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2).encode('utf-8')
+
+    yield ('manifest.json', manifest_chunks(), True)
+
+
+def merged_pdf_chunks(certificates):
+    """Un seul PDF, une page par certificat, envoyé par blocs
+
+    Les pages sont rendues en une passe avec la partie fixe partagée entre elles,
+    ce qui est plus rapide et plus compact que de concaténer les PDF individuels.
+    """
+    return iter_file(CertificateGenerator().generate_certificates_pdf(certificates))
@@ -0,0 +1,130 @@
+"""Archives ZIP regroupant tous les documents d'une ou plusieurs demandes"""
+import hashlib
+import json
+import os
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from .storage import is_content_addressed
+from .streaming import iter_file
+
+# Formats déjà compressés : stockés tels quels dans l'archive
+COMPRESSED_EXTENSIONS = {
+    '.pdf', '.jpg', '.jpeg', '.png', '.gif', '.webp',
+    '.docx', '.xlsx', '.pptx', '.zip', '.gz', '.7z', '.rar',
+}
+
+
+def should_compress(name):
+    """Vérifier si un fichier gagne à être compressé dans l'archive"""
+    return os.path.splitext(name)[1].lower() not in COMPRESSED_EXTENSIONS
+
+
+def entry_name(name, stored_name, used):
+    """Nom d'entrée lisible et unique dans un dossier de l'archive
+
+    Le nom affiché du document est conservé (le stockage ne garde que l'empreinte),
+    complété par l'extension du fichier stocké ; les homonymes reçoivent un suffixe « (2) ».
+    """
+    extension = os.path.splitext(stored_name)[1].lower()
+    name = os.path.basename((name or '').replace('\\', '/')).strip().strip('.') or 'document'
+    stem, current = os.path.splitext(name)
+    if current.lower() != extension:
+        stem = name
+    candidate = f'{stem}{extension}'
+    counter = 2
+    while candidate.lower() in used:
+        candidate = f'{stem} ({counter}){extension}'
+        counter += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def _tracked(chunks, entry):
+    """Relayer les blocs d'un fichier en calculant sa taille et son empreinte SHA-256"""
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in chunks:
+        digest.update(chunk)
+        size += len(chunk)
+        yield chunk
+    entry['size'] = size
+    entry['sha256'] = digest.hexdigest()
+
+
+def _file_member(field_file, path, entry, missing):
+    """Ouvrir un fichier stocké ; renvoie le membre ZIP ou None s'il est introuvable"""
+    try:
+        file = field_file.open('rb')
+    except (OSError, ValueError):
+        missing.append({'path': path, 'type': entry['type']})
+        return None
+    entry['path'] = path
+    return (path, _tracked(iter_file(file), entry), should_compress(path))
+
+
+def iter_request_bundle(certification_requests):
+    """Membres d'une archive de demandes : document principal, documents justificatifs,
+    certificat PDF puis un manifest.json décrivant le contenu
+
+    Les fichiers sont lus par blocs au fil de l'écriture de l'archive ; l'empreinte
+    et la taille de chaque fichier sont reportées dans le manifeste, écrit en dernier.
+    """
+    manifest = {'generated_at': timezone.now().isoformat(), 'requests': [], 'missing': []}
+    missing = manifest['missing']
+
+    for certification_request in certification_requests:
+        folder = f'demande_{certification_request.id}'
+        files = []
+        used = set()
+        manifest['requests'].append({
+            'id': certification_request.id,
+            'company': certification_request.company.business_name,
+            'ice': certification_request.company.ice_number,
+            'treatment_type': certification_request.treatment_type,
+            'status': certification_request.status,
+            'submission_date': certification_request.submission_date,
+            'files': files,
+        })
+
+        if certification_request.supporting_documents:
+            stored_name = certification_request.supporting_documents.name
+            entry = {'type': 'main', 'name': entry_name('document_principal', stored_name, set())}
+            member = _file_member(
+                certification_request.supporting_documents,
+                f'{folder}/principal/{entry["name"]}', entry, missing
+            )
+            if member:
+                files.append(entry)
+                yield member
+
+        for document in certification_request.additional_documents.all():
+            name = document.name
+            if is_content_addressed(document.file.name) and name == os.path.basename(document.file.name):
+                # Nom par défaut repris de l'empreinte : aucun nom d'origine à restituer
+                name = f'document_{document.id}'
+            entry = {
+                'type': 'additional',
+                'id': document.id,
+                'name': entry_name(name, document.file.name, used),
+                'document_type': document.document_type,
+            }
+            member = _file_member(document.file, f'{folder}/documents/{entry["name"]}', entry, missing)
+            if member:
+                files.append(entry)
+                yield member
+
+        certificate = getattr(certification_request, 'certificate', None)
+        if certificate is not None and certificate.pdf_file:
+            entry = {'type': 'certificate', 'number': certificate.number, 'name': os.path.basename(certificate.pdf_file.name)}
+            member = _file_member(
+                certificate.pdf_file,
+                f'{folder}/certificat_{certificate.number}.pdf', entry, missing
+            )
+            if member:
+                files.append(entry)
+                yield member
+
+    def manifest_chunks():
+        yield json.dumps(manifest, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2).encode('utf-8')
+
+    yield ('manifest.json', manifest_chunks(), True)
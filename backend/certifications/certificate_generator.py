@@ -1,8 +1,9 @@
 import os
 import io
+import hashlib
+import json
 from datetime import datetime, timedelta
 from django.conf import settings
-from django.core.files.base import ContentFile
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
@@ -14,6 +15,56 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
 import arabic_reshaper
 from bidi.algorithm import get_display
+from .storage import sharded_name
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # Sans pypdf (requirements.txt), la partie fixe est redessinée à chaque document
+    PdfReader = None
+
+# À incrémenter à chaque modification du rendu : invalide tous les PDF en cache
+TEMPLATE_VERSION = '1'
+
+def certificate_render_key(certificate):
+    """Clé de cache du PDF : empreinte des champs imprimés sur le certificat et de la version du gabarit"""
+    company = certificate.certification_request.company
+    fields = [
+        TEMPLATE_VERSION,
+        certificate.number,
+        company.business_name,
+        company.ice_number,
+        company.address,
+        certificate.treatment_type,
+        certificate.issue_date.isoformat(),
+        certificate.expiry_date.isoformat(),
+    ]
+    return hashlib.sha256(json.dumps(fields, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def certificate_cache_path(render_key):
+    """Emplacement du PDF rendu pour une clé de cache"""
+    return sharded_name('certificates/rendered/', render_key, '.pdf')
+
+
+def release_certificate_pdf(storage, name):
+    """Supprimer un ancien PDF de certificat qui n'est plus désigné par aucun certificat ni archive"""
+    from .models import Certificate, DocumentArchive
+
+    if Certificate.objects.filter(pdf_file=name).exists() or DocumentArchive.objects.filter(file_path=name).exists():
+        return
+    storage.delete(name)
+
+# Nom du formulaire PDF (XObject) contenant la partie fixe du certificat
+STATIC_FORM_NAME = 'certificate_static'
+
+INFO_LABELS = [
+    "Entreprise:",
+    "ICE:",
+    "Adresse:",
+    "Type de traitement:",
+    "Numéro de certificat:",
+    "Date d'émission:",
+    "Date d'expiration:",
+]
 
 class CertificateGenerator:
     def __init__(self):
@@ -26,11 +77,12 @@ class CertificateGenerator:
         # Créer un buffer pour le PDF
         buffer = io.BytesIO()
         
-        # Créer le canvas
-        c = canvas.Canvas(buffer, pagesize=A4)
+        # Créer le canvas (flux de contenu compressés)
+        c = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
         
         # Dessiner le certificat
-        self._draw_certificate(c, certificate)
+        self._draw_static(c)
+        self._draw_certificate_fields(c, certificate)
         
         # Finaliser le PDF
         c.save()
@@ -38,43 +90,100 @@ class CertificateGenerator:
         
         return buffer
     
-    def _draw_certificate(self, c, certificate):
-        """Dessine le contenu du certificat"""
+    def generate_certificates_pdf(self, certificates):
+        """Génère un seul PDF contenant plusieurs certificats (une page chacun)
+        
+        La partie fixe n'est incluse qu'une fois dans le document, dans un formulaire
+        PDF (XObject) que chaque page référence.
+        """
+        buffer = io.BytesIO()
+        c = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+        c.beginForm(STATIC_FORM_NAME)
+        self._draw_static(c)
+        c.endForm()
+        for certificate in certificates:
+            c.doForm(STATIC_FORM_NAME)
+            self._draw_certificate_fields(c, certificate)
+            c.showPage()
+        c.save()
+        buffer.seek(0)
+        return buffer
+    
+    def _static_layer_code(self):
+        """Flux PDF de la partie fixe et ses polices, rendus une fois par processus puis réutilisés tels quels"""
+        cls = type(self)
+        if cls.__dict__.get('_static_code') is None:
+            buffer = io.BytesIO()
+            c = canvas.Canvas(buffer, pagesize=A4, pageCompression=0)
+            self._draw_static_layer(c)
+            c.save()
+            page = PdfReader(buffer).pages[0]
+            fonts = page['/Resources']['/Font']
+            # Polices dans l'ordre de leurs noms internes (/F1, /F2...) utilisés par le flux
+            font_names = [fonts[key]['/BaseFont'][1:] for key in sorted(fonts, key=lambda key: int(key[2:]))]
+            cls._static_code = (font_names, page.get_contents().get_data().decode('latin-1'))
+        return cls._static_code
+    
+    def _draw_static(self, c):
+        """Dessine la partie fixe (avant tout autre dessin du document) : flux mis en cache, ou dessin complet sans pypdf"""
+        if PdfReader is None:
+            self._draw_static_layer(c)
+            return
+        font_names, code = self._static_layer_code()
+        # Enregistrées dans le même ordre, les polices reçoivent les mêmes noms internes que dans le flux
+        for font_name in font_names:
+            c.setFont(font_name, 10)
+        # q/Q : l'état graphique suivi par le canvas reste valable après le flux inséré
+        c.addLiteral(f'q\n{code}\nQ')
+    
+    def _layout(self):
+        """Positions verticales des blocs du certificat"""
+        y_pos = self.height - 3*cm
+        header_y = y_pos
+        y_pos -= 4*cm
+        title_y = y_pos
+        y_pos -= 3*cm
+        subtitle_y = y_pos
+        y_pos -= 2*cm
+        text_y = y_pos
+        y_pos -= 4*0.5*cm + 3*cm
+        return header_y, title_y, subtitle_y, text_y, y_pos
+    
+    def _draw_static_layer(self, c):
+        """Dessine tout ce qui ne dépend pas du certificat"""
+        header_y, title_y, subtitle_y, text_y, info_y = self._layout()
         
         # Couleurs
         green_color = Color(0.2, 0.7, 0.3)  # Vert pour la bordure
-        dark_gray = Color(0.2, 0.2, 0.2)   # Gris foncé pour le texte
         
         # Dessiner la bordure verte
         c.setStrokeColor(green_color)
         c.setLineWidth(4)
         c.rect(self.margin, self.margin, self.width - 2*self.margin, self.height - 2*self.margin)
         
-        # Position Y de départ
-        y_pos = self.height - 3*cm
-        
         # En-tête - Logo et texte ministère
-        self._draw_header(c, y_pos)
-        y_pos -= 4*cm
+        self._draw_header(c, header_y)
         
         # Titre principal
-        self._draw_title(c, y_pos)
-        y_pos -= 3*cm
+        self._draw_title(c, title_y)
         
         # Sous-titre environnemental
-        self._draw_subtitle(c, y_pos)
-        y_pos -= 2*cm
+        self._draw_subtitle(c, subtitle_y)
         
         # Texte de certification
-        y_pos = self._draw_certification_text(c, y_pos, certificate)
-        y_pos -= 3*cm
+        self._draw_certification_text(c, text_y, None)
         
-        # Informations du certificat
-        y_pos = self._draw_certificate_info(c, y_pos, certificate)
+        # Libellés du tableau d'informations
+        self._draw_certificate_info_labels(c, info_y)
         
         # Signatures en bas
         self._draw_signatures(c)
     
+    def _draw_certificate_fields(self, c, certificate):
+        """Dessine les champs propres au certificat"""
+        info_y = self._layout()[-1]
+        self._draw_certificate_info(c, info_y, certificate)
+    
     def _draw_header(self, c, y_pos):
         """Dessine l'en-tête avec le logo et les textes ministère"""
         
@@ -84,7 +193,7 @@ class CertificateGenerator:
         
         # Royaume du Maroc en arabe (simulé)
         arabic_text = "المملكة المغربية"
-        c.drawCentredText(self.width/2, y_pos + 1*cm, arabic_text)
+        c.drawCentredString(self.width/2, y_pos + 1*cm, arabic_text)
         
         # Texte français à gauche
         c.setFont("Helvetica", 10)
@@ -113,13 +222,13 @@ class CertificateGenerator:
         """Dessine le titre principal"""
         c.setFont("Helvetica-Bold", 32)
         c.setFillColor(Color(0.3, 0.3, 0.3))
-        c.drawCentredText(self.width/2, y_pos, "CERTIFICAT DE CONFORMITÉ")
+        c.drawCentredString(self.width/2, y_pos, "CERTIFICAT DE CONFORMITÉ")
     
     def _draw_subtitle(self, c, y_pos):
         """Dessine le sous-titre environnemental"""
         c.setFont("Helvetica-Bold", 24)
         c.setFillColor(Color(0.4, 0.4, 0.4))
-        c.drawCentredText(self.width/2, y_pos, "Environnementale DEEE")
+        c.drawCentredString(self.width/2, y_pos, "Environnementale DEEE")
     
     def _draw_certification_text(self, c, y_pos, certificate):
         """Dessine le texte de certification"""
@@ -135,51 +244,54 @@ class CertificateGenerator:
         ]
         
         for i, line in enumerate(text_lines):
-            c.drawCentredText(self.width/2, y_pos - i*0.5*cm, line)
+            c.drawCentredString(self.width/2, y_pos - i*0.5*cm, line)
         
         return y_pos - len(text_lines)*0.5*cm
     
+    def _info_table_origin(self, y_pos):
+        """Position du tableau d'informations"""
+        return self.width/2 - 6*cm, y_pos - 1*cm
+    
+    def _draw_certificate_info_labels(self, c, y_pos):
+        """Dessine les libellés du tableau d'informations"""
+        table_x, table_y = self._info_table_origin(y_pos)
+        row_height = 0.6*cm
+        
+        # Label (gras)
+        c.setFont("Helvetica-Bold", 10)
+        c.setFillColor(black)
+        for i, label in enumerate(INFO_LABELS):
+            c.drawString(table_x, table_y - i * row_height, label)
+    
     def _draw_certificate_info(self, c, y_pos, certificate):
-        """Dessine les informations du certificat dans un tableau"""
+        """Dessine les valeurs du tableau d'informations du certificat"""
         
         # Informations de l'entreprise
         company = certificate.certification_request.company
         
-        # Créer un tableau avec les informations
-        data = [
-            ["Entreprise:", company.business_name],
-            ["ICE:", company.ice_number],
-            ["Adresse:", company.address],
-            ["Type de traitement:", certificate.treatment_type.upper()],
-            ["Numéro de certificat:", certificate.number],
-            ["Date d'émission:", certificate.issue_date.strftime("%d/%m/%Y")],
-            ["Date d'expiration:", certificate.expiry_date.strftime("%d/%m/%Y")]
+        values = [
+            company.business_name,
+            company.ice_number,
+            company.address,
+            certificate.treatment_type.upper(),
+            certificate.number,
+            certificate.issue_date.strftime("%d/%m/%Y"),
+            certificate.expiry_date.strftime("%d/%m/%Y")
         ]
         
         # Position du tableau
-        table_x = self.width/2 - 6*cm
-        table_y = y_pos - 1*cm
-        
-        # Dessiner le tableau manuellement
-        c.setFont("Helvetica-Bold", 10)
-        c.setFillColor(black)
+        table_x, table_y = self._info_table_origin(y_pos)
         
         row_height = 0.6*cm
         col1_width = 4*cm
-        col2_width = 8*cm
-        
-        for i, (label, value) in enumerate(data):
-            y = table_y - i * row_height
-            
-            # Label (gras)
-            c.setFont("Helvetica-Bold", 10)
-            c.drawString(table_x, y, label)
-            
-            # Valeur (normal)
-            c.setFont("Helvetica", 10)
-            c.drawString(table_x + col1_width, y, str(value))
-        
-        return table_y - len(data) * row_height
+        
+        # Valeur (normal)
+        c.setFont("Helvetica", 10)
+        c.setFillColor(black)
+        for i, value in enumerate(values):
+            c.drawString(table_x + col1_width, table_y - i * row_height, str(value))
+        
+        return table_y - len(values) * row_height
     
     def _draw_signatures(self, c):
         """Dessine les zones de signature"""
@@ -192,16 +304,16 @@ class CertificateGenerator:
         # Signature gauche - Le Ministre
         c.setFont("Helvetica-Bold", 12)
         c.setFillColor(black)
-        c.drawCentredText(left_sig_x, sig_y + 1*cm, "Le Ministre")
+        c.drawCentredString(left_sig_x, sig_y + 1*cm, "Le Ministre")
         
         # Ligne de signature gauche
         c.line(left_sig_x - 2*cm, sig_y, left_sig_x + 2*cm, sig_y)
         
         # Nom du ministre
         c.setFont("Helvetica", 10)
-        c.drawCentredText(left_sig_x, sig_y - 0.5*cm, "Dr. Leila BENKHIANE")
-        c.drawCentredText(left_sig_x, sig_y - 0.8*cm, "Directrice de l'Environnement")
-        c.drawCentredText(left_sig_x, sig_y - 1.1*cm, "Durable")
+        c.drawCentredString(left_sig_x, sig_y - 0.5*cm, "Dr. Leila BENKHIANE")
+        c.drawCentredString(left_sig_x, sig_y - 0.8*cm, "Directrice de l'Environnement")
+        c.drawCentredString(left_sig_x, sig_y - 1.1*cm, "Durable")
         
         # Sceau ministériel (simulé)
         c.setStrokeColor(colors.blue)
@@ -209,21 +321,21 @@ class CertificateGenerator:
         c.circle(left_sig_x, sig_y + 0.3*cm, 0.8*cm, fill=1)
         c.setFont("Helvetica-Bold", 8)
         c.setFillColor(colors.blue)
-        c.drawCentredText(left_sig_x, sig_y + 0.3*cm, "SCEAU")
-        c.drawCentredText(left_sig_x, sig_y + 0.1*cm, "OFFICIEL")
+        c.drawCentredString(left_sig_x, sig_y + 0.3*cm, "SCEAU")
+        c.drawCentredString(left_sig_x, sig_y + 0.1*cm, "OFFICIEL")
         
         # Signature droite - Autorité de Certification
         c.setFont("Helvetica-Bold", 12)
         c.setFillColor(black)
-        c.drawCentredText(right_sig_x, sig_y + 1*cm, "Autorité de Certification")
+        c.drawCentredString(right_sig_x, sig_y + 1*cm, "Autorité de Certification")
         
         # Ligne de signature droite
         c.line(right_sig_x - 2*cm, sig_y, right_sig_x + 2*cm, sig_y)
         
         # Nom de l'autorité
         c.setFont("Helvetica", 10)
-        c.drawCentredText(right_sig_x, sig_y - 0.5*cm, "Ing. Hiba Labjouji")
-        c.drawCentredText(right_sig_x, sig_y - 0.8*cm, "Chef de la Division DEEE")
+        c.drawCentredString(right_sig_x, sig_y - 0.5*cm, "Ing. Hiba Labjouji")
+        c.drawCentredString(right_sig_x, sig_y - 0.8*cm, "Chef de la Division DEEE")
         
         # Signature manuscrite simulée
         c.setStrokeColor(black)
@@ -256,16 +368,8 @@ def generate_certificate_for_request(certification_request):
         expiry_date=timezone.now().date() + timedelta(days=365)  # Valide 1 an
     )
     
-    # Générer le PDF
-    generator = CertificateGenerator()
-    pdf_buffer = generator.generate_certificate_pdf(certificate)
-    
-    # Sauvegarder le PDF
-    pdf_filename = f"certificat_{certificate.number}.pdf"
-    certificate.pdf_file.save(
-        pdf_filename,
-        ContentFile(pdf_buffer.getvalue()),
-        save=True
-    )
+    # Générer le PDF en arrière-plan après validation de la transaction
+    from .tasks import enqueue_certificate_render
+    enqueue_certificate_render(certificate.id)
     
-    return certificate 
\ No newline at end of file
+    return certificate
@@ -0,0 +1,257 @@
+"""Stockage froid des documents archivés
+
+Les documents des demandes clôturées depuis longtemps sont compressés dans des fichiers
+d'archive écrits en ajout seul, hors de MEDIA_ROOT (COLD_STORAGE_ROOT), puis retirés du
+stockage courant. Chaque fichier est un membre gzip indépendant : l'archive entière reste
+lisible avec zcat, et un membre se lit directement à sa position. L'index (PackedFile)
+est en base ; il est doublé d'un fichier .idx (une ligne JSON par membre) à côté de
+l'archive, pour pouvoir reconstruire l'index.
+
+Les lectures restent transparentes : le stockage des documents retombe sur le stockage
+froid lorsqu'un fichier n'est plus sur le disque courant.
+"""
+import json
+import os
+import zlib
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+# Format gzip (en-tête et CRC) pour chaque membre
+GZIP_WBITS = 31
+READ_BLOCK = 64 * 1024
+
+
+def cold_root():
+    return getattr(settings, 'COLD_STORAGE_ROOT', os.path.join(settings.BASE_DIR, 'cold_storage'))
+
+
+def pack_path(pack_name):
+    return os.path.join(cold_root(), pack_name)
+
+
+class PackedReader:
+    """Lecture décompressée d'un membre d'archive ; seek vers l'avant par décompression"""
+
+    def __init__(self, path, offset, length, size):
+        self._path = path
+        self._offset = offset
+        self._length = length
+        self.size = size
+        self.reopen()
+
+    def reopen(self):
+        self._raw = open(self._path, 'rb')
+        self._reset()
+
+    def _reset(self):
+        self._raw.seek(self._offset)
+        self._remaining = self._length
+        self._decompressor = zlib.decompressobj(GZIP_WBITS)
+        self._buffer = b''
+        self._position = 0
+        self._at_end = False
+
+    def read(self, size=-1):
+        if self._at_end:
+            return b''
+        while (size is None or size < 0 or len(self._buffer) < size) and (self._remaining or self._decompressor.unconsumed_tail):
+            if self._decompressor.unconsumed_tail:
+                data = self._decompressor.unconsumed_tail
+            else:
+                data = self._raw.read(min(READ_BLOCK, self._remaining))
+                self._remaining -= len(data)
+                if not data:
+                    break
+            self._buffer += self._decompressor.decompress(data, READ_BLOCK)
+        if size is None or size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self._position += len(data)
+        return data
+
+    def seek(self, position, whence=0):
+        if whence == 1:
+            position += self._position
+        elif whence == 2:
+            position += self.size
+        if position < self._position:
+            self._reset()
+        if position >= self.size:
+            # Fin du fichier (calcul de la taille par FileResponse) : taille connue, rien à décompresser
+            self._at_end = True
+            self._position = self.size
+            return self._position
+        while self._position < position:
+            if not self.read(min(READ_BLOCK, position - self._position)):
+                break
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def seekable(self):
+        return True
+
+    @property
+    def closed(self):
+        return self._raw.closed
+
+    def close(self):
+        self._raw.close()
+
+
+class PackedMember(File):
+    """Fichier Django d'un membre d'archive, rouvrable après fermeture (FieldFile.open)"""
+
+    def open(self, mode=None, *args, **kwargs):
+        if self.closed:
+            self.file.reopen()
+        else:
+            self.seek(0)
+        return self
+
+
+def open_packed(entry):
+    """Fichier Django lisant un membre d'archive à partir de son entrée d'index"""
+    reader = PackedReader(pack_path(entry.pack.name), entry.offset, entry.length, entry.size)
+    return PackedMember(reader, name=entry.name)
+
+
+def packed_entry(name):
+    from .models import PackedFile
+
+    return PackedFile.objects.select_related('pack').filter(name=name).first()
+
+
+class PackWriter:
+    """Ajout de fichiers à l'archive ouverte ; une nouvelle archive est commencée au-delà de la taille maximale
+
+    Chaque ajout verrouille la ligne de l'archive (select_for_update) : plusieurs commandes
+    d'archivage peuvent tourner en même temps sans entrelacer leurs écritures.
+    """
+
+    def __init__(self):
+        self.pack = None
+        self._file = None
+        self._index = None
+
+    def _lock_pack(self):
+        """Archive ouverte relue et verrouillée jusqu'à la fin de la transaction courante"""
+        from .models import ArchivePack
+
+        if self.pack is not None:
+            pack = ArchivePack.objects.select_for_update().get(pk=self.pack.pk)
+            if not pack.sealed:
+                # Taille et nombre de fichiers à jour des ajouts des autres écrivains
+                self.pack = pack
+                return
+            self.close()
+        max_size = getattr(settings, 'COLD_STORAGE_PACK_MAX_SIZE', 1024 * 1024 * 1024)
+        self.pack = ArchivePack.objects.select_for_update().filter(
+            sealed=False, size__lt=max_size
+        ).order_by('-id').first()
+        if self.pack is None:
+            self.pack = ArchivePack.objects.create(
+                name=timezone.now().strftime('%Y/%m/pack-%Y%m%d-%H%M%S-%f.gz')
+            )
+        path = pack_path(self.pack.name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, 'ab')
+        self._index = open(f'{path}.idx', 'a', encoding='utf-8')
+
+    def append(self, name, source):
+        """Compresser un fichier ouvert à la fin de l'archive ; renvoie (archive, offset, longueur, taille)"""
+        with transaction.atomic():
+            self._lock_pack()
+            # Position réelle en fin de fichier : un ajout interrompu laisse des octets non indexés, ignorés
+            offset = self._file.seek(0, os.SEEK_END)
+            compressor = zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS)
+            size = 0
+            for chunk in iter(lambda: source.read(READ_BLOCK), b''):
+                size += len(chunk)
+                self._file.write(compressor.compress(chunk))
+            self._file.write(compressor.flush())
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            length = self._file.tell() - offset
+            self._index.write(json.dumps({'name': name, 'offset': offset, 'length': length, 'size': size}) + '\n')
+            self._index.flush()
+
+            self.pack.size = offset + length
+            self.pack.member_count += 1
+            max_size = getattr(settings, 'COLD_STORAGE_PACK_MAX_SIZE', 1024 * 1024 * 1024)
+            if self.pack.size >= max_size:
+                self.pack.sealed = True
+            self.pack.save(update_fields=['size', 'member_count', 'sealed'])
+        entry = (self.pack, offset, length, size)
+        if self.pack.sealed:
+            self.close()
+            self.pack = None
+        return entry
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._index.close()
+        self._file = self._index = None
+
+
+def cold_candidates(cutoff):
+    """Fichiers adressés par contenu dont toutes les références appartiennent à des demandes
+    clôturées avant `cutoff`, et qui sont encore sur le stockage courant"""
+    from django.apps import apps
+    from .models import CertificationRequest, PackedFile
+    from .storage import CAS_PREFIX, REFERENCING_FIELDS
+
+    closed = CertificationRequest.objects.filter(
+        status__in=['approved', 'rejected', 'cancelled'], updated_at__lt=cutoff
+    ).values('id')
+    candidates = set()
+    in_use = set()
+    for label, field_name in REFERENCING_FIELDS:
+        model = apps.get_model(label)
+        request_field = 'id' if model is CertificationRequest else 'certification_request_id'
+        queryset = model.objects.filter(**{f'{field_name}__startswith': CAS_PREFIX})
+        candidates.update(queryset.filter(**{f'{request_field}__in': closed}).values_list(field_name, flat=True))
+        in_use.update(queryset.exclude(**{f'{request_field}__in': closed}).values_list(field_name, flat=True))
+    packed = set(PackedFile.objects.filter(name__in=candidates).values_list('name', flat=True))
+    return sorted(candidates - in_use - packed)
+
+
+def _remove_hot_copy(path):
+    # Pas de storage.delete : il retirerait aussi le fichier de l'index froid
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def move_to_cold(names, on_packed=None):
+    """Compresser ces fichiers dans le stockage froid puis les retirer du stockage courant
+
+    Chaque fichier est d'abord écrit et synchronisé dans l'archive, puis indexé en base ;
+    la copie courante n'est supprimée qu'après validation de l'index.
+    """
+    from .models import PackedFile
+    from .storage import document_storage
+
+    storage = document_storage()
+    writer = PackWriter()
+    try:
+        for name in names:
+            try:
+                source = open(storage.path(name), 'rb')
+            except FileNotFoundError:
+                continue
+            with source:
+                pack, offset, length, size = writer.append(name, source)
+            with transaction.atomic():
+                PackedFile.objects.create(name=name, pack=pack, offset=offset, length=length, size=size)
+                transaction.on_commit(lambda name=name: _remove_hot_copy(storage.path(name)))
+            if on_packed:
+                on_packed(name, size, length)
+    finally:
+        writer.close()
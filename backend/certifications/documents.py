@@ -0,0 +1,270 @@
+"""Rendu des documents PDF : rapports d'audit et de conformité, rapports de refus, reçus
+
+Chaque document est décrit par un dictionnaire de données. Le PDF est rendu une seule
+fois par empreinte de ces données (et de la version des gabarits), sur le pool de rendu,
+puis conservé dans le stockage : les téléchargements suivants sont de simples envois
+de fichier.
+"""
+import hashlib
+import io
+import json
+import threading
+from xml.sax.saxutils import escape
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle
+from .storage import sharded_name
+from .tasks import get_executor
+
+# À incrémenter à chaque modification d'un gabarit : invalide tous les documents en cache
+DOCUMENTS_VERSION = '2'
+
+PRIMARY_COLOR = colors.HexColor('#1b5e20')
+LIGHT_COLOR = colors.HexColor('#e8f5e9')
+
+# Styles et mises en forme construits une fois par processus
+_styles = None
+_styles_lock = threading.Lock()
+
+# Cache des PDF rendus, hors de l'espace adressé par contenu (CAS_PREFIX) : jamais référencé par un champ
+RENDER_CACHE_PREFIX = 'rendered/'
+
+# Rendus en cours, pour ne pas rendre deux fois le même document en parallèle
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def document_key(kind, data):
+    """Clé de cache : empreinte du type de document, de ses données et de la version des gabarits"""
+    payload = json.dumps([DOCUMENTS_VERSION, kind, data], cls=DjangoJSONEncoder, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def document_cache_path(kind, key):
+    """Emplacement du PDF rendu pour une clé de cache"""
+    return sharded_name(f'{RENDER_CACHE_PREFIX}{kind}/', key, '.pdf')
+
+
+def get_styles():
+    """Feuille de styles et styles de tableaux partagés par tous les gabarits"""
+    global _styles
+    if _styles is None:
+        with _styles_lock:
+            if _styles is None:
+                sheet = getSampleStyleSheet()
+                _styles = {
+                    'title': ParagraphStyle(
+                        'DocumentTitle', parent=sheet['Title'], fontName='Helvetica-Bold',
+                        fontSize=18, textColor=PRIMARY_COLOR, alignment=TA_CENTER, spaceAfter=6
+                    ),
+                    'subtitle': ParagraphStyle(
+                        'DocumentSubtitle', parent=sheet['Normal'], fontSize=10,
+                        textColor=colors.grey, alignment=TA_CENTER, spaceAfter=12
+                    ),
+                    'heading': ParagraphStyle(
+                        'DocumentHeading', parent=sheet['Heading2'], fontName='Helvetica-Bold',
+                        fontSize=12, textColor=PRIMARY_COLOR, spaceBefore=12, spaceAfter=6
+                    ),
+                    'body': ParagraphStyle('DocumentBody', parent=sheet['Normal'], fontSize=10, leading=14),
+                    'table': TableStyle([
+                        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+                        ('FONTSIZE', (0, 0), (-1, -1), 10),
+                        ('BACKGROUND', (0, 0), (0, -1), LIGHT_COLOR),
+                        ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+                        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                        ('TOPPADDING', (0, 0), (-1, -1), 4),
+                        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+                    ]),
+                }
+    return _styles
+
+
+def _text(value):
+    """Donnée saisie échappée : Paragraph interprète le balisage (<img>, <a>, entités...)"""
+    return escape(str(value))
+
+
+def _header(styles, title, subtitle):
+    return [
+        Paragraph("Royaume du Maroc — Ministère de la Transition Énergétique et du Développement Durable", styles['subtitle']),
+        Paragraph(_text(title), styles['title']),
+        Paragraph(_text(subtitle), styles['subtitle']),
+    ]
+
+
+def _rows(styles, rows):
+    """Tableau libellé / valeur"""
+    table = Table(
+        [[label, Paragraph(_text(value), styles['body'])] for label, value in rows],
+        colWidths=[6 * cm, 11 * cm]
+    )
+    table.setStyle(styles['table'])
+    return table
+
+
+def _section(styles, heading, rows):
+    return [Paragraph(heading, styles['heading']), _rows(styles, rows)]
+
+
+def _audit_report(data, styles):
+    summary = data['summary']
+    details = data['details']
+    story = _header(styles, data['title'], f"Période du {data['period_start']} au {data['period_end']}")
+    story += _section(styles, 'Synthèse', [
+        ('Total des demandes', summary['total_requests']),
+        ('Demandes approuvées', summary['processed_requests']),
+        ('Demandes en attente', summary['pending_requests']),
+        ('Taux de succès', f"{summary['success_rate']} %"),
+    ])
+    story += _section(styles, 'Détails', [
+        ('Certificats émis', details['certificates_issued']),
+        ('Certificats révoqués', details['certificates_revoked']),
+        ('Entreprises enregistrées', details['companies_audited']),
+        ('Demandes refusées', details['compliance_issues']),
+    ])
+    if data.get('recommendations'):
+        story.append(Paragraph('Recommandations', styles['heading']))
+        story += [Paragraph(f'• {_text(item)}', styles['body']) for item in data['recommendations']]
+    return story
+
+
+def _compliance_report(data, styles):
+    statistics = data['statistiques']
+    compliance = data['conformite']
+    story = _header(styles, 'Rapport de conformité', f"Données au {data['date']} — {data['periode']}")
+    story += _section(styles, 'Statistiques', [
+        ('Total des demandes', statistics['total_demandes']),
+        ('Demandes approuvées', statistics['demandes_approuvees']),
+        ('Certificats émis', statistics['certificats_emis']),
+        ('Entreprises enregistrées', statistics['entreprises_enregistrees']),
+        ('Taux de succès', f"{statistics['taux_succes']} %"),
+    ])
+    story += _section(styles, 'Conformité', [
+        ('Score global', compliance['score_global']),
+        ('Statut', compliance['statut']),
+    ])
+    return story
+
+
+def _rejection_report(data, styles):
+    story = _header(styles, 'Rapport de refus', f"Demande n° {data['request_id']} — {data['date']}")
+    story += _section(styles, 'Demande', [
+        ('Entreprise', data['company']),
+        ('ICE', data['ice_number']),
+        ('Type de traitement', data['treatment_type']),
+        ('Date de soumission', data['submission_date']),
+        ('Refusée par', data['rejected_by'] or '-'),
+    ])
+    story.append(Paragraph('Motifs du refus', styles['heading']))
+    story += [Paragraph(_text(line), styles['body']) for line in data['comments'].splitlines() if line.strip()]
+    return story
+
+
+def _payment_receipt(data, styles):
+    story = _header(styles, 'Reçu de paiement', f"Transaction {data['transaction_id']} — {data['date']}")
+    story += _section(styles, 'Entreprise', [
+        ('Raison sociale', data['company']),
+        ('ICE', data['ice_number']),
+        ('Demande', f"n° {data['request_id']} — {data['treatment_type']}"),
+    ])
+    story += _section(styles, 'Paiement', [
+        ('Montant', f"{data['amount']} MAD"),
+        ('Frais de traitement', f"{data['fees']} MAD"),
+        ('Montant total', f"{data['total_amount']} MAD"),
+        ('Méthode de paiement', data['payment_method']),
+    ])
+    return story
+
+
+TEMPLATES = {
+    'audit_report': _audit_report,
+    'compliance_report': _compliance_report,
+    'rejection_report': _rejection_report,
+    'payment_receipt': _payment_receipt,
+}
+
+
+def render_document(kind, data):
+    """Rendre un document en PDF (octets)"""
+    styles = get_styles()
+    buffer = io.BytesIO()
+    document = SimpleDocTemplate(
+        buffer, pagesize=A4, leftMargin=2 * cm, rightMargin=2 * cm,
+        topMargin=2 * cm, bottomMargin=2 * cm, title=kind
+    )
+    document.build(TEMPLATES[kind](data, styles))
+    return buffer.getvalue()
+
+
+def _render_to_storage(kind, data, path):
+    if not default_storage.exists(path):
+        path = default_storage.save(path, ContentFile(render_document(kind, data)))
+    return path
+
+
+def get_document(kind, data):
+    """Chemin du PDF en cache pour ces données ; rendu sur le pool s'il n'existe pas encore"""
+    path = document_cache_path(kind, document_key(kind, data))
+    if default_storage.exists(path):
+        return path
+
+    with _inflight_lock:
+        future = _inflight.get(path)
+        if future is None:
+            future = get_executor().submit(_render_to_storage, kind, data, path)
+            _inflight[path] = future
+    try:
+        return future.result()
+    finally:
+        with _inflight_lock:
+            if _inflight.get(path) is future:
+                del _inflight[path]
+
+
+def enqueue_document(kind, data):
+    """Pré-rendre un document en arrière-plan une fois la transaction courante validée"""
+    path = document_cache_path(kind, document_key(kind, data))
+    transaction.on_commit(lambda: get_executor().submit(_render_to_storage, kind, data, path))
+
+
+def rejection_report_data(report):
+    """Données imprimées sur un rapport de refus"""
+    certification_request = report.certification_request
+    company = certification_request.company
+    rejected_by = report.rejected_by.user.get_full_name() if report.rejected_by else ''
+    return {
+        'request_id': certification_request.id,
+        'company': company.business_name,
+        'ice_number': company.ice_number,
+        'treatment_type': certification_request.treatment_type,
+        'submission_date': certification_request.submission_date.strftime('%Y-%m-%d'),
+        'date': report.date.strftime('%Y-%m-%d'),
+        'rejected_by': rejected_by,
+        'comments': report.comments,
+    }
+
+
+def payment_receipt_data(payment):
+    """Données imprimées sur un reçu de paiement"""
+    certification_request = payment.certification_request
+    company = certification_request.company
+    return {
+        'payment_id': payment.id,
+        'transaction_id': payment.transaction_id or '',
+        'date': payment.payment_date.strftime('%Y-%m-%d %H:%M') if payment.payment_date else '',
+        'request_id': certification_request.id,
+        'company': company.business_name,
+        'ice_number': company.ice_number,
+        'treatment_type': certification_request.treatment_type,
+        'amount': payment.amount,
+        'fees': payment.fees,
+        'total_amount': payment.total_amount,
+        'payment_method': payment.get_payment_method_display(),
+    }
@@ -0,0 +1,60 @@
+"""Outils pour les exports incrémentaux (delta) des autorités"""
+from datetime import datetime
+from django.core import signing
+from django.db.models import Q
+from .models import ExportTombstone
+
+WATERMARK_SALT = 'certifications.exports.watermark'
+
+
+def encode_watermark(marks):
+    """Encoder les positions {type: (horodatage, id)} dans un jeton opaque et signé"""
+    payload = {
+        data_type: [timestamp.isoformat(), object_id]
+        for data_type, (timestamp, object_id) in marks.items()
+        if timestamp is not None
+    }
+    return signing.dumps(payload, salt=WATERMARK_SALT, compress=True)
+
+
+def decode_watermark(token):
+    """Décoder un jeton de watermark (lève signing.BadSignature si invalide)"""
+    payload = signing.loads(token, salt=WATERMARK_SALT)
+    return {
+        data_type: (datetime.fromisoformat(timestamp), object_id)
+        for data_type, (timestamp, object_id) in payload.items()
+    }
+
+
+def changed_since(queryset, mark, field='updated_at'):
+    """Lignes créées ou modifiées après la position (horodatage, id), dans l'ordre du watermark"""
+    queryset = queryset.order_by(field, 'pk')
+    if mark is None:
+        return queryset
+    timestamp, object_id = mark
+    return queryset.filter(
+        Q(**{f'{field}__gt': timestamp}) |
+        Q(**{field: timestamp, 'pk__gt': object_id})
+    )
+
+
+def tombstones_since(data_types, mark):
+    """Suppressions survenues après la position donnée pour les types demandés"""
+    queryset = ExportTombstone.objects.filter(data_type__in=data_types)
+    return changed_since(queryset, mark, field='deleted_at')
+
+
+def up_to(queryset, mark, field='updated_at'):
+    """Borner un export à la position (horodatage, id) incluse, pour rester cohérent avec le watermark annoncé"""
+    if mark is None:
+        return queryset.none()
+    timestamp, object_id = mark
+    return queryset.filter(
+        Q(**{f'{field}__lt': timestamp}) |
+        Q(**{field: timestamp, 'pk__lte': object_id})
+    )
+
+
+def last_mark(queryset, field='updated_at'):
+    """Position (horodatage, id) de la dernière ligne d'un queryset ordonné selon le watermark"""
+    return queryset.order_by(field, 'pk').values_list(field, 'pk').last()
@@ -0,0 +1,163 @@
+"""Métadonnées des fichiers téléversés : taille, type MIME détecté, empreinte SHA-256, nombre de pages
+
+Les métadonnées sont calculées une seule fois, pendant l'écriture du fichier dans le
+stockage, puis enregistrées dans des colonnes : les listes et les serializers n'ont
+plus à interroger le disque.
+"""
+import hashlib
+import os
+import re
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # Sans pypdf (requirements.txt), les PDF à objets compressés restent sans nombre de pages
+    PdfReader = None
+
+# Signatures reconnues en début de fichier
+SIGNATURES = [
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'ole'),
+    (b'PK\x03\x04', 'zip'),
+]
+
+OLE_TYPES = {
+    '.doc': 'application/msword',
+    '.xls': 'application/vnd.ms-excel',
+}
+
+ZIP_TYPES = {
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+TYPE_LABELS = {
+    'application/pdf': 'PDF',
+    'image/png': 'PNG',
+    'image/jpeg': 'JPG',
+    **{mime_type: extension.lstrip('.').upper() for extension, mime_type in {**OLE_TYPES, **ZIP_TYPES}.items()},
+}
+
+# Chaque page d'un PDF est un objet « /Type /Page » (à ne pas confondre avec /Pages)
+PAGE_RE = re.compile(rb'/Type\s{0,8}/Page(?![A-Za-z])')
+PAGE_OVERLAP = 32
+
+
+class FileInspector:
+    """Calcul des métadonnées au fil des blocs écrits, sans relire le fichier"""
+
+    def __init__(self, name):
+        self.name = name
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._head = b''
+        self._tail = b''
+        self._pages = 0
+        self._counted_until = 0
+
+    def update(self, chunk):
+        if len(self._head) < 512:
+            self._head += chunk[:512 - len(self._head)]
+        self._digest.update(chunk)
+        if self._head.startswith(b'%PDF-'):
+            self._count_pages(chunk)
+        self.size += len(chunk)
+
+    def _count_pages(self, chunk):
+        # Le bloc précédent est prolongé de quelques octets pour les marqueurs à cheval
+        buffer = self._tail + chunk
+        offset = self.size - len(self._tail)
+        for match in PAGE_RE.finditer(buffer):
+            start = offset + match.start()
+            # Un marqueur en fin de tampon est compté au bloc suivant (« /Page » peut devenir « /Pages »)
+            if start >= self._counted_until and match.end() < len(buffer):
+                self._pages += 1
+                self._counted_until = offset + match.end()
+        self._tail = buffer[-PAGE_OVERLAP:]
+
+    def mime_type(self):
+        extension = os.path.splitext(self.name)[1].lower()
+        for signature, detected in SIGNATURES:
+            if self._head.startswith(signature):
+                if detected == 'ole':
+                    return OLE_TYPES.get(extension, 'application/x-ole-storage')
+                if detected == 'zip':
+                    if b'word/' in self._head:
+                        return ZIP_TYPES['.docx']
+                    if b'xl/' in self._head:
+                        return ZIP_TYPES['.xlsx']
+                    return ZIP_TYPES.get(extension, 'application/zip')
+                return detected
+        return 'application/octet-stream'
+
+    def result(self):
+        mime_type = self.mime_type()
+        return {
+            'size': self.size,
+            'mime_type': mime_type,
+            'sha256': self._digest.hexdigest(),
+            'page_count': (self._pages or None) if mime_type == 'application/pdf' else None,
+        }
+
+
+def inspect_file(file, name=None):
+    """Métadonnées d'un fichier déjà stocké ou en mémoire (lecture complète, une fois)"""
+    inspector = FileInspector(name or file.name or '')
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    for chunk in file.chunks():
+        inspector.update(chunk)
+    return inspector.result()
+
+
+def pdf_page_count(field_file):
+    """Nombre de pages lu par pypdf, pour les PDF dont les objets sont compressés"""
+    if PdfReader is None:
+        return None
+    try:
+        with field_file.open('rb') as file:
+            return len(PdfReader(file).pages)
+    except Exception:
+        return None
+
+
+def apply_metadata(instance, prefix, metadata):
+    """Recopier les métadonnées dans les colonnes <prefix>size, <prefix>mime_type, etc."""
+    for key in ('size', 'mime_type', 'sha256', 'page_count'):
+        setattr(instance, f'{prefix}{key}', metadata.get(key))
+
+
+def save_pending_file(instance, field_name, prefix):
+    """Écrire un fichier nouvellement affecté et renseigner ses métadonnées
+
+    Le stockage adressé par contenu calcule les métadonnées pendant l'écriture ; pour
+    un autre stockage, le fichier écrit est relu une fois.
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file or field_file._committed:
+        return
+    content = field_file.file
+    field_file.save(field_file.name, content, save=False)
+    record_metadata(instance, field_name, prefix, content)
+
+
+def record_metadata(instance, field_name, prefix, content=None):
+    """Renseigner les colonnes de métadonnées d'un fichier qui vient d'être écrit"""
+    field_file = getattr(instance, field_name)
+    metadata = getattr(content, 'metadata', None)
+    if metadata is None:
+        with field_file.open('rb') as file:
+            metadata = inspect_file(file, field_file.name)
+    if metadata['mime_type'] == 'application/pdf' and metadata['page_count'] is None:
+        metadata = {**metadata, 'page_count': pdf_page_count(field_file)}
+    apply_metadata(instance, prefix, metadata)
+
+
+def file_type_label(mime_type, name):
+    """Libellé court du type de fichier (PDF, DOCX…) ; d'après l'extension si le type n'a pas été détecté"""
+    label = TYPE_LABELS.get(mime_type)
+    if label:
+        return label
+    extension = os.path.splitext(name or '')[1].lstrip('.').upper()
+    return extension or 'PDF'
@@ -0,0 +1,164 @@
+"""Envoi des fichiers stockés sans les charger en mémoire
+
+Les contrôles d'accès restent dans les vues ; une fois l'accès accordé, l'envoi est
+délégué au proxy frontal (X-Accel-Redirect pour nginx, X-Sendfile pour Apache/lighttpd)
+ou au stockage lui-même (redirection vers une URL signée, object_storage) si
+FILE_SERVING_BACKEND est configuré, sinon à FileResponse (sendfile du serveur WSGI),
+avec prise en charge des requêtes HTTP Range.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+from django.utils.http import content_disposition_header
+from .object_storage import supports_presigned_urls
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _FileRange:
+    """Vue en lecture seule sur une portion d'un fichier ouvert"""
+    def __init__(self, file, start, length):
+        self._file = file
+        self._file.seek(start)
+        self._remaining = length
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+class StoredFile:
+    """Fichier du stockage désigné par son nom, servi comme un FieldFile"""
+    def __init__(self, name, storage=None):
+        self.name = name
+        self.storage = storage or default_storage
+
+
+def _local_path(field_file):
+    try:
+        path = field_file.storage.path(field_file.name)
+    except NotImplementedError:
+        return None
+    # Fichier absent du disque courant (stockage froid) : envoyé par Django
+    return path if os.path.exists(path) else None
+
+
+def parse_range(header, size):
+    """Interpréter un en-tête Range à une seule plage ; renvoie (début, fin) inclus,
+    None si l'en-tête est absent ou non géré, ou False si la plage n'est pas satisfiable"""
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffixe : les N derniers octets
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _accel_response(field_file, content_type, filename, as_attachment):
+    """Réponse vide : le proxy frontal lit et envoie le fichier lui-même"""
+    backend = getattr(settings, 'FILE_SERVING_BACKEND', None)
+    if backend not in ('x-accel-redirect', 'x-sendfile'):
+        return None
+    path = _local_path(field_file)
+    if path is None:
+        return None
+
+    response = HttpResponse(content_type=content_type)
+    if backend == 'x-accel-redirect':
+        prefix = getattr(settings, 'FILE_SERVING_INTERNAL_URL', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(field_file.name.replace(os.sep, '/'))
+    else:
+        response['X-Sendfile'] = path
+    disposition = content_disposition_header(as_attachment, filename)
+    if disposition:
+        response['Content-Disposition'] = disposition
+    return response
+
+
+def presigned_url(request, field_file, filename=None, as_attachment=True, content_type=None):
+    """URL signée de courte durée vers le fichier, ou None si son stockage ne la gère pas"""
+    if not supports_presigned_urls(field_file.storage):
+        return None
+    url = field_file.storage.presigned_url(
+        field_file.name,
+        filename=filename or os.path.basename(field_file.name),
+        as_attachment=as_attachment,
+        content_type=content_type
+    )
+    # URL locale (vue signed_storage) : rendue absolue pour le client
+    return request.build_absolute_uri(url)
+
+
+def _presigned_response(request, field_file, content_type, filename, as_attachment):
+    """Redirection vers le stockage : les octets ne passent plus par l'application"""
+    if getattr(settings, 'FILE_SERVING_BACKEND', None) != 'presigned':
+        return None
+    url = presigned_url(request, field_file, filename, as_attachment, content_type)
+    if url is None:
+        return None
+    response = HttpResponseRedirect(url)
+    # URL à durée de vie limitée : la redirection ne doit pas être mise en cache
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+def serve_file(request, field_file, filename=None, as_attachment=True, content_type=None):
+    """Envoyer un FieldFile (ou StoredFile) après vérification des droits par la vue appelante"""
+    filename = filename or os.path.basename(field_file.name)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    response = _presigned_response(request, field_file, content_type, filename, as_attachment)
+    if response is None:
+        response = _accel_response(field_file, content_type, filename, as_attachment)
+    if response is not None:
+        return response
+
+    file = field_file.storage.open(field_file.name, 'rb')
+    size = field_file.storage.size(field_file.name)
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+
+    if byte_range is False:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    if byte_range is None:
+        # Fichier complet : le serveur WSGI peut utiliser sendfile (wsgi.file_wrapper)
+        response = FileResponse(file, as_attachment=as_attachment, filename=filename, content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(
+            _FileRange(file, start, length),
+            as_attachment=as_attachment, filename=filename, content_type=content_type,
+            status=206
+        )
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
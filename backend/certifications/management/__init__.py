@@ -0,0 +1 @@
+# Management commands for certifications app 
\ No newline at end of file
@@ -0,0 +1,69 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from certifications.cold_storage import cold_candidates, move_to_cold
+from certifications.storage import document_storage
+
+
+class Command(BaseCommand):
+    help = ('Déplace vers le stockage froid (archives compressées) les documents des demandes '
+            'clôturées depuis plus de N mois')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=getattr(settings, 'COLD_STORAGE_AFTER_MONTHS', 12),
+            help='Ancienneté minimale de la clôture, en mois (défaut: COLD_STORAGE_AFTER_MONTHS)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Nombre maximal de fichiers archivés lors de cette exécution',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Affiche les fichiers concernés sans rien déplacer',
+        )
+
+    def handle(self, *args, **options):
+        if options['months'] < 0:
+            raise CommandError('--months doit être positif')
+        try:
+            document_storage().path('')
+        except NotImplementedError:
+            raise CommandError("Le stockage froid ne s'applique qu'au stockage local "
+                               "(stockage objet : utiliser les règles de cycle de vie du bucket)")
+        cutoff = timezone.now() - timedelta(days=30 * options['months'])
+        names = cold_candidates(cutoff)
+        if options['limit']:
+            names = names[:options['limit']]
+        if not names:
+            self.stdout.write(self.style.SUCCESS('Aucun document à archiver'))
+            return
+
+        if options['dry_run']:
+            storage = document_storage()
+            total = sum(storage.size(name) for name in names if storage.exists(name))
+            self.stdout.write(f'{len(names)} fichier(s) à archiver ({total / 1024 / 1024:.1f} Mo)')
+            return
+
+        stats = {'count': 0, 'size': 0, 'compressed': 0}
+
+        def on_packed(name, size, length):
+            stats['count'] += 1
+            stats['size'] += size
+            stats['compressed'] += length
+
+        started = time.monotonic()
+        move_to_cold(names, on_packed)
+        elapsed = time.monotonic() - started
+        ratio = stats['compressed'] / stats['size'] * 100 if stats['size'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{stats["count"]} fichier(s) archivés en {elapsed:.2f}s : '
+            f'{stats["size"] / 1024 / 1024:.1f} Mo libérés sur le stockage courant, '
+            f'{stats["compressed"] / 1024 / 1024:.1f} Mo dans le stockage froid ({ratio:.0f} %)'
+        ))
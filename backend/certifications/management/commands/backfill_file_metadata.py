@@ -0,0 +1,55 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from certifications.file_metadata import record_metadata
+from certifications.models import CertificationRequest, SupportingDocument
+
+# (modèle, champ fichier, préfixe des colonnes de métadonnées)
+TARGETS = [
+    (SupportingDocument, 'file', 'file_'),
+    (CertificationRequest, 'supporting_documents', 'document_'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Renseigne les métadonnées (taille, type MIME, SHA-256, pages) des fichiers envoyés avant leur relevé à l\'envoi'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Nombre de lignes mises à jour par requête (défaut: 200)',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size doit être positif')
+
+        started = time.monotonic()
+        for model, field_name, prefix in TARGETS:
+            columns = [f'{prefix}{key}' for key in ('size', 'mime_type', 'sha256', 'page_count')]
+            queryset = model.objects.filter(**{f'{prefix}sha256': ''}).exclude(
+                **{field_name: ''}
+            ).exclude(**{f'{field_name}__isnull': True}).only('id', field_name, *columns).order_by('id')
+
+            updated = missing = 0
+            batch = []
+            for instance in queryset.iterator(chunk_size=options['batch_size']):
+                try:
+                    record_metadata(instance, field_name, prefix)
+                except OSError:
+                    missing += 1
+                    continue
+                batch.append(instance)
+                if len(batch) >= options['batch_size']:
+                    model.objects.bulk_update(batch, columns)
+                    updated += len(batch)
+                    batch = []
+            if batch:
+                model.objects.bulk_update(batch, columns)
+                updated += len(batch)
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural} : {updated} mis à jour, {missing} fichier(s) introuvable(s)'
+            ))
+        self.stdout.write(f'Terminé en {time.monotonic() - started:.2f}s')
@@ -0,0 +1,118 @@
+import io
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from accounts.models import CompanyProfile
+from certifications.certificate_generator import CertificateGenerator
+from certifications.models import CertificationRequest, Certificate
+
+
+class FullRedrawGenerator(CertificateGenerator):
+    """Rendu de référence (comportement précédent) : toute la page redessinée à chaque
+    certificat, flux compressés encodés en ASCII85"""
+
+    def _save(self, c):
+        previous = rl_config.useA85
+        rl_config.useA85 = 1
+        try:
+            c.save()
+        finally:
+            rl_config.useA85 = previous
+
+    def generate_certificate_pdf(self, certificate):
+        return self.generate_certificates_pdf([certificate])
+
+    def generate_certificates_pdf(self, certificates):
+        buffer = io.BytesIO()
+        c = canvas.Canvas(buffer, pagesize=A4)
+        for certificate in certificates:
+            self._draw_static_layer(c)
+            self._draw_certificate_fields(c, certificate)
+            c.showPage()
+        self._save(c)
+        buffer.seek(0)
+        return buffer
+
+
+def sample_certificate(index=0):
+    """Certificat en mémoire (non enregistré) pour mesurer le rendu seul"""
+    company = CompanyProfile(
+        business_name=f'Entreprise de test {index}',
+        ice_number=f'{index:015d}',
+        address=f'{index} boulevard Mohammed V, Casablanca'
+    )
+    certification_request = CertificationRequest(company=company, treatment_type='recycling')
+    return Certificate(
+        number=f'DEEE-BENCH-{index:06d}',
+        treatment_type='recycling',
+        certification_request=certification_request,
+        issue_date=date.today(),
+        expiry_date=date.today() + timedelta(days=365)
+    )
+
+
+class Command(BaseCommand):
+    help = 'Mesure la vitesse de rendu et la taille des certificats PDF (rendu complet vs partie fixe mise en cache)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Nombre de rendus par variante (défaut: 200)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Nombre de pages du PDF multi-certificats (défaut: 100)',
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        certificates = [sample_certificate(i) for i in range(iterations)]
+        batch = [sample_certificate(i) for i in range(options['batch_size'])]
+        generators = (
+            ('Rendu complet', FullRedrawGenerator()),
+            ('Partie fixe en cache', CertificateGenerator()),
+        )
+
+        self.stdout.write(f'Certificat seul ({iterations} rendus)')
+        single = []
+        for label, generator in generators:
+            # Premier rendu hors mesure (compilation de la partie fixe, imports)
+            generator.generate_certificate_pdf(certificates[0])
+
+            started = time.perf_counter()
+            size = 0
+            for certificate in certificates:
+                size += len(generator.generate_certificate_pdf(certificate).getvalue())
+            elapsed = time.perf_counter() - started
+            single.append((iterations / elapsed, size / iterations))
+            self.stdout.write(
+                f'  {label:<25} {iterations / elapsed:8.1f} rendus/s   '
+                f'{elapsed / iterations * 1000:6.2f} ms/rendu   {size / iterations / 1024:6.1f} Ko/PDF'
+            )
+
+        self.stdout.write(f'PDF de {len(batch)} certificats')
+        multi = []
+        for label, generator in generators:
+            started = time.perf_counter()
+            size = len(generator.generate_certificates_pdf(batch).getvalue())
+            elapsed = time.perf_counter() - started
+            multi.append((len(batch) / elapsed, size / len(batch)))
+            self.stdout.write(
+                f'  {label:<25} {len(batch) / elapsed:8.1f} pages/s    '
+                f'{size / 1024:8.1f} Ko   {size / len(batch) / 1024:6.2f} Ko/page'
+            )
+
+        for title, ((before_rate, before_size), (after_rate, after_size)) in (
+            ('Certificat seul', single), ('PDF multi-certificats', multi)
+        ):
+            self.stdout.write(self.style.SUCCESS(
+                f'{title} : accélération x{after_rate / before_rate:.2f}, '
+                f'taille {(after_size / before_size - 1) * 100:+.0f}%'
+            ))
@@ -0,0 +1,257 @@
+import json
+import os
+import secrets
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from accounts.models import User, CompanyProfile, Employee
+from certifications.certificate_generator import CertificateGenerator, certificate_render_key, certificate_cache_path
+from certifications.models import CertificationRequest, Certificate
+from .benchmark_certificates import sample_certificate
+
+
+def _init_render_worker():
+    """Worker de rendu : il n'accède pas à la base, et la connexion héritée du parent
+    (en pleine transaction) ne doit être ni utilisée ni fermée par lui"""
+    for inherited in connections.all():
+        inherited.connection = None
+
+
+class _Rollback(Exception):
+    """Annule les écritures en base du benchmark"""
+
+
+def _render_and_store(certificates):
+    """Worker : rendre et enregistrer un lot de certificats ; renvoie (latence, taille, nom) par certificat"""
+    generator = CertificateGenerator()
+    storage = Certificate._meta.get_field('pdf_file').storage
+    results = []
+    for certificate in certificates:
+        started = time.perf_counter()
+        render_key = certificate_render_key(certificate)
+        content = generator.generate_certificate_pdf(certificate).getvalue()
+        name = storage.save(certificate_cache_path(render_key), ContentFile(content))
+        results.append((time.perf_counter() - started, len(content), name, render_key))
+    return results
+
+
+def summarize(name, latencies, sizes, elapsed, cores):
+    """Statistiques d'un scénario : latences p50/p99, débit total et par cœur, taille moyenne"""
+    ordered = sorted(latencies)
+    quantiles = statistics.quantiles(ordered, n=100) if len(ordered) > 1 else ordered * 99
+    rate = len(ordered) / elapsed if elapsed else 0
+    return {
+        'scenario': name,
+        'count': len(ordered),
+        'p50_ms': round(quantiles[49] * 1000, 2),
+        'p99_ms': round(quantiles[98] * 1000, 2),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 2),
+        'per_second': round(rate, 1),
+        'per_second_per_core': round(rate / cores, 1),
+        'avg_size_kb': round(statistics.fmean(sizes) / 1024, 2) if sizes else 0,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Mesure le débit de délivrance des certificats : rendu seul, délivrance complète '
+            '(validation → certificat → PDF → stockage) et délivrance en masse')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Nombre de certificats par scénario unitaire (défaut: 200)',
+        )
+        parser.add_argument(
+            '--bulk-size',
+            type=int,
+            default=500,
+            help='Nombre de certificats délivrés en masse (défaut: 500)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Nombre de processus de rendu pour la délivrance en masse (défaut: nombre de cœurs)',
+        )
+        parser.add_argument(
+            '--scenarios',
+            default='render,issue,bulk',
+            help='Scénarios à exécuter, séparés par des virgules (défaut: render,issue,bulk)',
+        )
+        parser.add_argument(
+            '--output',
+            help='Enregistrer les résultats au format JSON',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Résultats JSON d\'une exécution précédente à comparer',
+        )
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        runners = {'render': self.bench_render, 'issue': self.bench_issue, 'bulk': self.bench_bulk}
+        unknown = set(scenarios) - set(runners)
+        if unknown:
+            raise CommandError(f'Scénario(s) inconnu(s) : {", ".join(sorted(unknown))}')
+        if options['iterations'] < 1 or options['bulk_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--iterations, --bulk-size et --workers doivent être positifs')
+
+        self.written = []
+        results = []
+        try:
+            for name in scenarios:
+                result = runners[name](options)
+                results.append(result)
+                self.report(result)
+        finally:
+            # Les PDF écrits pendant le benchmark ne correspondent à aucun certificat enregistré
+            storage = Certificate._meta.get_field('pdf_file').storage
+            for file_name in self.written:
+                storage.delete(file_name)
+
+        if options['baseline']:
+            self.compare(results, options['baseline'])
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'generated_at': timezone.now().isoformat(), 'results': results}, f, indent=2)
+            self.stdout.write(f'Résultats enregistrés dans {options["output"]}')
+
+    def report(self, result):
+        self.stdout.write(self.style.SUCCESS(
+            f'{result["scenario"]:<8} {result["count"]:5d} certificats   '
+            f'p50 {result["p50_ms"]:7.2f} ms   p99 {result["p99_ms"]:7.2f} ms   '
+            f'{result["per_second"]:7.1f}/s   {result["per_second_per_core"]:7.1f}/s/cœur   '
+            f'{result["avg_size_kb"]:6.1f} Ko'
+        ))
+
+    def compare(self, results, path):
+        with open(path) as f:
+            baseline = {result['scenario']: result for result in json.load(f)['results']}
+        self.stdout.write(f'Comparaison avec {path}')
+        for result in results:
+            before = baseline.get(result['scenario'])
+            if not before:
+                continue
+            deltas = []
+            for key, label in (('p50_ms', 'p50'), ('p99_ms', 'p99'), ('per_second_per_core', 'débit/cœur'), ('avg_size_kb', 'taille')):
+                if before[key]:
+                    deltas.append(f'{label} {(result[key] / before[key] - 1) * 100:+.1f}%')
+            self.stdout.write(f'  {result["scenario"]:<8} ' + '   '.join(deltas))
+
+    def bench_render(self, options):
+        """Rendu seul de CertificateGenerator.generate_certificate_pdf, sans base ni stockage"""
+        generator = CertificateGenerator()
+        certificates = [sample_certificate(i) for i in range(options['iterations'])]
+        # Premier rendu hors mesure (compilation de la partie fixe, imports)
+        generator.generate_certificate_pdf(certificates[0])
+
+        latencies = []
+        sizes = []
+        started = time.perf_counter()
+        for certificate in certificates:
+            render_started = time.perf_counter()
+            sizes.append(len(generator.generate_certificate_pdf(certificate).getvalue()))
+            latencies.append(time.perf_counter() - render_started)
+        return summarize('render', latencies, sizes, time.perf_counter() - started, 1)
+
+    def create_actors(self, suffix):
+        """Entreprise et employé temporaires (supprimés avec l'annulation de la transaction)"""
+        company_user = User.objects.create(username=f'bench-company-{suffix}', role='enterprise')
+        company = CompanyProfile.objects.create(
+            user=company_user, business_name='Entreprise de benchmark', ice_number='000000000000000',
+            rc_number='BENCH', responsible_name='Benchmark', address='1 boulevard Mohammed V, Casablanca'
+        )
+        employee_user = User.objects.create(username=f'bench-employee-{suffix}', role='employee')
+        employee = Employee.objects.create(user=employee_user, position='Benchmark', hire_date=timezone.now().date())
+        return company, employee
+
+    def bench_issue(self, options):
+        """Délivrance complète : validation → Certificate → rendu PDF → pdf_file.save, une demande à la fois"""
+        latencies = []
+        sizes = []
+        try:
+            with transaction.atomic():
+                company, employee = self.create_actors(secrets.token_hex(4))
+                requests = [
+                    CertificationRequest.objects.create(company=company, treatment_type='recycling', status='under_review')
+                    for _ in range(options['iterations'])
+                ]
+                started = time.perf_counter()
+                for certification_request in requests:
+                    issue_started = time.perf_counter()
+                    employee.valider_dossier(certification_request)
+                    certificate = employee.generer_certificat(certification_request)
+                    # Le rendu normalement planifié après validation de la transaction est fait ici
+                    certificate.generate()
+                    latencies.append(time.perf_counter() - issue_started)
+                    self.written.append(certificate.pdf_file.name)
+                    sizes.append(certificate.pdf_file.size)
+                elapsed = time.perf_counter() - started
+                raise _Rollback
+        except _Rollback:
+            pass
+        return summarize('issue', latencies, sizes, elapsed, 1)
+
+    def bench_bulk(self, options):
+        """Délivrance en masse : insertion groupée, rendu sur un pool de processus, mise à jour groupée"""
+        count = options['bulk_size']
+        workers = options['workers']
+        try:
+            with transaction.atomic():
+                company, employee = self.create_actors(secrets.token_hex(4))
+                started = time.perf_counter()
+                requests = CertificationRequest.objects.bulk_create([
+                    CertificationRequest(
+                        company=company, treatment_type='recycling', status='approved',
+                        validated_by=employee, reviewed_by=employee.user
+                    )
+                    for _ in range(count)
+                ])
+                if not connection.features.can_return_rows_from_bulk_insert:
+                    # MySQL ne renvoie pas les clés générées : relecture par l'entreprise créée pour ce scénario
+                    requests = list(CertificationRequest.objects.filter(company=company).order_by('id'))
+                certificates = Certificate.objects.bulk_create([
+                    Certificate(
+                        number=f'DEEE-BULK-{secrets.token_hex(6).upper()}',
+                        treatment_type='recycling',
+                        certification_request=certification_request,
+                        verification_token=secrets.token_urlsafe(16),
+                    )
+                    for certification_request in requests
+                ])
+                if not connection.features.can_return_rows_from_bulk_insert:
+                    # Relecture par numéro (unique), dans l'ordre des demandes
+                    by_number = Certificate.objects.select_related('certification_request').in_bulk(
+                        [certificate.number for certificate in certificates], field_name='number'
+                    )
+                    certificates = [by_number[certificate.number] for certificate in certificates]
+                # Les dates d'émission sont remplies par la base ; les relations sont déjà en mémoire
+                for certificate in certificates:
+                    certificate.issue_date = certificate.issue_date or timezone.now().date()
+                    certificate.certification_request.company = company
+
+                chunk_size = max(1, -(-count // (workers * 4)))
+                chunks = [certificates[i:i + chunk_size] for i in range(0, count, chunk_size)]
+                # Les processus enfants ne voient pas la transaction : ils ne font que rendre et stocker
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as executor:
+                    rendered = [result for chunk in executor.map(_render_and_store, chunks) for result in chunk]
+
+                for certificate, (_, _, name, render_key) in zip(certificates, rendered):
+                    certificate.pdf_file.name = name
+                    certificate.render_key = render_key
+                    self.written.append(name)
+                Certificate.objects.bulk_update(certificates, ['pdf_file', 'render_key'], batch_size=500)
+                elapsed = time.perf_counter() - started
+                raise _Rollback
+        except _Rollback:
+            pass
+        return summarize(
+            'bulk', [latency for latency, _, _, _ in rendered], [size for _, size, _, _ in rendered],
+            elapsed, min(workers, os.cpu_count() or 1)
+        )
@@ -0,0 +1,205 @@
+import os
+import time
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+from django.utils import timezone
+from certifications.cold_storage import cold_root
+from certifications.documents import RENDER_CACHE_PREFIX
+from certifications.models import StoredBlob, UploadSession
+from certifications.storage import delete_if_unreferenced, unreferenced_blobs
+
+# Caches reconstruits à la demande (documents.py) : jamais référencés par un champ
+EXCLUDED_PREFIXES = (RENDER_CACHE_PREFIX,)
+
+
+def _path_key(name):
+    """Clé de tri par composants de chemin : même ordre que le parcours trié des dossiers"""
+    return name.replace('\\', '/').split('/')
+
+
+def walk_media(root, relative=''):
+    """Fichiers sous root (nom relatif, entrée os.scandir), dans l'ordre de _path_key"""
+    try:
+        with os.scandir(os.path.join(root, relative)) as iterator:
+            entries = sorted(iterator, key=lambda entry: entry.name)
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        name = f'{relative}{entry.name}'
+        if entry.is_dir(follow_symlinks=False):
+            yield from walk_media(root, f'{name}/')
+        elif entry.is_file(follow_symlinks=False):
+            yield name, entry
+
+
+def orphans(files, referenced):
+    """Fichiers du flux trié `files` absents du flux trié de clés `referenced` (fusion en un passage)"""
+    references = iter(referenced)
+    current = next(references, None)
+    for name, entry in files:
+        key = _path_key(name)
+        while current is not None and current < key:
+            current = next(references, None)
+        if current != key:
+            yield name, entry
+
+
+def file_fields():
+    """(modèle, champ) pour chaque FileField du projet (documents, demandes, certificats, archives, aperçus...)"""
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField)
+    ]
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ('Supprime de MEDIA_ROOT les fichiers qui ne sont plus référencés par aucun champ fichier '
+            '(demandes refusées ou supprimées, envois interrompus)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Nombre de fichiers vérifiés et supprimés par lot (défaut: 1000)',
+        )
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help='Les fichiers modifiés depuis moins de N heures sont conservés (défaut: 24)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Affiche les fichiers orphelins sans rien supprimer',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size doit être positif')
+        if options['grace_hours'] < 0:
+            raise CommandError('--grace-hours doit être positif')
+        try:
+            default_storage.path('')
+        except NotImplementedError:
+            raise CommandError('Le nettoyage parcourt MEDIA_ROOT : stockage local uniquement')
+        self.root = os.path.abspath(settings.MEDIA_ROOT)
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        cutoff = time.time() - options['grace_hours'] * 3600
+
+        started = time.monotonic()
+        released = self.collect_unreferenced_blobs(options['verbosity'])
+        referenced = self.referenced_keys()
+        self.excluded = EXCLUDED_PREFIXES + self.protected_prefixes()
+        loaded = time.monotonic() - started
+
+        self.scanned = 0
+        counts = {'orphans': 0, 'bytes': 0, 'recent': 0}
+        for batch in _batches(orphans(self.scan(), referenced), self.batch_size):
+            candidates = []
+            for name, entry in batch:
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime >= cutoff:
+                    counts['recent'] += 1
+                    continue
+                candidates.append((name, stat.st_size))
+            # Références ajoutées depuis le chargement (même contenu envoyé à nouveau) : fichier conservé
+            still_referenced = self.referenced_among([name for name, _ in candidates])
+            for name, size in candidates:
+                if name in still_referenced:
+                    continue
+                counts['orphans'] += 1
+                counts['bytes'] += size
+                if options['verbosity'] > 1:
+                    self.stdout.write(name)
+                if not self.dry_run:
+                    self.remove(name)
+
+        elapsed = time.monotonic() - started
+        verb = 'à supprimer' if self.dry_run else 'supprimés'
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.scanned} fichier(s) parcourus en {elapsed:.2f}s '
+            f'({self.scanned / elapsed if elapsed else 0:.0f} fichiers/s, références chargées en {loaded:.2f}s) : '
+            f'{counts["orphans"]} orphelin(s) {verb} ({counts["bytes"] / 1024 / 1024:.1f} Mo), '
+            f'{counts["recent"]} récent(s) conservé(s), {released} fichier(s) partagé(s) sans référence {verb}'
+        ))
+
+    def collect_unreferenced_blobs(self, verbosity):
+        """Fichiers partagés dont la dernière référence a disparu sans suppression (arrêt, réservation abandonnée)"""
+        count = 0
+        for name in unreferenced_blobs().values_list('name', flat=True).iterator(chunk_size=self.batch_size):
+            if self.dry_run or delete_if_unreferenced(name):
+                count += 1
+                if verbosity > 1:
+                    self.stdout.write(name)
+        return count
+
+    def referenced_keys(self):
+        """Noms référencés par un champ fichier ou par StoredBlob, triés comme le parcours du disque"""
+        names = set()
+        for model, field_name in file_fields():
+            names.update(
+                model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True).iterator(chunk_size=self.batch_size)
+            )
+        names.update(StoredBlob.objects.values_list('name', flat=True).iterator(chunk_size=self.batch_size))
+        return sorted(_path_key(name) for name in names)
+
+    def referenced_among(self, names):
+        """Parmi ces noms, ceux qui sont référencés en base à cet instant (une requête par champ)"""
+        if not names:
+            return set()
+        found = set(StoredBlob.objects.filter(name__in=names).values_list('name', flat=True))
+        for model, field_name in file_fields():
+            found.update(model.objects.filter(**{f'{field_name}__in': names}).values_list(field_name, flat=True))
+        return found
+
+    def protected_prefixes(self):
+        """Fragments des téléversements en cours et stockage froid s'il est placé sous MEDIA_ROOT"""
+        sessions = UploadSession.objects.filter(document__isnull=True, expires_at__gte=timezone.now())
+        prefixes = [f'uploads/partial/{session_id}/' for session_id in sessions.values_list('id', flat=True)]
+        cold = os.path.relpath(os.path.abspath(cold_root()), self.root)
+        if not cold.startswith('..'):
+            prefixes.append(cold.replace(os.sep, '/').rstrip('/') + '/')
+        return tuple(prefixes)
+
+    def scan(self):
+        for name, entry in walk_media(self.root):
+            self.scanned += 1
+            # Fichiers cachés (.render_checkpoint, .gitkeep...) : état des commandes, pas des médias
+            if name.startswith(self.excluded) or os.path.basename(name).startswith('.'):
+                continue
+            yield name, entry
+
+    def remove(self, name):
+        path = os.path.join(self.root, name)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        # Dossiers répartis (ab/cd/) devenus vides : retirés jusqu'à MEDIA_ROOT exclu
+        directory = os.path.dirname(path)
+        while directory != self.root and directory.startswith(self.root):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from certifications.models import SupportingDocument
+from certifications.previews import generate_preview
+
+
+class Command(BaseCommand):
+    help = 'Produit les aperçus des documents justificatifs envoyés avant la génération automatique'
+
+    def handle(self, *args, **options):
+        queryset = SupportingDocument.objects.exclude(file='').filter(preview='')
+        # Un aperçu par fichier : les documents identiques reçoivent le même
+        ids = list(queryset.order_by('file', 'id').values_list('file', 'id'))
+        seen = set()
+
+        started = time.monotonic()
+        for name, document_id in ids:
+            if name in seen:
+                continue
+            seen.add(name)
+            generate_preview(document_id)
+
+        created = SupportingDocument.objects.exclude(preview='').count()
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(seen)} fichier(s) traités en {time.monotonic() - started:.2f}s ; '
+            f'{created} document(s) avec aperçu'
+        ))
@@ -0,0 +1,122 @@
+import http.client
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import get_internal_wsgi_application
+from django.test import RequestFactory
+from django.urls import reverse
+from certifications.models import Certificate
+from certifications.verification import sign_token
+
+
+class Command(BaseCommand):
+    help = 'Test de charge de la vérification publique des certificats (certificates/shared/<token>/)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=10000,
+            help='Nombre total de vérifications (défaut: 10000)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Nombre de clients simultanés (défaut: 8)',
+        )
+        parser.add_argument(
+            '--tokens',
+            type=int,
+            default=1000,
+            help='Nombre de certificats distincts interrogés (défaut: 1000)',
+        )
+        parser.add_argument(
+            '--url',
+            help='URL de base d\'un serveur démarré (ex: http://127.0.0.1:8000) ; sans cette option, '
+                 'les requêtes sont passées directement à l\'application WSGI (WSGI_APPLICATION)',
+        )
+
+    def handle(self, *args, **options):
+        tokens = list(
+            Certificate.objects.exclude(verification_token__isnull=True)
+            .values_list('verification_token', flat=True)[:options['tokens']]
+        )
+        if not tokens:
+            raise CommandError('Aucun certificat à vérifier')
+        paths = [reverse('certificate-shared', kwargs={'token': sign_token(token)}) for token in tokens]
+
+        total = options['requests']
+        concurrency = options['concurrency']
+        per_worker = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+        if options['url']:
+            target = urlsplit(options['url'])
+            run = lambda count: self.run_http(target, paths, count)
+        else:
+            application = get_internal_wsgi_application()
+            run = lambda count: self.run_in_process(application, paths, count)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(run, per_worker))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for worker_latencies, _ in results for latency in worker_latencies)
+        failures = sum(worker_failures for _, worker_failures in results)
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        self.stdout.write(
+            f'{len(latencies)} vérifications en {elapsed:.2f}s avec {concurrency} clients '
+            f'({len(tokens)} certificats distincts)'
+        )
+        self.stdout.write(
+            f'Latence : p50 {quantiles[49] * 1000:.2f} ms, p99 {quantiles[98] * 1000:.2f} ms, '
+            f'max {latencies[-1] * 1000:.2f} ms'
+        )
+        style = self.style.SUCCESS if failures == 0 else self.style.ERROR
+        self.stdout.write(style(f'{len(latencies) / elapsed:.0f} vérifications/s, {failures} échec(s)'))
+
+    def run_in_process(self, application, paths, count):
+        factory = RequestFactory(HTTP_HOST='localhost')
+        environs = {path: factory.get(path).environ for path in paths}
+        latencies = []
+        failures = 0
+        for _ in range(count):
+            path = random.choice(paths)
+            statuses = []
+            started = time.perf_counter()
+            response = application(dict(environs[path]), lambda status, headers: statuses.append(status))
+            try:
+                b''.join(response)
+            finally:
+                if hasattr(response, 'close'):
+                    response.close()
+            latencies.append(time.perf_counter() - started)
+            if not statuses[0].startswith('200'):
+                failures += 1
+        return latencies, failures
+
+    def run_http(self, target, paths, count):
+        connection_class = http.client.HTTPSConnection if target.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(target.netloc, timeout=10)
+        prefix = target.path.rstrip('/')
+        latencies = []
+        failures = 0
+        for _ in range(count):
+            path = prefix + random.choice(paths)
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    failures += 1
+            except (OSError, http.client.HTTPException):
+                failures += 1
+                connection.close()
+                connection = connection_class(target.netloc, timeout=10)
+            latencies.append(time.perf_counter() - started)
+        connection.close()
+        return latencies, failures
@@ -0,0 +1,201 @@
+import os
+import time
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, Count, Value, When
+from certifications.certificate_generator import certificate_cache_path
+from certifications.documents import document_cache_path
+from certifications.models import Certificate, SupportingDocument
+from certifications.previews import preview_name
+from certifications.storage import CAS_PREFIX, REFERENCING_FIELDS, acquire, document_storage
+
+
+def _move(storage, old_name, new_name):
+    """Déplacer un fichier dans un même stockage : renommage sur disque local, sinon copie puis suppression"""
+    try:
+        old_path, new_path = storage.path(old_name), storage.path(new_name)
+    except NotImplementedError:
+        with storage.open(old_name, 'rb') as f:
+            storage.save(new_name, f)
+        storage.delete(old_name)
+        return
+    os.makedirs(os.path.dirname(new_path), exist_ok=True)
+    os.replace(old_path, new_path)
+
+
+def _rename_rows(model, field_name, mapping):
+    """Une seule requête UPDATE pour tout un lot de renommages"""
+    return model.objects.filter(**{f'{field_name}__in': list(mapping)}).update(**{
+        field_name: Case(*[When(**{field_name: old}, then=Value(new)) for old, new in mapping.items()])
+    })
+
+
+class Command(BaseCommand):
+    help = ('Déplace les fichiers existants vers la disposition répartie en sous-dossiers '
+            '(documents adressés par contenu, PDF rendus) et met à jour les références en base')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Nombre de fichiers déplacés par transaction (défaut: 500)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Affiche ce qui serait déplacé sans rien modifier',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size doit être positif')
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        self.moved = 0
+        self.bytes = 0
+        self.missing = []
+
+        started = time.monotonic()
+        self.relocate_documents()
+        self.relocate_certificates()
+        self.relocate_rendered_documents()
+        elapsed = time.monotonic() - started
+
+        for name in self.missing:
+            self.stdout.write(self.style.ERROR(f'Fichier introuvable : {name}'))
+        verb = 'à déplacer' if self.dry_run else 'déplacés'
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.moved} fichier(s) {verb} ({self.bytes / 1024 / 1024:.1f} Mo) en {elapsed:.2f}s '
+            f'({self.moved / elapsed if elapsed else 0:.1f} fichiers/s), {len(self.missing)} introuvable(s)'
+        ))
+
+    def legacy_document_names(self):
+        """Noms hors de documents/ référencés par un champ adressé par contenu, tous modèles confondus"""
+        names = set()
+        for label, field_name in REFERENCING_FIELDS:
+            model = apps.get_model(label)
+            names.update(
+                model.objects.exclude(**{f'{field_name}__startswith': CAS_PREFIX})
+                .exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True).distinct()
+            )
+        return sorted(names)
+
+    def relocate_documents(self):
+        """Documents envoyés avant le stockage adressé par contenu : ré-enregistrés sous leur empreinte"""
+        storage = document_storage()
+        names = self.legacy_document_names()
+        for start in range(0, len(names), self.batch_size):
+            mapping = {}
+            for name in names[start:start + self.batch_size]:
+                if not storage.exists(name):
+                    self.missing.append(name)
+                    continue
+                self.bytes += storage.size(name)
+                if self.dry_run:
+                    mapping[name] = None
+                    continue
+                with storage.open(name, 'rb') as f:
+                    mapping[name] = storage.save(name, File(f, name=name))
+            self.moved += len(mapping)
+            if self.dry_run or not mapping:
+                continue
+
+            with transaction.atomic():
+                references = []
+                for label, field_name in REFERENCING_FIELDS:
+                    model = apps.get_model(label)
+                    # update() n'envoie pas post_save : les références sont comptées ici
+                    for name, count in model.objects.filter(**{f'{field_name}__in': list(mapping)}).values(
+                        field_name
+                    ).annotate(count=Count('pk')).order_by().values_list(field_name, 'count'):
+                        references += [mapping[name]] * count
+                    _rename_rows(model, field_name, mapping)
+                acquire(references)
+                self.relocate_previews(mapping)
+            # Une archive peut désigner le PDF d'un certificat : ce fichier reste en place pour lui
+            kept = set(Certificate.objects.filter(pdf_file__in=list(mapping)).values_list('pdf_file', flat=True))
+            old_names = [name for name in mapping if name not in kept]
+            transaction.on_commit(lambda old_names=old_names: [storage.delete(name) for name in old_names])
+
+    def relocate_previews(self, mapping):
+        """Les aperçus suivent leur document ; un aperçu déjà présent pour le même contenu est conservé"""
+        previews = {}
+        for old, new in mapping.items():
+            if not default_storage.exists(preview_name(old)):
+                continue
+            if default_storage.exists(preview_name(new)):
+                default_storage.delete(preview_name(old))
+            else:
+                _move(default_storage, preview_name(old), preview_name(new))
+            previews[preview_name(old)] = preview_name(new)
+        if previews:
+            _rename_rows(SupportingDocument, 'preview', previews)
+
+    def relocate_certificates(self):
+        """PDF des certificats rendus à plat (certificates/rendered/<clé>.pdf) : déplacés dans leur sous-dossier"""
+        storage = Certificate._meta.get_field('pdf_file').storage
+        queryset = Certificate.objects.exclude(render_key='').exclude(pdf_file='').exclude(pdf_file__isnull=True)
+        rows = list(queryset.values_list('pdf_file', 'render_key').order_by('id'))
+        seen = set()
+        mapping = {}
+        for name, render_key in rows:
+            target = certificate_cache_path(render_key)
+            if name == target or name in seen:
+                continue
+            seen.add(name)
+            if not storage.exists(name):
+                self.missing.append(name)
+                continue
+            self.bytes += storage.size(name)
+            mapping[name] = target
+            if len(mapping) >= self.batch_size:
+                self.apply_moves(storage, Certificate, 'pdf_file', mapping)
+                mapping = {}
+        if mapping:
+            self.apply_moves(storage, Certificate, 'pdf_file', mapping)
+
+    def apply_moves(self, storage, model, field_name, mapping):
+        self.moved += len(mapping)
+        if self.dry_run:
+            return
+        with transaction.atomic():
+            for old, new in mapping.items():
+                if storage.exists(new):
+                    storage.delete(old)
+                else:
+                    _move(storage, old, new)
+            _rename_rows(model, field_name, mapping)
+
+    def relocate_rendered_documents(self):
+        """Rapports et reçus en cache sous l'ancien emplacement (documents/rendered/<type>/[ab/cd/]<clé>.pdf),
+        retrouvés par leur clé et déplacés hors de l'espace adressé par contenu"""
+        root = 'documents/rendered/'
+        if not default_storage.exists(root):
+            return
+        for kind in default_storage.listdir(root)[0]:
+            for old in self.stored_files(f'{root}{kind}/'):
+                key, extension = os.path.splitext(os.path.basename(old))
+                if extension != '.pdf':
+                    continue
+                self.bytes += default_storage.size(old)
+                self.moved += 1
+                if self.dry_run:
+                    continue
+                new = document_cache_path(kind, key)
+                if default_storage.exists(new):
+                    default_storage.delete(old)
+                else:
+                    _move(default_storage, old, new)
+
+    def stored_files(self, directory):
+        """Fichiers d'un dossier du stockage par défaut et de ses sous-dossiers"""
+        directories, files = default_storage.listdir(directory)
+        for filename in files:
+            yield f'{directory}{filename}'
+        for name in directories:
+            yield from self.stored_files(f'{directory}{name}/')
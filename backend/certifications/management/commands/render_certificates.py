@@ -0,0 +1,157 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+# Modèles importés dans les fonctions : avec les méthodes de démarrage spawn et forkserver,
+# les workers importent ce module avant que _init_worker n'ait chargé Django
+
+
+def _init_worker():
+    """Initialisation d'un worker : Django chargé, connexions héritées du parent abandonnées"""
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _render_chunk(certificate_ids, force):
+    """Rendre un lot de certificats dans un worker (une connexion DB par processus)"""
+    from certifications.models import Certificate
+
+    rendered = 0
+    skipped = 0
+    errors = []
+    certificates = Certificate.objects.select_related(
+        'certification_request__company'
+    ).filter(id__in=certificate_ids)
+    for certificate in certificates:
+        previous = (certificate.pdf_file.name, certificate.render_key)
+        try:
+            certificate.generate(force=force)
+        except Exception as e:
+            errors.append((certificate.id, str(e)))
+            continue
+        if force or (certificate.pdf_file.name, certificate.render_key) != previous:
+            rendered += 1
+        else:
+            skipped += 1
+    return certificate_ids[-1], len(certificate_ids), rendered, skipped, errors
+
+
+class Command(BaseCommand):
+    help = 'Re-rend en parallèle les PDF des certificats (pool de processus, reprise possible)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Nombre de processus de rendu (défaut: nombre de cœurs)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100,
+            help='Nombre de certificats par lot (défaut: 100)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-rend même les certificats dont le PDF en cache est à jour',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(settings.MEDIA_ROOT, 'certificates', '.render_checkpoint'),
+            help='Fichier de reprise contenant le dernier ID traité',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore le point de reprise et recommence depuis le début',
+        )
+
+    def handle(self, *args, **options):
+        from certifications.models import Certificate
+
+        if options['workers'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--workers et --chunk-size doivent être positifs')
+
+        checkpoint = options['checkpoint']
+        start_after = 0 if options['restart'] else self.read_checkpoint(checkpoint)
+        if start_after:
+            self.stdout.write(f'Reprise après le certificat #{start_after}')
+
+        ids = list(
+            Certificate.objects.filter(id__gt=start_after).order_by('id').values_list('id', flat=True)
+        )
+        if not ids:
+            self.stdout.write(self.style.SUCCESS('Aucun certificat à rendre'))
+            return
+        chunks = [ids[i:i + options['chunk_size']] for i in range(0, len(ids), options['chunk_size'])]
+
+        # Les processus enfants ne doivent pas partager la connexion du parent
+        connections.close_all()
+
+        started = time.monotonic()
+        done = rendered = skipped = 0
+        error_count = 0
+        # Le point de reprise n'avance que sur des lots contigus terminés sans erreur :
+        # un lot en erreur est repris (avec tous les suivants) au prochain lancement
+        finished = {}
+        next_chunk = 0
+        failed_ids = []
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as executor:
+            futures = {
+                executor.submit(_render_chunk, chunk, options['force']): index
+                for index, chunk in enumerate(chunks)
+            }
+            for future in as_completed(futures):
+                last_id, count, chunk_rendered, chunk_skipped, errors = future.result()
+                done += count
+                rendered += chunk_rendered
+                skipped += chunk_skipped
+                error_count += len(errors)
+                for certificate_id, message in errors:
+                    failed_ids.append(certificate_id)
+                    self.stdout.write(self.style.ERROR(f'Certificat #{certificate_id} : {message}'))
+
+                finished[futures[future]] = None if errors else last_id
+                while finished.get(next_chunk) is not None:
+                    self.write_checkpoint(checkpoint, finished.pop(next_chunk))
+                    next_chunk += 1
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'{done}/{len(ids)} certificats traités '
+                    f'({done / elapsed:.1f}/s, {rendered} rendus, {skipped} à jour)'
+                )
+
+        elapsed = time.monotonic() - started
+        if failed_ids:
+            self.stdout.write(self.style.ERROR(
+                f'Certificats en erreur : {", ".join(f"#{certificate_id}" for certificate_id in sorted(failed_ids))} ; '
+                f'point de reprise conservé ({checkpoint}), relancer la commande pour les reprendre'
+            ))
+        elif os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'{done} certificats traités en {elapsed:.2f}s avec {options["workers"]} processus : '
+            f'{rendered} rendus, {skipped} déjà à jour, {error_count} erreur(s) '
+            f'({done / elapsed:.1f} certificats/s, {rendered / elapsed:.1f} rendus/s)'
+        ))
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def write_checkpoint(self, path, certificate_id):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(certificate_id))
+        os.replace(tmp_path, path)
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.2 on 2026-10-18 23:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_companyprofile_accounts_co_updated_663d05_idx'),
+        ('certifications', '0008_authoritynotification'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_type', models.CharField(choices=[('requests', 'Demande de certification'), ('certificates', 'Certificat'), ('companies', 'Profil entreprise')], max_length=20, verbose_name='Type de données')),
+                ('object_id', models.PositiveIntegerField(verbose_name="ID de l'objet")),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='Supprimé le')),
+            ],
+            options={
+                'verbose_name': 'Suppression exportable',
+                'verbose_name_plural': 'Suppressions exportables',
+            },
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Dernière modification'),
+        ),
+        migrations.AddField(
+            model_name='certificationrequest',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Dernière modification'),
+        ),
+        migrations.AddIndex(
+            model_name='certificate',
+            index=models.Index(fields=['updated_at', 'id'], name='certificati_updated_b8160c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='certificationrequest',
+            index=models.Index(fields=['updated_at', 'id'], name='certificati_updated_f41b3a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exporttombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='certificati_deleted_739777_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certifications', '0009_exporttombstone_certificate_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificate',
+            name='render_key',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='Clé de rendu du PDF'),
+        ),
+    ]
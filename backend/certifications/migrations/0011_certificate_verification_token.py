@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-18 23:17
+
+import secrets
+
+from django.db import migrations, models
+
+
+def populate_verification_tokens(apps, schema_editor):
+    Certificate = apps.get_model('certifications', 'Certificate')
+    certificates = list(Certificate.objects.filter(verification_token__isnull=True).only('id'))
+    for certificate in certificates:
+        certificate.verification_token = secrets.token_urlsafe(16)
+    Certificate.objects.bulk_update(certificates, ['verification_token'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certifications', '0010_certificate_render_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificate',
+            name='verification_token',
+            field=models.CharField(editable=False, max_length=32, null=True, unique=True, verbose_name='Jeton de vérification publique'),
+        ),
+        migrations.RunPython(populate_verification_tokens, migrations.RunPython.noop),
+    ]
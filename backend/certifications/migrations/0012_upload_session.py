@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-18 23:26
+
+import certifications.models
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certifications', '0011_certificate_verification_token'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='Nom du fichier')),
+                ('name', models.CharField(blank=True, max_length=255, verbose_name='Nom du document')),
+                ('document_type', models.CharField(choices=[('technical_report', 'Rapport technique'), ('environmental_study', 'Étude environnementale'), ('authorization', 'Autorisation'), ('certificate', 'Certificat'), ('invoice', 'Facture'), ('contract', 'Contrat'), ('other', 'Autre')], default='other', max_length=50, verbose_name='Type de document')),
+                ('description', models.TextField(blank=True, verbose_name='Description')),
+                ('total_size', models.BigIntegerField(verbose_name='Taille totale (octets)')),
+                ('received_size', models.BigIntegerField(default=0, verbose_name='Octets reçus')),
+                ('parts', models.PositiveIntegerField(default=0, verbose_name='Nombre de fragments reçus')),
+                ('checksum', models.CharField(blank=True, max_length=64, verbose_name='Empreinte chaînée des fragments')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(default=certifications.models.default_upload_expiry, verbose_name='Expire le')),
+                ('certification_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='certifications.certificationrequest')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+                ('document', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_session', to='certifications.supportingdocument')),
+            ],
+            options={
+                'verbose_name': 'Téléversement fractionné',
+                'verbose_name_plural': 'Téléversements fractionnés',
+                'indexes': [models.Index(fields=['expires_at'], name='certificati_expires_8453cb_idx')],
+            },
+        ),
+    ]
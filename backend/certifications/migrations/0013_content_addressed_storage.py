@@ -0,0 +1,45 @@
+# Generated by Django 5.0.2 on 2026-10-18 23:30
+
+import certifications.models
+import certifications.storage
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certifications', '0012_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Nom dans le stockage')),
+                ('size', models.BigIntegerField(default=0, verbose_name='Taille (octets)')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='Nombre de références')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Fichier partagé',
+                'verbose_name_plural': 'Fichiers partagés',
+            },
+        ),
+        migrations.AlterField(
+            model_name='certificationrequest',
+            name='supporting_documents',
+            field=models.FileField(blank=True, help_text='Document principal de la demande', null=True, storage=certifications.storage.document_storage, upload_to=certifications.models.supporting_documents_upload_path, validators=[django.core.validators.FileExtensionValidator(['pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png'])], verbose_name='Document principal'),
+        ),
+        migrations.AlterField(
+            model_name='documentarchive',
+            name='file_path',
+            field=models.FileField(storage=certifications.storage.document_storage, upload_to='archives/'),
+        ),
+        migrations.AlterField(
+            model_name='supportingdocument',
+            name='file',
+            field=models.FileField(storage=certifications.storage.document_storage, upload_to=certifications.models.certification_upload_path, validators=[django.core.validators.FileExtensionValidator(['pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png', 'xlsx', 'xls'])], verbose_name='Fichier'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.2 on 2026-10-18 23:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certifications', '0013_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificationrequest',
+            name='document_mime_type',
+            field=models.CharField(blank=True, db_index=True, max_length=100, verbose_name='Type MIME du document'),
+        ),
+        migrations.AddField(
+            model_name='certificationrequest',
+            name='document_page_count',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Nombre de pages du document'),
+        ),
+        migrations.AddField(
+            model_name='certificationrequest',
+            name='document_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='Empreinte SHA-256 du document'),
+        ),
+        migrations.AddField(
+            model_name='certificationrequest',
+            name='document_size',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Taille du document (octets)'),
+        ),
+        migrations.AddField(
+            model_name='supportingdocument',
+            name='file_mime_type',
+            field=models.CharField(blank=True, db_index=True, max_length=100, verbose_name='Type MIME'),
+        ),
+        migrations.AddField(
+            model_name='supportingdocument',
+            name='file_page_count',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Nombre de pages'),
+        ),
+        migrations.AddField(
+            model_name='supportingdocument',
+            name='file_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='Empreinte SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='supportingdocument',
+            name='file_size',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Taille (octets)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 23:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certifications', '0014_file_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supportingdocument',
+            name='preview',
+            field=models.FileField(blank=True, editable=False, max_length=255, upload_to='', verbose_name='Aperçu'),
+        ),
+    ]
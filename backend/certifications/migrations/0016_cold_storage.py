@@ -0,0 +1,45 @@
+# Generated by Django 5.0.2 on 2026-10-18 23:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certifications', '0015_document_preview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivePack',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name="Nom du fichier d'archive")),
+                ('size', models.BigIntegerField(default=0, verbose_name='Taille compressée (octets)')),
+                ('member_count', models.PositiveIntegerField(default=0, verbose_name='Nombre de fichiers')),
+                ('sealed', models.BooleanField(default=False, verbose_name='Scellé')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archive froide',
+                'verbose_name_plural': 'Archives froides',
+            },
+        ),
+        migrations.CreateModel(
+            name='PackedFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Nom dans le stockage')),
+                ('offset', models.BigIntegerField(verbose_name="Position dans l'archive")),
+                ('length', models.BigIntegerField(verbose_name='Taille compressée (octets)')),
+                ('size', models.BigIntegerField(verbose_name="Taille d'origine (octets)")),
+                ('packed_at', models.DateTimeField(auto_now_add=True)),
+                ('pack', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='files', to='certifications.archivepack')),
+            ],
+            options={
+                'verbose_name': 'Fichier archivé',
+                'verbose_name_plural': 'Fichiers archivés',
+            },
+        ),
+    ]
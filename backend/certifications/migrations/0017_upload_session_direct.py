@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certifications', '0016_cold_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='direct',
+            field=models.BooleanField(default=False, verbose_name='Dépôt direct dans le stockage'),
+        ),
+    ]
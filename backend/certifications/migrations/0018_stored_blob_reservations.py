@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certifications', '0017_upload_session_direct'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedblob',
+            name='pending',
+            field=models.PositiveIntegerField(default=0, verbose_name='Écritures en attente de référence'),
+        ),
+        migrations.AddField(
+            model_name='storedblob',
+            name='reserved_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Dernière réservation'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certifications', '0018_stored_blob_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='part_names',
+            field=models.JSONField(blank=True, default=list, verbose_name='Noms des fragments dans le stockage'),
+        ),
+    ]
@@ -1,24 +1,28 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import FileExtensionValidator
 from django.utils import timezone
 from datetime import timedelta, date
 from accounts.models import User, CompanyProfile, Employee
 import os
+import secrets
+import uuid
 
 def default_expiry_date():
     """Fonction pour calculer la date d'expiration par défaut (1 an)"""
     return timezone.now().date() + timedelta(days=365)
 
+from .storage import document_storage, sharded_upload_path
+from .file_metadata import save_pending_file
+
 def certification_upload_path(instance, filename):
     """Fonction pour générer le chemin d'upload des documents de certification"""
-    # Créer un dossier par entreprise et par demande
-    company_name = instance.certification_request.company.business_name.replace(' ', '_')
-    return f'certification_requests/{company_name}/request_{instance.certification_request.id}/{filename}'
+    # Identifiant attribué avant l'écriture et réparti en sous-dossiers (pas de « request_None »)
+    return sharded_upload_path('certification_requests/documents/', filename)
 
 def supporting_documents_upload_path(instance, filename):
     """Fonction pour générer le chemin d'upload des documents justificatifs"""
-    company_name = instance.company.business_name.replace(' ', '_')
-    return f'certification_requests/{company_name}/request_{instance.id}/supporting_documents/{filename}'
+    # La demande n'a pas encore d'id lors de sa création : le chemin n'en dépend pas
+    return sharded_upload_path('certification_requests/main/', filename)
 
 class CertificationRequest(models.Model):
     """Modèle pour les demandes de certification (DemandeFormulaire dans le diagramme)"""
@@ -46,20 +50,34 @@ class CertificationRequest(models.Model):
     # Document principal (pour compatibilité avec l'ancien système)
     supporting_documents = models.FileField(
         upload_to=supporting_documents_upload_path,
+        storage=document_storage,
         validators=[FileExtensionValidator(['pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png'])],
         verbose_name="Document principal",
         null=True,
         blank=True,
         help_text="Document principal de la demande"
     )
+    # Métadonnées du document principal, relevées à l'envoi
+    document_size = models.BigIntegerField(null=True, blank=True, verbose_name="Taille du document (octets)")
+    document_mime_type = models.CharField(max_length=100, blank=True, db_index=True, verbose_name="Type MIME du document")
+    document_sha256 = models.CharField(max_length=64, blank=True, db_index=True, verbose_name="Empreinte SHA-256 du document")
+    document_page_count = models.PositiveIntegerField(null=True, blank=True, verbose_name="Nombre de pages du document")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Dernière modification")
 
     class Meta:
         verbose_name = "Demande de certification"
         verbose_name_plural = "Demandes de certification"
+        indexes = [
+            models.Index(fields=['updated_at', 'id']),
+        ]
 
     def __str__(self):
         return f"Demande {self.id} - {self.company.business_name}"
 
+    def save(self, *args, **kwargs):
+        save_pending_file(self, 'supporting_documents', 'document_')
+        super().save(*args, **kwargs)
+
     def get_all_documents(self):
         """Retourne tous les documents associés à cette demande"""
         documents = []
@@ -108,9 +126,17 @@ class SupportingDocument(models.Model):
     )
     file = models.FileField(
         upload_to=certification_upload_path,
+        storage=document_storage,
         validators=[FileExtensionValidator(['pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png', 'xlsx', 'xls'])],
         verbose_name="Fichier"
     )
+    # Métadonnées relevées une fois à l'envoi : aucune lecture du disque pour les listes
+    file_size = models.BigIntegerField(null=True, blank=True, verbose_name="Taille (octets)")
+    file_mime_type = models.CharField(max_length=100, blank=True, db_index=True, verbose_name="Type MIME")
+    file_sha256 = models.CharField(max_length=64, blank=True, db_index=True, verbose_name="Empreinte SHA-256")
+    file_page_count = models.PositiveIntegerField(null=True, blank=True, verbose_name="Nombre de pages")
+    # Vignette ou première page, produite en arrière-plan après l'envoi (previews)
+    preview = models.FileField(max_length=255, blank=True, editable=False, verbose_name="Aperçu")
     description = models.TextField(blank=True, verbose_name="Description")
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
@@ -124,8 +150,77 @@ class SupportingDocument(models.Model):
     def save(self, *args, **kwargs):
         if not self.name and self.file:
             self.name = os.path.basename(self.file.name)
+        save_pending_file(self, 'file', 'file_')
         super().save(*args, **kwargs)
 
+def default_upload_expiry():
+    """Les téléversements fractionnés inachevés expirent après 24 heures"""
+    return timezone.now() + timedelta(hours=24)
+
+class UploadSession(models.Model):
+    """Téléversement fractionné et reprenable d'un document justificatif"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    certification_request = models.ForeignKey(
+        CertificationRequest,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255, verbose_name="Nom du fichier")
+    name = models.CharField(max_length=255, blank=True, verbose_name="Nom du document")
+    document_type = models.CharField(
+        max_length=50,
+        choices=SupportingDocument.DOCUMENT_TYPE_CHOICES,
+        default='other',
+        verbose_name="Type de document"
+    )
+    description = models.TextField(blank=True, verbose_name="Description")
+    total_size = models.BigIntegerField(verbose_name="Taille totale (octets)")
+    received_size = models.BigIntegerField(default=0, verbose_name="Octets reçus")
+    parts = models.PositiveIntegerField(default=0, verbose_name="Nombre de fragments reçus")
+    checksum = models.CharField(max_length=64, blank=True, verbose_name="Empreinte chaînée des fragments")
+    part_names = models.JSONField(default=list, blank=True, verbose_name="Noms des fragments dans le stockage")
+    # Fichier déposé en une fois dans le stockage par un PUT signé (upload_url), sans fragments
+    direct = models.BooleanField(default=False, verbose_name="Dépôt direct dans le stockage")
+    document = models.OneToOneField(
+        SupportingDocument,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload_session'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=default_upload_expiry, verbose_name="Expire le")
+
+    class Meta:
+        verbose_name = "Téléversement fractionné"
+        verbose_name_plural = "Téléversements fractionnés"
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"Téléversement {self.filename} ({self.received_size}/{self.total_size})"
+
+    @property
+    def is_complete(self):
+        return self.received_size == self.total_size
+
+    def part_name(self, index):
+        """Emplacement d'un fragment dans le stockage"""
+        return f'uploads/partial/{self.id}/{index:06d}'
+
+    def chunk_name(self, start):
+        """Emplacement propre à un envoi de fragment : un essai interrompu ne peut pas être repris par erreur"""
+        return f'uploads/partial/{self.id}/{start:012d}-{uuid.uuid4().hex[:8]}'
+
+    def stored_part_names(self):
+        """Noms réels des fragments reçus, dans l'ordre"""
+        if self.part_names:
+            return list(self.part_names)
+        # Session directe : le fichier a pu être déposé sans être encore compté
+        return [self.part_name(index) for index in range(self.parts or (1 if self.direct else 0))]
+
 class Payment(models.Model):
     """Modèle pour les paiements de certification"""
     PAYMENT_STATUS_CHOICES = [
@@ -199,23 +294,60 @@ class Certificate(models.Model):
         related_name='certificate'
     )
     is_active = models.BooleanField(default=True, verbose_name="Actif")
+    render_key = models.CharField(max_length=64, blank=True, default='', verbose_name="Clé de rendu du PDF")
+    verification_token = models.CharField(
+        max_length=32,
+        unique=True,
+        null=True,
+        editable=False,
+        verbose_name="Jeton de vérification publique"
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Dernière modification")
     
-    def generate(self):
-        """Méthode pour générer le certificat"""
-        from .certificate_generator import CertificateGenerator
+    def save(self, *args, **kwargs):
+        if not self.verification_token:
+            self.verification_token = secrets.token_urlsafe(16)
+        super().save(*args, **kwargs)
+    
+    @property
+    def share_token(self):
+        """Jeton signé à publier (lien ou QR code) pour la vérification publique"""
+        from .verification import sign_token
+        return sign_token(self.verification_token) if self.verification_token else None
+    
+    def generate(self, force=False):
+        """Méthode pour générer le certificat
+
+        Le PDF est rendu une seule fois par clé de cache (champs imprimés + version du
+        gabarit) ; il est re-rendu si l'un de ces champs change ou si le fichier a disparu.
+        `force` ignore le cache et remplace le PDF existant.
+        """
+        from .certificate_generator import (
+            CertificateGenerator, certificate_render_key, certificate_cache_path, release_certificate_pdf
+        )
+        from .storage import overwrite
         from django.core.files.base import ContentFile
         
-        if not self.pdf_file:
+        render_key = certificate_render_key(self)
+        if not force and self.pdf_file and self.render_key == render_key and self.pdf_file.storage.exists(self.pdf_file.name):
+            return self.pdf_file
+        
+        storage = self.pdf_file.storage
+        path = certificate_cache_path(render_key)
+        if force or not storage.exists(path):
             generator = CertificateGenerator()
             pdf_buffer = generator.generate_certificate_pdf(self)
-            
-            # Sauvegarder le PDF
-            pdf_filename = f"certificat_{self.number}.pdf"
-            self.pdf_file.save(
-                pdf_filename,
-                ContentFile(pdf_buffer.getvalue()),
-                save=True
-            )
+            # Nom fixe remplacé d'un bloc : deux rendus simultanés (requête et pool) ne créent pas de doublon
+            overwrite(storage, path, ContentFile(pdf_buffer.getvalue()))
+        
+        # Sauvegarder le PDF
+        previous = self.pdf_file.name
+        self.pdf_file.name = path
+        self.render_key = render_key
+        self.save(update_fields=['pdf_file', 'render_key'])
+        if previous and previous != path:
+            # Clé de rendu modifiée : l'ancien PDF n'a plus de propriétaire
+            transaction.on_commit(lambda: release_certificate_pdf(storage, previous))
         
         return self.pdf_file
     
@@ -237,6 +369,9 @@ class Certificate(models.Model):
     class Meta:
         verbose_name = "Certificat"
         verbose_name_plural = "Certificats"
+        indexes = [
+            models.Index(fields=['updated_at', 'id']),
+        ]
 
     def __str__(self):
         return f"Certificat {self.number}"
@@ -250,8 +385,9 @@ class RejectionReport(models.Model):
     rejected_by = models.ForeignKey(Employee, on_delete=models.SET_NULL, null=True)
 
     def generate(self):
-        """Méthode pour générer le rapport de refus"""
-        pass
+        """Méthode pour générer le rapport de refus ; renvoie le chemin du PDF dans le stockage"""
+        from .documents import get_document, rejection_report_data
+        return get_document('rejection_report', rejection_report_data(self))
 
     class Meta:
         verbose_name = "Rapport de refus"
@@ -367,7 +503,7 @@ class DocumentArchive(models.Model):
 
     certification_request = models.ForeignKey(CertificationRequest, on_delete=models.CASCADE, related_name='archived_documents')
     document_type = models.CharField(max_length=30, choices=DOCUMENT_TYPE_CHOICES)
-    file_path = models.FileField(upload_to='archives/')
+    file_path = models.FileField(upload_to='archives/', storage=document_storage)
     original_filename = models.CharField(max_length=255)
     archived_at = models.DateTimeField(auto_now_add=True)
     archived_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
@@ -379,6 +515,75 @@ class DocumentArchive(models.Model):
     def __str__(self):
         return f"Archive - {self.get_document_type_display()} - Demande {self.certification_request.id}"
 
+class StoredBlob(models.Model):
+    """Fichier adressé par contenu et nombre de lignes qui y font référence"""
+    name = models.CharField(max_length=255, unique=True, verbose_name="Nom dans le stockage")
+    size = models.BigIntegerField(default=0, verbose_name="Taille (octets)")
+    refcount = models.PositiveIntegerField(default=0, verbose_name="Nombre de références")
+    pending = models.PositiveIntegerField(default=0, verbose_name="Écritures en attente de référence")
+    reserved_at = models.DateTimeField(null=True, blank=True, verbose_name="Dernière réservation")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Fichier partagé"
+        verbose_name_plural = "Fichiers partagés"
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} référence(s))"
+
+class ArchivePack(models.Model):
+    """Fichier d'archive compressé du stockage froid, écrit en ajout seul"""
+    name = models.CharField(max_length=255, unique=True, verbose_name="Nom du fichier d'archive")
+    size = models.BigIntegerField(default=0, verbose_name="Taille compressée (octets)")
+    member_count = models.PositiveIntegerField(default=0, verbose_name="Nombre de fichiers")
+    sealed = models.BooleanField(default=False, verbose_name="Scellé")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Archive froide"
+        verbose_name_plural = "Archives froides"
+
+    def __str__(self):
+        return self.name
+
+class PackedFile(models.Model):
+    """Index du stockage froid : position d'un fichier adressé par contenu dans une archive"""
+    name = models.CharField(max_length=255, unique=True, verbose_name="Nom dans le stockage")
+    pack = models.ForeignKey(ArchivePack, on_delete=models.PROTECT, related_name='files')
+    offset = models.BigIntegerField(verbose_name="Position dans l'archive")
+    length = models.BigIntegerField(verbose_name="Taille compressée (octets)")
+    size = models.BigIntegerField(verbose_name="Taille d'origine (octets)")
+    packed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Fichier archivé"
+        verbose_name_plural = "Fichiers archivés"
+
+    def __str__(self):
+        return f"{self.name} → {self.pack.name}@{self.offset}"
+
+class ExportTombstone(models.Model):
+    """Trace des suppressions pour les exports incrémentaux des autorités"""
+    MODEL_CHOICES = [
+        ('requests', 'Demande de certification'),
+        ('certificates', 'Certificat'),
+        ('companies', 'Profil entreprise'),
+    ]
+
+    data_type = models.CharField(max_length=20, choices=MODEL_CHOICES, verbose_name="Type de données")
+    object_id = models.PositiveIntegerField(verbose_name="ID de l'objet")
+    deleted_at = models.DateTimeField(auto_now_add=True, verbose_name="Supprimé le")
+
+    class Meta:
+        verbose_name = "Suppression exportable"
+        verbose_name_plural = "Suppressions exportables"
+        indexes = [
+            models.Index(fields=['deleted_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_data_type_display()} {self.object_id} supprimé le {self.deleted_at}"
+
 class AuthorityNotification(models.Model):
     """Modèle pour les notifications des autorités"""
     
@@ -0,0 +1,390 @@
+"""Flux d'événements (Server-Sent Events) des notifications
+
+Remplace l'interrogation toutes les 30 secondes de unread_count/recent : chaque onglet
+garde une connexion ouverte et reçoit les nouvelles notifications (AdminNotification,
+AuthorityNotification) et son nombre de notifications non lues dès qu'ils changent ;
+les employés reçoivent un signal de rafraîchissement quand une demande change.
+
+Les événements passent par un courtier (NOTIFICATION_BROKER) : en mémoire dans le
+processus par défaut, Redis (pub/sub) lorsque plusieurs processus ou serveurs servent
+l'application. Chaque connexion est fermée au bout de NOTIFICATION_STREAM_MAX_AGE ;
+le client se reconnecte avec un nouveau ticket.
+
+Servi en ASGI (uvicorn, daphne), le flux est un générateur asynchrone : une connexion
+ouverte n'occupe ni thread ni connexion à la base. En WSGI, chaque connexion occupe un
+thread du serveur : le flux n'est servi que par un serveur multithread (runserver,
+gunicorn --threads) et la connexion à la base est libérée entre deux comptages.
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+try:
+    import redis
+    import redis.asyncio
+except ImportError:  # Courtier multi-serveurs optionnel (pip install "redis>=5")
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+TICKET_SALT = 'certifications.notification-stream'
+# Événements en attente par connexion : au-delà (client bloqué), les suivants sont ignorés
+QUEUE_SIZE = 100
+# Délai de reconnexion proposé au navigateur (millisecondes)
+RETRY_MS = 5000
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def role_channel(role):
+    return f'role:{role}'
+
+
+class LocalBroker:
+    """Courtier en mémoire : les événements ne sortent pas du processus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def publish(self, channel, event):
+        with self._lock:
+            targets = list(self._subscriptions.get(channel, ()))
+        for target in targets:
+            target.put(event)
+
+    def subscribe(self, channels):
+        return LocalSubscription(self, channels)
+
+    async def asubscribe(self, channels):
+        return AsyncLocalSubscription(self, channels)
+
+    def _register(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+
+    def _unregister(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscriptions = self._subscriptions.get(channel)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._subscriptions[channel]
+
+
+class LocalSubscription:
+    def __init__(self, broker, channels):
+        self._broker = broker
+        self.channels = channels
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        broker._register(self)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Client qui ne lit plus : le prochain compteur le remettra à jour
+            pass
+
+    def get(self, timeout):
+        """Prochain événement, ou None après `timeout` secondes (0 : sans attendre)"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broker._unregister(self)
+
+
+class AsyncLocalSubscription:
+    """Abonnement lu depuis la boucle asyncio : les publications d'autres threads y sont relayées"""
+
+    def __init__(self, broker, channels):
+        self._broker = broker
+        self.channels = channels
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        broker._register(self)
+
+    def put(self, event):
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Boucle déjà fermée : la connexion est terminée
+            pass
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+    async def aget(self, timeout):
+        """Prochain événement, ou None après `timeout` secondes (0 : sans attendre)"""
+        try:
+            if not timeout:
+                return self._queue.get_nowait()
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except (asyncio.QueueEmpty, asyncio.TimeoutError):
+            return None
+
+    async def aclose(self):
+        self._broker._unregister(self)
+
+
+class RedisBroker:
+    """Courtier Redis (pub/sub) : événements partagés entre processus et serveurs"""
+    prefix = 'notifications:'
+
+    def __init__(self):
+        if redis is None:
+            raise ImproperlyConfigured('Le courtier Redis nécessite redis (pip install "redis>=5")')
+        self._url = getattr(settings, 'NOTIFICATION_BROKER_URL', 'redis://localhost:6379/0')
+        self._client = redis.Redis.from_url(self._url)
+        self._async_client = None
+
+    def publish(self, channel, event):
+        self._client.publish(self.prefix + channel, json.dumps(event, cls=DjangoJSONEncoder))
+
+    def subscribe(self, channels):
+        return RedisSubscription(self._client, [self.prefix + channel for channel in channels])
+
+    async def asubscribe(self, channels):
+        if self._async_client is None:
+            # Client asyncio créé dans la boucle du serveur ASGI qui l'utilise
+            self._async_client = redis.asyncio.Redis.from_url(self._url)
+        subscription = AsyncRedisSubscription(self._async_client)
+        await subscription.subscribe([self.prefix + channel for channel in channels])
+        return subscription
+
+
+class RedisSubscription:
+    def __init__(self, client, channels):
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(*channels)
+
+    def get(self, timeout):
+        message = self._pubsub.get_message(timeout=timeout)
+        return json.loads(message['data']) if message else None
+
+    def close(self):
+        self._pubsub.close()
+
+
+class AsyncRedisSubscription:
+    def __init__(self, client):
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+
+    async def subscribe(self, channels):
+        await self._pubsub.subscribe(*channels)
+
+    async def aget(self, timeout):
+        message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        return json.loads(message['data']) if message else None
+
+    async def aclose(self):
+        await self._pubsub.aclose()
+
+
+def get_broker():
+    """Courtier configuré (NOTIFICATION_BROKER), créé à la première utilisation"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(
+                    getattr(settings, 'NOTIFICATION_BROKER', 'certifications.notification_stream.LocalBroker')
+                )()
+    return _broker
+
+
+def _send(channel, event):
+    try:
+        get_broker().publish(channel, event)
+    except Exception as e:
+        # Courtier indisponible : la notification reste en base, seul l'envoi immédiat est perdu
+        logger.error(f"Erreur lors de la publication d'une notification: {str(e)}")
+
+
+def publish(channel, event_type, data=None):
+    """Publier un événement après validation de la transaction en cours"""
+    event = {'type': event_type, 'data': data}
+    transaction.on_commit(lambda: _send(channel, event))
+
+
+def publish_notification(instance, role, serializer_class, created):
+    """Nouvelle notification (contenu complet) ou notification modifiée (compteur à recalculer)"""
+    channel = user_channel(instance.recipient_id) if instance.recipient_id else role_channel(role)
+    if created:
+        publish(channel, 'notification', serializer_class(instance).data)
+    else:
+        publish(channel, 'notifications_changed')
+
+
+def issue_ticket(user):
+    """Ticket signé de courte durée : EventSource ne peut pas envoyer l'en-tête Authorization"""
+    return signing.dumps({'u': user.pk}, salt=TICKET_SALT)
+
+
+def read_ticket(ticket):
+    """Utilisateur actif désigné par le ticket, ou None si le ticket est invalide ou expiré"""
+    from django.contrib.auth import get_user_model
+
+    try:
+        data = signing.loads(
+            ticket or '', salt=TICKET_SALT, max_age=getattr(settings, 'NOTIFICATION_STREAM_TICKET_AGE', 60)
+        )
+    except signing.BadSignature:
+        return None
+    return get_user_model().objects.filter(pk=data['u'], is_active=True).first()
+
+
+def channels_for(user):
+    channels = [user_channel(user.pk)]
+    if user.role in ('admin', 'authority', 'employee'):
+        channels.append(role_channel(user.role))
+    return channels
+
+
+def _unread_notifications(user):
+    """Notifications non lues de l'utilisateur (mêmes critères que les actions unread_count)"""
+    if user.role == 'admin':
+        from regulations.models import AdminNotification as model
+    elif user.role == 'authority':
+        from .models import AuthorityNotification as model
+    else:
+        return None
+    return model.objects.filter(
+        Q(recipient=user) | Q(recipient__isnull=True), is_read=False, is_dismissed=False
+    )
+
+
+def unread_count(user):
+    queryset = _unread_notifications(user)
+    return queryset.count() if queryset is not None else None
+
+
+async def aunread_count(user):
+    queryset = _unread_notifications(user)
+    return await queryset.acount() if queryset is not None else None
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+def _format_burst(events):
+    """Événements SSE d'une rafale et indicateur de recalcul du compteur
+
+    Rafale (tout marquer comme lu...) : un seul recalcul du compteur pour tous ses événements.
+    """
+    chunks = []
+    changed = False
+    for event in events:
+        if event['type'] == 'notification':
+            chunks.append(format_event('notification', event['data']))
+            changed = True
+        elif event['type'] == 'notifications_changed':
+            changed = True
+        elif event['type'] == 'requests_changed':
+            chunks.append(format_event('requests_changed', event['data']))
+    return chunks, changed
+
+
+def _release_connection():
+    """Rendre la connexion à la base pendant l'attente : elle n'est pas gardée toute la durée du flux"""
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def _stream_settings():
+    return (
+        getattr(settings, 'NOTIFICATION_STREAM_KEEPALIVE', 20),
+        getattr(settings, 'NOTIFICATION_STREAM_MAX_AGE', 300),
+    )
+
+
+def event_stream(user, channels):
+    """Corps text/event-stream pour un serveur WSGI (un thread par connexion)
+
+    L'abonnement est ouvert à la première lecture du corps : une réponse jamais
+    envoyée ne laisse pas d'abonnement derrière elle.
+    """
+    keepalive, max_age = _stream_settings()
+    deadline = time.monotonic() + max_age
+    # Abonnement avant le premier comptage : aucun événement perdu entre les deux
+    subscription = get_broker().subscribe(channels)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        count = unread_count(user)
+        _release_connection()
+        if count is not None:
+            yield format_event('unread_count', {'count': count})
+        while time.monotonic() < deadline:
+            event = subscription.get(timeout=min(keepalive, max(deadline - time.monotonic(), 0)))
+            if event is None:
+                # Commentaire SSE : garde la connexion ouverte à travers les proxys
+                yield ': keep-alive\n\n'
+                continue
+            chunks, changed = _format_burst([event] + list(iter(lambda: subscription.get(0), None)))
+            yield from chunks
+            if changed:
+                new_count = unread_count(user)
+                _release_connection()
+                if new_count != count:
+                    count = new_count
+                    yield format_event('unread_count', {'count': count})
+        # Fin de vie de la connexion : le client se reconnecte avec un nouveau ticket
+        yield format_event('reconnect', {})
+    finally:
+        subscription.close()
+
+
+async def aevent_stream(user, channels):
+    """Corps text/event-stream pour un serveur ASGI : attente dans la boucle, sans thread bloqué"""
+    keepalive, max_age = _stream_settings()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_age
+    subscription = await get_broker().asubscribe(channels)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        count = await aunread_count(user)
+        if count is not None:
+            yield format_event('unread_count', {'count': count})
+        while loop.time() < deadline:
+            event = await subscription.aget(min(keepalive, max(deadline - loop.time(), 0)))
+            if event is None:
+                yield ': keep-alive\n\n'
+                continue
+            events = [event]
+            while (event := await subscription.aget(0)) is not None:
+                events.append(event)
+            chunks, changed = _format_burst(events)
+            for chunk in chunks:
+                yield chunk
+            if changed:
+                new_count = await aunread_count(user)
+                if new_count != count:
+                    count = new_count
+                    yield format_event('unread_count', {'count': count})
+        yield format_event('reconnect', {})
+    finally:
+        await subscription.aclose()
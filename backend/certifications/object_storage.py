@@ -0,0 +1,193 @@
+"""Stockage objet compatible S3 et URL signées de courte durée
+
+Les fichiers peuvent être placés dans un stockage objet compatible S3 (AWS S3, MinIO,
+Ceph...) au lieu de MEDIA_ROOT : les serveurs d'application ne partagent alors plus de
+disque. Une fois les contrôles d'accès faits par les vues, les téléchargements sont
+envoyés vers une URL signée de courte durée, et les téléversements directs déposent le
+fichier dans le stockage par un PUT signé, sans passer par Django.
+
+Les stockages locaux offrent la même interface (presigned_url) : leurs URL signées
+pointent vers la vue signed_storage de l'application, ce qui permet de développer et de
+tester le protocole sans service S3.
+"""
+import mimetypes
+import tempfile
+import time
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage, storages
+from django.urls import reverse
+from django.utils.deconstruct import deconstructible
+from django.utils.http import content_disposition_header
+
+try:
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:  # Stockage S3 optionnel (pip install boto3)
+    boto3 = None
+
+SIGNING_SALT = 'certifications.signed-storage'
+# Fichiers lus depuis S3 : gardés en mémoire jusqu'à cette taille, puis sur disque
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+class SignedURLError(Exception):
+    """URL signée invalide, expirée ou utilisée avec une autre méthode"""
+
+
+def url_expiry(method='GET'):
+    """Durée de validité (secondes) des URL signées de téléchargement ou de dépôt"""
+    if method == 'PUT':
+        return getattr(settings, 'PRESIGNED_UPLOAD_EXPIRY', 3600)
+    return getattr(settings, 'PRESIGNED_URL_EXPIRY', 300)
+
+
+def supports_presigned_urls(storage):
+    return callable(getattr(storage, 'presigned_url', None))
+
+
+class SignedURLMixin:
+    """URL signées servies par l'application, pour les stockages sur disque local"""
+    default_alias = 'default'
+
+    def __init__(self, *args, alias=None, **kwargs):
+        # Alias de STORAGES, inscrit dans l'URL pour retrouver le stockage à la lecture
+        self.alias = alias or self.default_alias
+        super().__init__(*args, **kwargs)
+
+    def presigned_url(self, name, method='GET', expires=None, filename=None, as_attachment=True,
+                      content_type=None, max_size=None):
+        grant = {
+            's': self.alias, 'n': name, 'm': method,
+            'e': int(time.time()) + (expires or url_expiry(method)),
+            'f': filename, 'a': as_attachment, 't': content_type, 'x': max_size,
+        }
+        return reverse('signed-storage', args=[signing.dumps(grant, salt=SIGNING_SALT, compress=True)])
+
+
+def read_signed_url(token, method):
+    """Vérifier une URL signée locale ; renvoie (stockage, autorisation)"""
+    try:
+        grant = signing.loads(token, salt=SIGNING_SALT)
+    except signing.BadSignature:
+        raise SignedURLError('URL signée invalide')
+    if grant['m'] != ('GET' if method == 'HEAD' else method):
+        raise SignedURLError('Méthode non autorisée pour cette URL')
+    if grant['e'] < time.time():
+        raise SignedURLError('URL signée expirée')
+    return storages[grant['s']], grant
+
+
+@deconstructible
+class LocalObjectStorage(SignedURLMixin, FileSystemStorage):
+    """Stockage sur disque (MEDIA_ROOT) avec URL signées : remplaçant local du stockage S3"""
+
+
+@deconstructible
+class S3Storage(Storage):
+    """Stockage objet compatible S3 (boto3), configuré par OBJECT_STORAGE ou les OPTIONS de STORAGES"""
+
+    def __init__(self, bucket=None, endpoint_url=None, region=None, access_key=None, secret_key=None,
+                 prefix=None, alias=None):
+        if boto3 is None:
+            raise ImproperlyConfigured('Le stockage S3 nécessite boto3 (pip install boto3)')
+        config = getattr(settings, 'OBJECT_STORAGE', {})
+        self.bucket = bucket or config.get('BUCKET')
+        if not self.bucket:
+            raise ImproperlyConfigured('OBJECT_STORAGE["BUCKET"] est requis pour le stockage S3')
+        self.prefix = prefix if prefix is not None else config.get('PREFIX', '')
+        self.alias = alias
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url or config.get('ENDPOINT_URL'),
+            region_name=region or config.get('REGION'),
+            aws_access_key_id=access_key or config.get('ACCESS_KEY'),
+            aws_secret_access_key=secret_key or config.get('SECRET_KEY'),
+            config=Config(signature_version='s3v4'),
+        )
+
+    def _key(self, name):
+        return self.prefix + name.replace('\\', '/')
+
+    def _head(self, name):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def _open(self, name, mode='rb'):
+        if set(mode) - {'r', 'b'}:
+            raise ValueError('Le stockage S3 est en lecture seule par open()')
+        # Copie locale temporaire : seek et requêtes Range restent possibles
+        buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        try:
+            self.client.download_fileobj(self.bucket, self._key(name), buffer)
+        except ClientError as e:
+            buffer.close()
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                raise FileNotFoundError(name)
+            raise
+        buffer.seek(0)
+        return File(buffer, name=name)
+
+    def _save(self, name, content):
+        if hasattr(content, 'seek'):
+            try:
+                content.seek(0)
+            except (OSError, ValueError):
+                pass
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        # Envoi en plusieurs parties au-delà du seuil de boto3 : le fichier n'est jamais chargé entièrement
+        self.client.upload_fileobj(content, self.bucket, self._key(name), ExtraArgs={'ContentType': content_type})
+        return name
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+
+    def exists(self, name):
+        return self._head(name) is not None
+
+    def size(self, name):
+        head = self._head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return head['ContentLength']
+
+    def get_modified_time(self, name):
+        head = self._head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return head['LastModified']
+
+    def listdir(self, path):
+        prefix = self._key(path).rstrip('/') + '/' if path else self.prefix
+        directories, files = [], []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter='/'):
+            directories.extend(entry['Prefix'][len(prefix):].rstrip('/') for entry in page.get('CommonPrefixes', []))
+            files.extend(entry['Key'][len(prefix):] for entry in page.get('Contents', []))
+        return directories, files
+
+    def url(self, name):
+        return self.presigned_url(name)
+
+    def presigned_url(self, name, method='GET', expires=None, filename=None, as_attachment=True,
+                      content_type=None, max_size=None):
+        # max_size n'est pas imposé par S3 : la taille est vérifiée à la finalisation
+        params = {'Bucket': self.bucket, 'Key': self._key(name)}
+        if method == 'PUT':
+            operation = 'put_object'
+        else:
+            operation = 'get_object'
+            if filename:
+                params['ResponseContentDisposition'] = content_disposition_header(as_attachment, filename)
+            if content_type:
+                params['ResponseContentType'] = content_type
+        return self.client.generate_presigned_url(
+            operation, Params=params, ExpiresIn=expires or url_expiry(method)
+        )
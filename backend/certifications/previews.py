@@ -0,0 +1,140 @@
+"""Aperçus des documents justificatifs : vignettes des images, première page des PDF
+
+Les aperçus sont produits en arrière-plan après l'envoi, sur le pool de rendu, et
+enregistrés à côté du fichier d'origine (<nom>.<ext>.preview.jpg). Un aperçu ne dépend que
+du contenu du fichier : avec le stockage adressé par contenu, les documents identiques
+partagent le même aperçu, supprimé avec le fichier.
+"""
+import functools
+import io
+import logging
+import mimetypes
+import os
+import shutil
+import subprocess
+import tempfile
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+from .tasks import get_executor
+
+try:
+    import pypdfium2
+except ImportError:  # Rastériseurs PDF essayés dans l'ordre : pypdfium2 (requirements.txt), PyMuPDF, pdftoppm
+    pypdfium2 = None
+
+try:
+    import fitz
+except ImportError:
+    fitz = None
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_SUFFIX = '.preview.jpg'
+PREVIEW_CONTENT_TYPE = 'image/jpeg'
+
+
+def preview_name(name):
+    """Emplacement de l'aperçu d'un fichier stocké, à côté de celui-ci"""
+    return name + PREVIEW_SUFFIX
+
+
+def _max_size():
+    return getattr(settings, 'DOCUMENT_PREVIEW_MAX_SIZE', 480)
+
+
+@functools.cache
+def _report_missing_rasterizer():
+    """Signaler une seule fois par processus que les PDF n'auront pas d'aperçu"""
+    logger.warning("Aperçus PDF indisponibles : aucun rastériseur (pypdfium2, PyMuPDF ou pdftoppm) n'est installé")
+
+
+def _pdf_first_page(file):
+    """Première page d'un PDF en image PIL, ou None si aucun rastériseur n'est disponible"""
+    data = file.read()
+    # Résolution choisie pour que la page A4 dépasse à peine la taille de l'aperçu
+    scale = _max_size() / 595
+    if pypdfium2 is not None:
+        page = pypdfium2.PdfDocument(data)[0]
+        return page.render(scale=max(scale, 0.1)).to_pil()
+    if fitz is not None:
+        page = fitz.open(stream=data, filetype='pdf').load_page(0)
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(scale, scale))
+        return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+    pdftoppm = shutil.which('pdftoppm')
+    if pdftoppm is None:
+        _report_missing_rasterizer()
+        return None
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'source.pdf')
+        with open(source, 'wb') as f:
+            f.write(data)
+        subprocess.run(
+            [pdftoppm, '-f', '1', '-l', '1', '-singlefile', '-png', '-scale-to', str(_max_size()),
+             source, os.path.join(directory, 'page')],
+            check=True, capture_output=True, timeout=30
+        )
+        with Image.open(os.path.join(directory, 'page.png')) as image:
+            image.load()
+            return image
+
+
+def render_preview(file, mime_type):
+    """Aperçu JPEG (octets) d'un fichier ouvert, ou None si le type n'a pas d'aperçu"""
+    if mime_type == 'application/pdf':
+        image = _pdf_first_page(file)
+        if image is None:
+            return None
+    elif mime_type.startswith('image/'):
+        image = Image.open(file)
+        # Réduction dès le décodage pour les JPEG : les grandes photos ne sont pas décodées en entier
+        image.draft('RGB', (_max_size(), _max_size()))
+        image = ImageOps.exif_transpose(image)
+    else:
+        return None
+
+    image = image.convert('RGB')
+    image.thumbnail((_max_size(), _max_size()))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=80, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def generate_preview(document_id):
+    """Produire l'aperçu d'un document justificatif et l'associer à tous les documents du même fichier"""
+    from .models import SupportingDocument
+
+    close_old_connections()
+    try:
+        document = SupportingDocument.objects.filter(id=document_id).first()
+        if document is None or not document.file:
+            return
+        name = preview_name(document.file.name)
+        if not default_storage.exists(name):
+            with document.file.open('rb') as file:
+                # Documents envoyés avant la détection du type : type déduit de l'extension
+                mime_type = document.file_mime_type or mimetypes.guess_type(document.file.name)[0] or ''
+                content = render_preview(file, mime_type)
+            if content is None:
+                return
+            saved = default_storage.save(name, ContentFile(content))
+            if saved != name:
+                # Aperçu produit en même temps par un autre worker : le sien est conservé
+                default_storage.delete(saved)
+        SupportingDocument.objects.filter(file=document.file.name).exclude(preview=name).update(preview=name)
+    except Exception as e:
+        logger.error(f"Erreur lors de la génération de l'aperçu du document {document_id}: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def enqueue_preview(document_id):
+    """Planifier la génération de l'aperçu une fois la transaction courante validée"""
+    transaction.on_commit(lambda: get_executor().submit(generate_preview, document_id))
+
+
+def delete_preview(name):
+    """Supprimer l'aperçu d'un fichier supprimé du stockage"""
+    default_storage.delete(preview_name(name))
@@ -1,8 +1,11 @@
+import hashlib
+from django.urls import reverse
 from rest_framework import serializers
 from .models import (
     CertificationRequest, Certificate, Payment, RejectionReport, 
     DailyInfo, RequestHistory, DynamicForm, LawChecklist, 
-    FormSubmission, DocumentArchive, SupportingDocument, AuthorityNotification
+    FormSubmission, DocumentArchive, SupportingDocument, AuthorityNotification,
+    UploadSession
 )
 from accounts.models import CompanyProfile, Employee, User
 from accounts.serializers import CompanyProfileSerializer, EmployeeSerializer, UserSerializer
@@ -10,15 +13,18 @@ from accounts.serializers import CompanyProfileSerializer, EmployeeSerializer, U
 class SupportingDocumentSerializer(serializers.ModelSerializer):
     """Serializer pour les documents justificatifs multiples"""
     file_url = serializers.SerializerMethodField()
-    file_size = serializers.SerializerMethodField()
+    preview_url = serializers.SerializerMethodField()
     
     class Meta:
         model = SupportingDocument
         fields = [
             'id', 'name', 'document_type', 'file', 'file_url', 'file_size',
+            'file_mime_type', 'file_sha256', 'file_page_count', 'preview_url',
             'description', 'uploaded_at'
         ]
-        read_only_fields = ['id', 'uploaded_at']
+        read_only_fields = [
+            'id', 'uploaded_at', 'file_size', 'file_mime_type', 'file_sha256', 'file_page_count'
+        ]
     
     def get_file_url(self, obj):
         if obj.file:
@@ -28,10 +34,36 @@ class SupportingDocumentSerializer(serializers.ModelSerializer):
             return obj.file.url
         return None
     
-    def get_file_size(self, obj):
-        if obj.file:
-            return obj.file.size
-        return None
+    def get_preview_url(self, obj):
+        # L'aperçu est mis en cache longtemps : l'URL change avec le nom de l'aperçu
+        if not obj.preview:
+            return None
+        url = reverse('supporting-document-preview', args=[obj.id])
+        url = f'{url}?v={hashlib.sha256(obj.preview.name.encode()).hexdigest()[:16]}'
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer pour les téléversements fractionnés"""
+    document = SupportingDocumentSerializer(read_only=True)
+    upload_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'certification_request', 'filename', 'name', 'document_type', 'description',
+            'total_size', 'received_size', 'parts', 'checksum', 'direct', 'upload_url', 'document',
+            'created_at', 'expires_at'
+        ]
+        read_only_fields = ['id', 'received_size', 'parts', 'checksum', 'document', 'created_at', 'expires_at']
+    
+    def get_upload_url(self, obj):
+        """PUT signé vers le stockage pour une session directe non finalisée"""
+        from .uploads import direct_upload_url
+        
+        url = direct_upload_url(obj)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if url and request else url
 
 class EmployeeDetailSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
@@ -60,9 +92,10 @@ class CertificationRequestEmployeeSerializer(serializers.ModelSerializer):
             'submission_date', 'status', 'submitted_data',
             'assigned_to', 'assigned_to_name', 'validated_by', 'validated_by_name',
             'reviewed_by', 'reviewed_by_name', 'supporting_documents',
+            'document_size', 'document_mime_type', 'document_page_count',
             'has_payment', 'form_submission'
         ]
-        read_only_fields = ['id', 'submission_date']
+        read_only_fields = ['id', 'submission_date', 'document_size', 'document_mime_type', 'document_page_count']
     
     def get_assigned_to_name(self, obj):
         if obj.assigned_to and obj.assigned_to.user:
@@ -208,9 +241,10 @@ class CertificationRequestSerializer(serializers.ModelSerializer):
             'submission_date', 'status', 'submitted_data',
             'assigned_to', 'assigned_to_name', 'validated_by', 'validated_by_name',
             'reviewed_by', 'reviewed_by_name', 'supporting_documents',
+            'document_size', 'document_mime_type', 'document_page_count',
             'has_payment', 'form_submission'
         ]
-        read_only_fields = ['id', 'submission_date']
+        read_only_fields = ['id', 'submission_date', 'document_size', 'document_mime_type', 'document_page_count']
     
     def get_has_payment(self, obj):
         return hasattr(obj, 'payment') and obj.payment.status == 'completed'
@@ -272,9 +306,9 @@ class CertificateSerializer(serializers.ModelSerializer):
         model = Certificate
         fields = [
             'id', 'number', 'issue_date', 'expiry_date', 'treatment_type',
-            'pdf_file', 'certification_request', 'is_active', 'status'
+            'pdf_file', 'certification_request', 'is_active', 'status', 'share_token'
         ]
-        read_only_fields = ['id', 'issue_date', 'status']
+        read_only_fields = ['id', 'issue_date', 'status', 'share_token']
     
     def get_certification_request(self, obj):
         """Retourner les données complètes de la demande de certification"""
@@ -0,0 +1,128 @@
+from django.apps import apps
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from accounts.models import CompanyProfile
+from .models import (
+    AuthorityNotification, CertificationRequest, Certificate, ExportTombstone, Payment, RejectionReport,
+    SupportingDocument
+)
+from .documents import enqueue_document, payment_receipt_data, rejection_report_data
+from .notification_stream import publish, publish_notification, role_channel
+from .previews import enqueue_preview, preview_name
+from .verification import invalidate
+from .storage import REFERENCING_FIELDS, acquire, release
+
+
+@receiver(post_delete, sender=CertificationRequest)
+def record_request_deletion(sender, instance, **kwargs):
+    """Conserver une trace de la suppression pour les exports incrémentaux"""
+    ExportTombstone.objects.create(data_type='requests', object_id=instance.pk)
+
+
+@receiver(post_delete, sender=Certificate)
+def record_certificate_deletion(sender, instance, **kwargs):
+    """Conserver une trace de la suppression pour les exports incrémentaux"""
+    ExportTombstone.objects.create(data_type='certificates', object_id=instance.pk)
+
+
+@receiver(post_delete, sender=CompanyProfile)
+def record_company_deletion(sender, instance, **kwargs):
+    """Conserver une trace de la suppression pour les exports incrémentaux"""
+    ExportTombstone.objects.create(data_type='companies', object_id=instance.pk)
+
+
+@receiver(post_save, sender=Certificate)
+@receiver(post_delete, sender=Certificate)
+def invalidate_certificate_verification(sender, instance, **kwargs):
+    """Retirer du cache les données publiques de vérification (révocation, modification)"""
+    invalidate([instance.verification_token])
+
+
+@receiver(post_save, sender=CompanyProfile)
+def invalidate_company_verifications(sender, instance, created, **kwargs):
+    """Le nom de l'entreprise figure dans les données publiques de ses certificats"""
+    if not created:
+        invalidate(Certificate.objects.filter(
+            certification_request__company=instance
+        ).values_list('verification_token', flat=True))
+
+
+@receiver(post_save, sender=RejectionReport)
+def prerender_rejection_report(sender, instance, **kwargs):
+    """Rendre le rapport de refus dès sa création : le téléchargement devient un simple envoi"""
+    enqueue_document('rejection_report', rejection_report_data(instance))
+
+
+@receiver(post_save, sender=Payment)
+def prerender_payment_receipt(sender, instance, **kwargs):
+    """Rendre le reçu dès que le paiement est confirmé"""
+    if instance.status == 'completed':
+        enqueue_document('payment_receipt', payment_receipt_data(instance))
+
+
+@receiver(post_save, sender=SupportingDocument)
+def generate_document_preview(sender, instance, raw=False, **kwargs):
+    """Produire l'aperçu en arrière-plan dès l'envoi : la revue n'ouvre plus le document entier"""
+    if not raw and instance.file and instance.preview.name != preview_name(instance.file.name):
+        enqueue_preview(instance.id)
+
+
+_UNKNOWN = object()
+
+
+@receiver(post_save, sender=AuthorityNotification)
+def push_authority_notification(sender, instance, created, raw=False, **kwargs):
+    """Envoyer la notification aux autorités connectées au flux (notification_stream)"""
+    if not raw:
+        from .serializers import AuthorityNotificationSerializer
+
+        publish_notification(instance, 'authority', AuthorityNotificationSerializer, created)
+
+
+@receiver(post_delete, sender=AuthorityNotification)
+def push_authority_notification_deletion(sender, instance, **kwargs):
+    publish_notification(instance, 'authority', None, created=False)
+
+
+@receiver(post_save, sender=CertificationRequest)
+def push_request_change(sender, instance, raw=False, **kwargs):
+    """Les employés connectés rafraîchissent leurs compteurs de demandes"""
+    if not raw:
+        publish(role_channel('employee'), 'requests_changed', {'id': instance.id, 'status': instance.status})
+
+
+
+def _track_stored_files(model, field_name):
+    """Compter les références aux fichiers partagés par contenu depuis un champ fichier"""
+    attribute = f'_stored_{field_name}'
+
+    def remember_name(sender, instance, **kwargs):
+        if field_name not in instance.__dict__:
+            # Champ différé (only/defer) : valeur d'origine inconnue, pas de suivi pour cette instance
+            instance.__dict__[attribute] = _UNKNOWN
+            return
+        value = instance.__dict__[field_name]
+        instance.__dict__[attribute] = getattr(value, 'name', value) or None
+
+    def update_references(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+        # Une nouvelle ligne ajoute toujours une référence, même si le nom était fourni au constructeur
+        previous = None if created else instance.__dict__.get(attribute)
+        if raw or previous is _UNKNOWN or (update_fields is not None and field_name not in update_fields):
+            return
+        current = getattr(instance, field_name).name or None
+        if current != previous:
+            acquire([current])
+            release([previous])
+            instance.__dict__[attribute] = current
+
+    def drop_reference(sender, instance, **kwargs):
+        release([getattr(instance, field_name).name])
+
+    post_init.connect(remember_name, sender=model, weak=False)
+    post_save.connect(update_references, sender=model, weak=False)
+    post_delete.connect(drop_reference, sender=model, weak=False)
+
+
+for label, field_name in REFERENCING_FIELDS:
+    _track_stored_files(apps.get_model(label), field_name)
+
@@ -0,0 +1,341 @@
+"""Stockage adressé par contenu des documents téléversés
+
+Le nom d'un fichier est l'empreinte SHA-256 de son contenu : un même document
+envoyé plusieurs fois (autorisations, contrats, factures d'une année sur l'autre)
+n'est stocké qu'une seule fois. Les références depuis les modèles sont comptées
+dans StoredBlob ; le fichier est supprimé quand plus aucune ligne n'y fait référence.
+
+L'écriture (ou la réutilisation) d'un fichier réserve une référence sous le verrou de
+sa ligne StoredBlob, avant que la ligne du modèle n'existe ; acquire() la convertit en
+référence. Les suppressions vérifient références et réservations sous ce même verrou :
+un fichier réutilisé ne peut pas être supprimé entre son écriture et sa référence.
+"""
+import os
+import tempfile
+import uuid
+from collections import Counter
+from datetime import timedelta
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import transaction
+from django.db.models import Q
+from django.core.files import File
+from django.utils import timezone
+from .cold_storage import open_packed, packed_entry
+from .file_metadata import FileInspector
+from .object_storage import SPOOL_MAX_SIZE, S3Storage, SignedURLMixin
+
+CAS_PREFIX = 'documents/'
+
+# Réservation jamais convertie en référence (écriture abandonnée sans discard) : ignorée après ce délai
+RESERVATION_TIMEOUT = timedelta(hours=1)
+
+# Champs dont les fichiers sont partagés par contenu : (application.Modèle, champ)
+REFERENCING_FIELDS = [
+    ('certifications.SupportingDocument', 'file'),
+    ('certifications.CertificationRequest', 'supporting_documents'),
+    ('certifications.DocumentArchive', 'file_path'),
+]
+
+
+def sharded_name(prefix, key, extension=''):
+    """Nom réparti sur deux niveaux de sous-dossiers d'après la clé : <prefix>ab/cd/<clé><ext>
+
+    Avec des clés aléatoires ou des empreintes, chaque dossier reste petit (65 536
+    dossiers feuilles) : listings et sauvegardes restent rapides à des millions de fichiers.
+    """
+    return f'{prefix}{key[:2]}/{key[2:4]}/{key}{extension}'
+
+
+def sharded_upload_path(prefix, filename):
+    """Chemin d'upload avec un identifiant attribué avant l'écriture (indépendant de la ligne en base)"""
+    return sharded_name(prefix, uuid.uuid4().hex, os.path.splitext(filename)[1].lower())
+
+
+def overwrite(storage, name, content):
+    """Écrire `content` sous ce nom exact, en remplaçant le fichier existant d'un bloc
+
+    storage.save ajouterait un suffixe si le nom est déjà pris : deux écritures simultanées
+    d'un même fichier (cache de rendu) produiraient un doublon.
+    """
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        # Stockage objet : un PUT remplace l'objet en une seule opération
+        return storage._save(name, content)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in content.chunks():
+                tmp.write(chunk)
+        if storage.file_permissions_mode is not None:
+            os.chmod(tmp_path, storage.file_permissions_mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return name
+
+
+def document_storage():
+    """Stockage des documents téléversés (alias « documents » de STORAGES)"""
+    return storages['documents']
+
+
+def is_content_addressed(name):
+    return bool(name) and name.startswith(CAS_PREFIX)
+
+
+class ContentAddressedStorage(SignedURLMixin, FileSystemStorage):
+    """Stockage local nommant les fichiers d'après leur contenu : documents/ab/cd/<sha256>.<ext>
+
+    Le nom demandé par upload_to n'est utilisé que pour son extension. Les fichiers
+    existants hors de documents/ (enregistrés avant ce stockage) restent lisibles.
+    """
+    default_alias = 'documents'
+
+    def content_name(self, digest, name):
+        return sharded_name(CAS_PREFIX, digest, os.path.splitext(name)[1].lower())
+
+    def get_available_name(self, name, max_length=None):
+        # Un contenu identique réutilise le même fichier : pas de renommage
+        return name
+
+    # Fichiers déplacés dans le stockage froid (cold_storage) : lus depuis leur archive
+    def _open(self, name, mode='rb'):
+        try:
+            return super()._open(name, mode)
+        except FileNotFoundError:
+            entry = packed_entry(name) if is_content_addressed(name) else None
+            if entry is None or 'b' not in mode or set(mode) - {'r', 'b'}:
+                raise
+            return open_packed(entry)
+
+    def exists(self, name):
+        return super().exists(name) or (is_content_addressed(name) and packed_entry(name) is not None)
+
+    def size(self, name):
+        try:
+            return super().size(name)
+        except FileNotFoundError:
+            entry = packed_entry(name) if is_content_addressed(name) else None
+            if entry is None:
+                raise
+            return entry.size
+
+    def delete(self, name):
+        super().delete(name)
+        if is_content_addressed(name):
+            from .models import PackedFile
+
+            # Les octets restent dans l'archive (ajout seul) ; seule l'entrée d'index disparaît
+            PackedFile.objects.filter(name=name).delete()
+
+    def _reuse(self, name):
+        """Le fichier existe déjà : sa date est rafraîchie (délai de grâce du nettoyage des orphelins)"""
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _save(self, name, content):
+        # Écriture dans un fichier temporaire en calculant l'empreinte et les métadonnées, puis renommage atomique
+        directory = self.path(CAS_PREFIX)
+        os.makedirs(directory, exist_ok=True)
+        # Fichier déjà inspecté pendant sa réception (upload_handlers) : empreinte reprise telle quelle
+        metadata = getattr(content, 'metadata', None)
+        reserved = False
+        if metadata:
+            reserve(self.content_name(metadata['sha256'], name), metadata['size'])
+            reserved = True
+            if self._reuse(self.content_name(metadata['sha256'], name)):
+                # Doublon connu avant toute écriture
+                return self.content_name(metadata['sha256'], name)
+        inspector = None if metadata else FileInspector(name)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    try:
+                        content.seek(0)
+                    except (OSError, ValueError):
+                        pass
+                for chunk in content.chunks():
+                    if inspector:
+                        inspector.update(chunk)
+                    tmp.write(chunk)
+            if inspector:
+                metadata = inspector.result()
+            final_name = self.content_name(metadata['sha256'], name)
+            final_path = self.path(final_name)
+            if not reserved:
+                reserve(final_name, metadata['size'])
+            if self._reuse(final_name):
+                # Doublon : aucun octet supplémentaire sur le disque
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        # Métadonnées calculées pendant l'écriture, reprises par le modèle (file_metadata)
+        content.metadata = metadata
+        return final_name
+
+
+class ContentAddressedObjectStorage(S3Storage):
+    """Stockage adressé par contenu dans un stockage objet S3 (même nommage, mêmes métadonnées)
+
+    Le stockage froid ne s'applique pas ici : les classes d'archivage du fournisseur
+    (règles de cycle de vie du bucket) jouent ce rôle.
+    """
+
+    content_name = ContentAddressedStorage.content_name
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        metadata = getattr(content, 'metadata', None)
+        spool = None
+        source = content
+        if not metadata:
+            # L'empreinte détermine la clé : copie temporaire locale pendant son calcul
+            inspector = FileInspector(name)
+            spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            for chunk in content.chunks():
+                inspector.update(chunk)
+                spool.write(chunk)
+            metadata = inspector.result()
+            spool.seek(0)
+            source = File(spool, name=name)
+        final_name = self.content_name(metadata['sha256'], name)
+        try:
+            reserve(final_name, metadata['size'])
+            if not self.exists(final_name):
+                super()._save(final_name, source)
+        finally:
+            if spool is not None:
+                spool.close()
+        content.metadata = metadata
+        return final_name
+
+
+def _size(name):
+    try:
+        return document_storage().size(name)
+    except OSError:
+        return 0
+
+
+def _locked_blobs(names):
+    from .models import StoredBlob
+
+    return {blob.name: blob for blob in StoredBlob.objects.select_for_update().filter(name__in=names)}
+
+
+def reserve(name, size):
+    """Réserver une référence au fichier `name` avant de vérifier s'il existe ou de l'écrire
+
+    Prise sous le verrou de la ligne, comme la vérification de delete_if_unreferenced :
+    une suppression en cours se termine avant, une suppression ultérieure voit la réservation.
+    """
+    from .models import StoredBlob
+
+    with transaction.atomic():
+        blob, created = StoredBlob.objects.select_for_update().get_or_create(
+            name=name, defaults={'size': size, 'pending': 1, 'reserved_at': timezone.now()}
+        )
+        if not created:
+            blob.pending += 1
+            blob.reserved_at = timezone.now()
+            blob.save(update_fields=['pending', 'reserved_at'])
+
+
+def acquire(names):
+    """Ajouter une référence à chaque fichier adressé par contenu, en consommant les réservations de l'écriture"""
+    from .models import StoredBlob
+
+    counts = Counter(name for name in names if is_content_addressed(name))
+    if not counts:
+        return
+    with transaction.atomic():
+        blobs = _locked_blobs(counts)
+        for name, blob in blobs.items():
+            blob.refcount += counts[name]
+            blob.pending = max(blob.pending - counts[name], 0)
+        StoredBlob.objects.bulk_update(blobs.values(), ['refcount', 'pending'])
+        StoredBlob.objects.bulk_create([
+            StoredBlob(name=name, refcount=count, size=_size(name))
+            for name, count in counts.items() if name not in blobs
+        ])
+
+
+def release(names):
+    """Retirer une référence ; les fichiers qui ne sont plus utilisés sont supprimés après validation"""
+    from .models import StoredBlob
+
+    counts = Counter(name for name in names if is_content_addressed(name))
+    if not counts:
+        return
+    with transaction.atomic():
+        blobs = _locked_blobs(counts)
+        for name, blob in blobs.items():
+            blob.refcount = max(blob.refcount - counts[name], 0)
+        StoredBlob.objects.bulk_update(blobs.values(), ['refcount'])
+        unused = [name for name, blob in blobs.items() if not blob.refcount]
+        if unused:
+            # La ligne reste jusqu'à la suppression : elle porte le verrou partagé avec reserve()
+            transaction.on_commit(lambda: [delete_if_unreferenced(name) for name in unused])
+
+
+def unreferenced_blobs():
+    """Lignes sans référence ni réservation en cours (suppression interrompue, écriture abandonnée)"""
+    from .models import StoredBlob
+
+    return StoredBlob.objects.filter(
+        Q(pending=0) | Q(reserved_at__lt=timezone.now() - RESERVATION_TIMEOUT), refcount=0
+    )
+
+
+def _is_reserved(blob):
+    return blob.pending > 0 and blob.reserved_at and blob.reserved_at >= timezone.now() - RESERVATION_TIMEOUT
+
+
+def delete_if_unreferenced(name, unreserve=False):
+    """Supprimer le fichier si aucune ligne n'y fait référence ni ne s'apprête à le faire
+
+    unreserve : l'appelant abandonne la réservation prise par son écriture (discard).
+    """
+    from .models import StoredBlob
+    from .previews import delete_preview
+
+    with transaction.atomic():
+        # Ligne créée au besoin pour fichier écrit avant le comptage : le verrou est toujours pris
+        blob, _ = StoredBlob.objects.select_for_update().get_or_create(name=name, defaults={'size': _size(name)})
+        if unreserve and blob.pending:
+            blob.pending -= 1
+            blob.save(update_fields=['pending'])
+        # Une référence a pu être reprise entre-temps par un nouvel envoi du même contenu
+        if blob.refcount or _is_reserved(blob):
+            return False
+        document_storage().delete(name)
+        blob.delete()
+    delete_preview(name)
+    return True
+
+
+def discard(names):
+    """Supprimer des fichiers écrits mais jamais enregistrés en base, sauf s'ils sont partagés"""
+    for name in names:
+        if is_content_addressed(name):
+            delete_if_unreferenced(name, unreserve=True)
+        elif name:
+            document_storage().delete(name)
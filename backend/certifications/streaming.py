@@ -0,0 +1,160 @@
+"""Réponses d'export en flux : CSV ligne par ligne, compression gzip et archives ZIP incrémentales"""
+import csv
+import time
+import zipfile
+import zlib
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+GZIP_LEVEL = 6
+
+
+class Echo:
+    """Pseudo-fichier pour csv.writer : renvoie la ligne au lieu de la stocker"""
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    """Générer un CSV encodé en UTF-8, une ligne à la fois"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header).encode('utf-8')
+    for row in rows:
+        yield writer.writerow(row).encode('utf-8')
+
+
+def iter_csv_dicts(rows):
+    """Générer un CSV à partir de dictionnaires ; les clés de la première ligne servent d'en-têtes"""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    header = list(first.keys())
+    yield from iter_csv(header, _chain_values(first, rows))
+
+
+def _chain_values(first, rows):
+    yield list(first.values())
+    for row in rows:
+        yield list(row.values())
+
+
+def iter_json_document(sections, metadata=None):
+    """Générer un document JSON {section: [lignes], 'metadata': {...}} sans le construire en mémoire
+
+    `metadata` peut être une fonction appelée une fois toutes les sections écrites
+    (utile pour y inclure des compteurs).
+    """
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    yield b'{'
+    first_section = True
+    for name, rows in sections.items():
+        prefix = '' if first_section else ', '
+        yield f'{prefix}{encoder.encode(name)}: ['.encode('utf-8')
+        first_section = False
+        first_row = True
+        for row in rows:
+            yield (('' if first_row else ', ') + encoder.encode(row)).encode('utf-8')
+            first_row = False
+        yield b']'
+    if metadata is not None:
+        if callable(metadata):
+            metadata = metadata()
+        prefix = '' if first_section else ', '
+        yield f'{prefix}"metadata": {encoder.encode(metadata)}'.encode('utf-8')
+    yield b'}'
+
+
+def gzip_stream(chunks, level=GZIP_LEVEL):
+    """Compresser un flux d'octets au format gzip à la volée"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _ZipBuffer:
+    """Tampon en écriture seule pour zipfile : les octets écrits sont récupérés puis vidés"""
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(members):
+    """Construire une archive ZIP de manière incrémentale, sans fichier temporaire
+
+    `members` est un itérable de tuples (nom, itérable d'octets, compresser) ;
+    les membres déjà compressés (PDF, JPEG...) peuvent être stockés tels quels.
+    """
+    buffer = _ZipBuffer()
+    with zipfile.ZipFile(buffer, mode='w', allowZip64=True) as archive:
+        for name, chunks, compress in members:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            info.external_attr = 0o644 << 16
+            with archive.open(info, mode='w', force_zip64=True) as member:
+                for chunk in chunks:
+                    member.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    yield buffer.drain()
+
+
+def iter_file(file, chunk_size=64 * 1024):
+    """Lire un fichier ouvert par blocs puis le fermer"""
+    try:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
+
+
+def accepts_gzip(request):
+    """Vérifier si le client accepte un contenu compressé en gzip"""
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '').lower()
+
+
+def export_response(request, chunks, content_type, filename, disposition='attachment', compress=True):
+    """Réponse en flux, compressée en gzip lorsque le client l'accepte"""
+    if compress and accepts_gzip(request):
+        response = StreamingHttpResponse(gzip_stream(chunks), content_type=content_type)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Vary'] = 'Accept-Encoding'
+    response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    response['Access-Control-Expose-Headers'] = 'Content-Disposition'
+    return response
+
+
+def zip_response(members, filename):
+    """Réponse ZIP en flux (jamais recompressée : l'archive l'est déjà)"""
+    response = StreamingHttpResponse(iter_zip(members), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Access-Control-Expose-Headers'] = 'Content-Disposition'
+    return response
@@ -0,0 +1,47 @@
+"""Tâches exécutées en arrière-plan sur un pool de threads du processus web"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Pool de workers partagé, créé à la première utilisation"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'CERTIFICATE_RENDER_WORKERS', 2),
+                    thread_name_prefix='certificate-render'
+                )
+    return _executor
+
+
+def render_certificate(certificate_id):
+    """Rendre (ou retrouver en cache) le PDF d'un certificat"""
+    from .models import Certificate
+
+    close_old_connections()
+    try:
+        certificate = Certificate.objects.select_related(
+            'certification_request__company'
+        ).get(id=certificate_id)
+        certificate.generate()
+    except Certificate.DoesNotExist:
+        pass
+    except Exception as e:
+        logger.error(f"Erreur lors du rendu du certificat {certificate_id}: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def enqueue_certificate_render(certificate_id):
+    """Planifier le rendu du PDF une fois la transaction courante validée"""
+    transaction.on_commit(lambda: get_executor().submit(render_certificate, certificate_id))
@@ -0,0 +1,27 @@
+"""Outils communs aux tests de l'application certifications"""
+import shutil
+import tempfile
+from accounts.models import CompanyProfile, User
+
+from ..models import CertificationRequest
+
+
+class TemporaryMediaMixin:
+    """MEDIA_ROOT dans un dossier temporaire, supprimé après chaque test"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = self.settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+def create_request(username='entreprise'):
+    user = User.objects.create(username=username, role='enterprise')
+    company = CompanyProfile.objects.create(
+        user=user, business_name='EcoTech', ice_number='000000000000001', rc_number='RC1',
+        responsible_name='Responsable', address='Rue 1'
+    )
+    return CertificationRequest.objects.create(company=company, treatment_type='DEEE')
@@ -0,0 +1,128 @@
+import io
+import json
+import zipfile
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from pypdf import PdfReader
+from rest_framework.test import APIClient
+from accounts.models import User
+
+from .. import bulk_download, tasks
+from ..bulk_download import filter_certificates, iter_certificate_bundle
+from ..models import Certificate
+from .base import TemporaryMediaMixin, create_request
+
+
+class ImmediateExecutor:
+    """Pool de rendu exécuté sur place : pas de thread sur la base de test"""
+
+    def submit(self, function, *args):
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+
+class BulkDownloadTests(TemporaryMediaMixin, TestCase):
+    """Téléchargement groupé des certificats : filtres, archive ZIP et PDF fusionné"""
+    url = '/api/certifications/authority/certificates/bulk_download/'
+
+    def setUp(self):
+        super().setUp()
+        for patcher in [
+            mock.patch.object(bulk_download, 'get_executor', return_value=ImmediateExecutor()),
+            # Connexion de la transaction du test : ne pas la fermer après le rendu
+            mock.patch.object(tasks, 'close_old_connections'),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.certificates = [
+            self.create_certificate(1, 'recycling'),
+            self.create_certificate(2, 'recycling'),
+            self.create_certificate(3, 'collection'),
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='autorite', role='authority'))
+
+    def create_certificate(self, index, treatment_type):
+        return Certificate.objects.create(
+            number=f'DEEE-TEST-000{index}', treatment_type=treatment_type,
+            certification_request=create_request(f'entreprise{index}'),
+            expiry_date=timezone.now().date() + timedelta(days=365)
+        )
+
+    def bundle(self, certificates):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zip_file:
+            for path, chunks, _ in iter_certificate_bundle(certificates):
+                zip_file.writestr(path, b''.join(chunks))
+        return zipfile.ZipFile(archive)
+
+    def test_filters(self):
+        queryset = Certificate.objects.all()
+        first, second, third = self.certificates
+        self.assertEqual(list(filter_certificates(queryset, {})), self.certificates)
+        self.assertEqual(list(filter_certificates(queryset, {'treatment_type': 'collection'})), [third])
+        companies = f'{first.certification_request.company_id}, {third.certification_request.company_id},'
+        self.assertEqual(list(filter_certificates(queryset, {'companies': companies})), [first, third])
+        Certificate.objects.filter(pk=first.pk).update(issue_date=timezone.now().date() - timedelta(days=30))
+        start = (timezone.now().date() - timedelta(days=1)).isoformat()
+        self.assertEqual(list(filter_certificates(queryset, {'start_date': start})), [second, third])
+        self.assertEqual(list(filter_certificates(queryset, {'end_date': start})), [first])
+        with self.assertRaises(ValueError):
+            filter_certificates(queryset, {'companies': 'a'})
+
+    def test_bundle_contains_stored_and_rendered_pdfs(self):
+        first, second, _ = self.certificates
+        first.generate()
+        archive = self.bundle([first, second])
+        self.assertEqual(
+            archive.namelist(), ['certificat_DEEE-TEST-0001.pdf', 'certificat_DEEE-TEST-0002.pdf', 'manifest.json']
+        )
+        with first.pdf_file.open('rb') as file:
+            self.assertEqual(archive.read('certificat_DEEE-TEST-0001.pdf'), file.read())
+        self.assertEqual(len(PdfReader(io.BytesIO(archive.read('certificat_DEEE-TEST-0002.pdf'))).pages), 1)
+
+        manifest = json.loads(archive.read('manifest.json'))
+        self.assertEqual(
+            [(entry['number'], entry['rendered_on_demand']) for entry in manifest['certificates']],
+            [('DEEE-TEST-0001', False), ('DEEE-TEST-0002', True)]
+        )
+        self.assertEqual(manifest['certificates'][0]['company'], 'EcoTech')
+        self.assertEqual(manifest['missing'], [])
+
+    def test_unrendered_certificate_is_listed_as_missing(self):
+        first, second, _ = self.certificates
+        first.generate()
+        with mock.patch.object(bulk_download, 'render_certificate'):
+            archive = self.bundle([first, second])
+        self.assertEqual(archive.namelist(), ['certificat_DEEE-TEST-0001.pdf', 'manifest.json'])
+        manifest = json.loads(archive.read('manifest.json'))
+        self.assertEqual([entry['number'] for entry in manifest['missing']], ['DEEE-TEST-0002'])
+
+    def test_zip_endpoint(self):
+        response = self.client.get(self.url, {'treatment_type': 'recycling'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertIn('.zip"', response['Content-Disposition'])
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        # PDF rendus à la demande : ajoutés dans l'ordre où ils sont prêts
+        self.assertEqual(
+            sorted(archive.namelist()),
+            ['certificat_DEEE-TEST-0001.pdf', 'certificat_DEEE-TEST-0002.pdf', 'manifest.json']
+        )
+
+    def test_merged_pdf_endpoint(self):
+        response = self.client.get(self.url, {'output': 'pdf'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(len(PdfReader(io.BytesIO(b''.join(response.streaming_content))).pages), 3)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(self.url, {'output': 'tar'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'companies': 'a'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'treatment_type': 'inconnu'}).status_code, 404)
+        with override_settings(CERTIFICATE_BULK_DOWNLOAD_LIMIT=2):
+            self.assertEqual(self.client.get(self.url).status_code, 400)
@@ -0,0 +1,26 @@
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from ..bundles import iter_request_bundle
+from ..models import SupportingDocument
+from .base import TemporaryMediaMixin, create_request
+
+
+class RequestBundleTests(TemporaryMediaMixin, TestCase):
+    """Noms des entrées des archives ZIP de demandes"""
+
+    def test_entries_use_display_names_without_collisions(self):
+        certification_request = create_request()
+        for name, content in [('Rapport', b'%PDF-1.4 a'), ('rapport.PDF', b'%PDF-1.4 b'), ('../étude.pdf', b'%PDF-1.4 c')]:
+            SupportingDocument.objects.create(
+                certification_request=certification_request, name=name,
+                file=ContentFile(content, name='document.pdf')
+            )
+        paths = []
+        for path, chunks, _ in iter_request_bundle([certification_request]):
+            b''.join(chunks)
+            paths.append(path)
+        folder = f'demande_{certification_request.id}/documents'
+        self.assertEqual(paths, [
+            f'{folder}/Rapport.pdf', f'{folder}/rapport (2).pdf', f'{folder}/étude.pdf', 'manifest.json'
+        ])
@@ -0,0 +1,89 @@
+import os
+from datetime import date, timedelta
+from unittest import mock
+from django.test import TestCase
+from django.utils import timezone
+from pypdf import PdfReader
+from accounts.models import CompanyProfile
+
+from ..certificate_generator import CertificateGenerator, certificate_cache_path
+from ..models import Certificate, CertificationRequest
+from .base import TemporaryMediaMixin, create_request
+
+
+class CertificateRenderingTests(TemporaryMediaMixin, TestCase):
+    """Cache des PDF de certificats rendus"""
+
+    def setUp(self):
+        super().setUp()
+        self.certificate = Certificate.objects.create(
+            number='DEEE-TEST-0001', treatment_type='recycling', certification_request=create_request(),
+            expiry_date=timezone.now().date() + timedelta(days=365)
+        )
+
+    def rendered_files(self):
+        root = os.path.join(self.media_root, 'certificates', 'rendered')
+        return sorted(name for _, _, names in os.walk(root) for name in names)
+
+    def test_render_is_written_under_its_cache_name(self):
+        self.certificate.generate()
+        name = self.certificate.pdf_file.name
+        self.assertEqual(name, certificate_cache_path(self.certificate.render_key))
+        # Rendu concurrent simulé : le fichier du cache existe déjà sous son nom
+        self.certificate.generate(force=True)
+        self.assertEqual(self.certificate.pdf_file.name, name)
+        self.assertEqual(self.rendered_files(), [os.path.basename(name)])
+
+    def test_previous_pdf_is_deleted_when_render_key_changes(self):
+        self.certificate.generate()
+        previous = self.certificate.pdf_file.name
+        company = self.certificate.certification_request.company
+        company.business_name = 'EcoTech Maroc'
+        company.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.certificate.generate()
+        self.assertNotEqual(self.certificate.pdf_file.name, previous)
+        self.assertEqual(self.rendered_files(), [os.path.basename(self.certificate.pdf_file.name)])
+
+
+class CertificateGeneratorTests(TestCase):
+    """Partie fixe des certificats rendue une fois par processus"""
+
+    def setUp(self):
+        company = CompanyProfile(business_name='EcoTech', ice_number='000000000000001', address='Rue 1')
+        self.certificates = [
+            Certificate(
+                number=f'DEEE-TEST-{index:04d}', treatment_type='recycling', issue_date=date(2026, 1, 1),
+                certification_request=CertificationRequest(company=company), expiry_date=date(2027, 1, 1)
+            )
+            for index in range(3)
+        ]
+
+    def text(self, buffer, index=0):
+        return PdfReader(buffer).pages[index].extract_text()
+
+    def test_static_layer_is_drawn_once_per_process(self):
+        generator = CertificateGenerator()
+        generator.generate_certificate_pdf(self.certificates[0])
+        with mock.patch.object(CertificateGenerator, '_draw_static_layer') as draw:
+            text = self.text(generator.generate_certificate_pdf(self.certificates[1]))
+        draw.assert_not_called()
+        self.assertIn('CERTIFICAT DE CONFORMITÉ', text)
+        self.assertIn('Le Ministre', text)
+        self.assertIn('DEEE-TEST-0001', text)
+
+    def test_cached_layer_matches_a_full_drawing(self):
+        cached = CertificateGenerator().generate_certificate_pdf(self.certificates[0])
+        with mock.patch('certifications.certificate_generator.PdfReader', None):
+            drawn = CertificateGenerator().generate_certificate_pdf(self.certificates[0])
+        self.assertEqual(self.text(cached), self.text(drawn))
+
+    def test_merged_pdf_shares_the_static_layer(self):
+        reader = PdfReader(CertificateGenerator().generate_certificates_pdf(self.certificates))
+        forms = {
+            page['/Resources']['/XObject'].raw_get(name).idnum
+            for page in reader.pages for name in page['/Resources']['/XObject']
+        }
+        self.assertEqual(len(reader.pages), 3)
+        self.assertEqual(len(forms), 1)
+        self.assertIn('DEEE-TEST-0002', reader.pages[2].extract_text())
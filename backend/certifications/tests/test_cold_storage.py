@@ -0,0 +1,80 @@
+import gzip
+import io
+import os
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from ..cold_storage import PackWriter, move_to_cold, pack_path, packed_entry
+from ..models import ArchivePack, SupportingDocument
+from ..storage import document_storage
+from .base import TemporaryMediaMixin, create_request
+
+
+class ColdStorageTests(TemporaryMediaMixin, TestCase):
+    """Archives du stockage froid : écriture en ajout seul et lecture transparente"""
+
+    def setUp(self):
+        super().setUp()
+        settings_override = self.settings(COLD_STORAGE_ROOT=os.path.join(self.media_root, 'cold'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def archive(self, content):
+        document = SupportingDocument.objects.create(
+            certification_request=create_request(), file=ContentFile(content, name='etude.bin')
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            move_to_cold([document.file.name])
+        # Instance relue : le fichier n'est plus le ContentFile envoyé
+        return SupportingDocument.objects.get(pk=document.pk)
+
+    def test_archived_document_is_read_from_its_pack(self):
+        content = os.urandom(200 * 1024)
+        document = self.archive(content)
+        self.assertFalse(os.path.exists(document_storage().path(document.file.name)))
+        self.assertTrue(document_storage().exists(document.file.name))
+
+        entry = packed_entry(document.file.name)
+        with open(pack_path(entry.pack.name), 'rb') as pack:
+            # Archive lisible sans l'index (zcat)
+            self.assertEqual(gzip.decompress(pack.read()), content)
+        with document.file.open('rb') as file:
+            file.seek(1000)
+            self.assertEqual(file.read(10), content[1000:1010])
+            file.seek(10)
+            self.assertEqual(file.read(), content[10:])
+
+    def test_archived_document_can_be_reopened(self):
+        content = os.urandom(1000)
+        document = self.archive(content)
+        for _ in range(2):
+            document.file.open('rb')
+            self.assertEqual(document.file.read(), content)
+            document.file.close()
+        self.assertTrue(document.file.closed)
+
+    def test_concurrent_writers_share_the_open_pack(self):
+        first, second = PackWriter(), PackWriter()
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+        entries = [
+            first.append('a', io.BytesIO(b'a' * 100)),
+            second.append('b', io.BytesIO(b'b' * 100)),
+            first.append('c', io.BytesIO(b'c' * 100)),
+        ]
+        pack = ArchivePack.objects.get()
+        # Chaque écrivain relit l'archive verrouillée : aucun ajout de l'autre n'est perdu
+        self.assertEqual(pack.member_count, 3)
+        self.assertEqual(pack.size, os.path.getsize(pack_path(pack.name)))
+        offsets = [(offset, offset + length) for _, offset, length, _ in entries]
+        self.assertEqual(offsets, sorted(offsets))
+        self.assertEqual([end for _, end in offsets[:-1]], [start for start, _ in offsets[1:]])
+
+    def test_full_pack_is_sealed(self):
+        writer = PackWriter()
+        self.addCleanup(writer.close)
+        with self.settings(COLD_STORAGE_PACK_MAX_SIZE=50):
+            full, _, _, _ = writer.append('a', io.BytesIO(os.urandom(100)))
+            other, _, _, _ = writer.append('b', io.BytesIO(b'b'))
+        self.assertTrue(ArchivePack.objects.get(pk=full.pk).sealed)
+        self.assertNotEqual(full.pk, other.pk)
@@ -0,0 +1,87 @@
+import os
+import time
+from datetime import timedelta
+from io import StringIO
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ..documents import RENDER_CACHE_PREFIX
+from ..models import SupportingDocument, UploadSession
+from .base import TemporaryMediaMixin, create_request
+
+
+class CollectOrphanedMediaTests(TemporaryMediaMixin, TestCase):
+    """Nettoyage des fichiers de MEDIA_ROOT qui ne sont plus référencés"""
+
+    def setUp(self):
+        super().setUp()
+        self.request = create_request()
+
+    def write(self, name, hours=48):
+        """Fichier modifié il y a `hours` heures"""
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'contenu')
+        modified = time.time() - hours * 3600
+        os.utime(path, (modified, modified))
+        return name
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.media_root, name))
+
+    def collect(self, **options):
+        call_command('collect_orphaned_media', stdout=StringIO(), **options)
+
+    def upload_session(self, expires_at):
+        return UploadSession.objects.create(
+            certification_request=self.request, created_by=self.request.company.user,
+            filename='etude.pdf', total_size=100, expires_at=expires_at
+        )
+
+    def test_old_orphans_are_removed_after_the_grace_period(self):
+        old = self.write('documents/ab/cd/orphelin.pdf')
+        recent = self.write('documents/ef/01/recent.pdf', hours=1)
+        self.collect()
+        self.assertFalse(self.exists(old))
+        self.assertTrue(self.exists(recent))
+        # Dossiers répartis devenus vides retirés
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'documents', 'ab')))
+
+        self.collect(grace_hours=0)
+        self.assertFalse(self.exists(recent))
+
+    def test_referenced_files_are_kept(self):
+        document = SupportingDocument.objects.create(
+            certification_request=self.request, file=ContentFile(b'etude', name='etude.pdf')
+        )
+        path = os.path.join(self.media_root, document.file.name)
+        modified = time.time() - 48 * 3600
+        os.utime(path, (modified, modified))
+        self.collect()
+        self.assertTrue(self.exists(document.file.name))
+
+    def test_excluded_prefixes_and_hidden_files_are_kept(self):
+        rendered = self.write(f'{RENDER_CACHE_PREFIX}audit_report/ab/cd/rapport.pdf')
+        hidden = self.write('exports/.render_checkpoint')
+        self.collect()
+        self.assertTrue(self.exists(rendered))
+        self.assertTrue(self.exists(hidden))
+
+    def test_parts_of_active_upload_sessions_are_kept(self):
+        active = self.upload_session(timezone.now() + timedelta(hours=1))
+        expired = self.upload_session(timezone.now() - timedelta(hours=1))
+        active_part = self.write(active.part_name(0))
+        expired_part = self.write(expired.part_name(0))
+        self.collect()
+        self.assertTrue(self.exists(active_part))
+        self.assertFalse(self.exists(expired_part))
+
+    def test_dry_run_deletes_nothing(self):
+        orphan = self.write('documents/ab/cd/orphelin.pdf')
+        output = StringIO()
+        call_command('collect_orphaned_media', dry_run=True, stdout=output)
+        self.assertTrue(self.exists(orphan))
+        self.assertIn('1 orphelin(s) à supprimer', output.getvalue())
@@ -0,0 +1,43 @@
+from django.test import TestCase
+
+from ..documents import render_document
+
+
+class DocumentRenderingTests(TestCase):
+    """Rendu PDF des documents à partir de données saisies par les utilisateurs"""
+
+    def rejection_data(self, **overrides):
+        data = {
+            'request_id': 1,
+            'date': '01/01/2026',
+            'company': 'EcoTech',
+            'ice_number': '000000000000001',
+            'treatment_type': 'DEEE',
+            'submission_date': '01/01/2026',
+            'rejected_by': 'Agent',
+            'comments': 'Dossier incomplet',
+        }
+        data.update(overrides)
+        return data
+
+    def test_markup_in_user_data_is_rendered_as_text(self):
+        data = self.rejection_data(
+            company='<img src="/etc/hostname"/> Tri & Co <b>',
+            comments='<img src="http://127.0.0.1:1/x.png"/>\nValeur < seuil & rapport <a href="x">',
+        )
+        pdf = render_document('rejection_report', data)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+
+    def test_markup_in_recommendations_is_rendered_as_text(self):
+        data = {
+            'title': 'Audit <font size="900">',
+            'period_start': '01/01/2026',
+            'period_end': '31/01/2026',
+            'summary': {'total_requests': 1, 'processed_requests': 1, 'pending_requests': 0, 'success_rate': 100},
+            'details': {
+                'certificates_issued': 1, 'certificates_revoked': 0,
+                'companies_audited': 1, 'compliance_issues': 0,
+            },
+            'recommendations': ['<img src="/etc/hostname"/>', 'A & B'],
+        }
+        self.assertTrue(render_document('audit_report', data).startswith(b'%PDF'))
@@ -0,0 +1,63 @@
+import io
+import struct
+import zlib
+from django.core.files.base import ContentFile
+from django.test import TestCase
+from reportlab.pdfgen import canvas
+
+from ..models import SupportingDocument
+from .base import TemporaryMediaMixin, create_request
+
+
+def compressed_pdf(page_count):
+    """PDF 1.5 dont tous les objets sont dans un flux d'objets compressé (aucun « /Type /Page » lisible)"""
+    kids = ' '.join(f'{number} 0 R' for number in range(3, 3 + page_count))
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        f'<< /Type /Pages /Kids [{kids}] /Count {page_count} >>'.encode(),
+    ] + [b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 10 10] >>'] * page_count
+    offsets, body = [], b''
+    for obj in objects:
+        offsets.append(len(body))
+        body += obj + b'\n'
+    header = ' '.join(f'{number} {offset}' for number, offset in enumerate(offsets, 1)).encode() + b'\n'
+    stream_number, xref_number = len(objects) + 1, len(objects) + 2
+
+    pdf = b'%PDF-1.5\n'
+    data = zlib.compress(header + body)
+    stream_offset = len(pdf)
+    pdf += (
+        f'{stream_number} 0 obj\n<< /Type /ObjStm /N {len(objects)} /First {len(header)} '
+        f'/Filter /FlateDecode /Length {len(data)} >>\nstream\n'
+    ).encode() + data + b'\nendstream\nendobj\n'
+    entries = [struct.pack('>BIH', 0, 0, 65535)]
+    entries += [struct.pack('>BIH', 2, stream_number, index) for index in range(len(objects))]
+    entries += [struct.pack('>BIH', 1, stream_offset, 0), struct.pack('>BIH', 1, len(pdf), 0)]
+    data = zlib.compress(b''.join(entries))
+    xref_offset = len(pdf)
+    pdf += (
+        f'{xref_number} 0 obj\n<< /Type /XRef /Size {xref_number + 1} /W [1 4 2] /Root 1 0 R '
+        f'/Filter /FlateDecode /Length {len(data)} >>\nstream\n'
+    ).encode() + data + f'\nendstream\nendobj\nstartxref\n{xref_offset}\n%%EOF\n'.encode()
+    return pdf
+
+
+class PageCountTests(TemporaryMediaMixin, TestCase):
+    """Nombre de pages des PDF relevé à l'envoi"""
+
+    def upload(self, content):
+        return SupportingDocument.objects.create(
+            certification_request=create_request(), file=ContentFile(content, name='etude.pdf')
+        )
+
+    def test_pages_are_counted_while_writing(self):
+        buffer = io.BytesIO()
+        c = canvas.Canvas(buffer)
+        for _ in range(3):
+            c.showPage()
+        c.save()
+        document = self.upload(buffer.getvalue())
+        self.assertEqual((document.file_mime_type, document.file_page_count), ('application/pdf', 3))
+
+    def test_compressed_objects_are_counted_with_pypdf(self):
+        self.assertEqual(self.upload(compressed_pdf(4)).file_page_count, 4)
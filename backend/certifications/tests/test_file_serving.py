@@ -0,0 +1,95 @@
+import os
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import RequestFactory, TestCase, override_settings
+
+from ..cold_storage import move_to_cold
+from ..file_serving import StoredFile, parse_range, serve_file
+from ..models import SupportingDocument
+from .base import TemporaryMediaMixin, create_request
+
+
+class FileServingTests(TemporaryMediaMixin, TestCase):
+    """Envoi des fichiers stockés : FileResponse avec Range, ou délégation au proxy frontal"""
+
+    def setUp(self):
+        super().setUp()
+        self.content = os.urandom(1000)
+        self.name = default_storage.save('reports/rapport final.pdf', ContentFile(self.content))
+
+    def serve(self, field_file=None, **headers):
+        request = RequestFactory().get('/', **headers)
+        return serve_file(request, field_file or StoredFile(self.name), filename='rapport.pdf')
+
+    def body(self, response):
+        try:
+            return b''.join(response.streaming_content)
+        finally:
+            response.close()
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=10-19', 100), (10, 19))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-5', 100), (95, 99))
+        self.assertEqual(parse_range('bytes=90-500', 100), (90, 99))
+        self.assertFalse(parse_range('bytes=100-', 100))
+        self.assertFalse(parse_range('bytes=-0', 100))
+        # Plusieurs plages ou unité inconnue : fichier complet
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(parse_range('items=0-1', 100))
+        self.assertIsNone(parse_range(None, 100))
+
+    def test_full_file(self):
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="rapport.pdf"')
+        self.assertEqual(self.body(response), self.content)
+
+    def test_byte_ranges(self):
+        for header, start, end in [('bytes=10-19', 10, 19), ('bytes=990-', 990, 999), ('bytes=-5', 995, 999)]:
+            response = self.serve(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/1000')
+            self.assertEqual(response['Content-Length'], str(end - start + 1))
+            self.assertEqual(self.body(response), self.content[start:end + 1])
+
+    def test_unsatisfiable_range(self):
+        response = self.serve(HTTP_RANGE='bytes=1000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1000')
+
+    @override_settings(FILE_SERVING_BACKEND='x-accel-redirect', FILE_SERVING_INTERNAL_URL='/protected-media/')
+    def test_x_accel_redirect(self):
+        response = self.serve()
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/reports/rapport%20final.pdf')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="rapport.pdf"')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(FILE_SERVING_BACKEND='x-sendfile')
+    def test_x_sendfile(self):
+        response = self.serve()
+        self.assertEqual(response['X-Sendfile'], default_storage.path(self.name))
+        self.assertEqual(response.content, b'')
+
+    @override_settings(FILE_SERVING_BACKEND='presigned')
+    def test_presigned_redirect(self):
+        response = self.serve()
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/storage/', response['Location'])
+        self.assertEqual(response['Cache-Control'], 'private, no-store')
+
+    @override_settings(FILE_SERVING_BACKEND='x-accel-redirect')
+    def test_cold_file_is_streamed_by_django(self):
+        document = SupportingDocument.objects.create(
+            certification_request=create_request(), file=ContentFile(self.content, name='etude.bin')
+        )
+        with self.settings(COLD_STORAGE_ROOT=os.path.join(self.media_root, 'cold')):
+            with self.captureOnCommitCallbacks(execute=True):
+                move_to_cold([document.file.name])
+            # Plus sur le disque courant : le proxy ne peut pas l'envoyer
+            response = self.serve(SupportingDocument.objects.get(pk=document.pk).file, HTTP_RANGE='bytes=500-509')
+            self.assertNotIn('X-Accel-Redirect', response)
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(self.body(response), self.content[500:510])
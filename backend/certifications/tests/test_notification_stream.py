@@ -0,0 +1,126 @@
+import asyncio
+import time
+from unittest import mock
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from accounts.models import User
+
+from .. import notification_stream
+from ..models import AuthorityNotification
+from ..notification_stream import (
+    QUEUE_SIZE, LocalBroker, aevent_stream, channels_for, event_stream, issue_ticket, read_ticket, role_channel,
+    user_channel,
+)
+
+
+@override_settings(NOTIFICATION_STREAM_KEEPALIVE=0.05, NOTIFICATION_STREAM_MAX_AGE=5)
+class NotificationStreamTests(TestCase):
+    """Flux Server-Sent Events des notifications : ticket, courtier et regroupement des événements"""
+    url = '/api/certifications/notifications/stream/'
+
+    def setUp(self):
+        self.user = User.objects.create(username='autorite', role='authority')
+        self.broker = LocalBroker()
+        patcher = mock.patch.object(notification_stream, '_broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def notify(self, count=1, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(count):
+                AuthorityNotification.objects.create(
+                    title=f'Notification {index}', message='Message', notification_type='system_alert',
+                    recipient=self.user, **fields
+                )
+
+    def subscribed(self):
+        return set(self.broker._subscriptions)
+
+    def test_invalid_or_expired_tickets_are_refused(self):
+        ticket = issue_ticket(self.user)
+        self.assertEqual(read_ticket(ticket), self.user)
+        self.assertIsNone(read_ticket(ticket[:-2] + 'xx'))
+        self.assertIsNone(read_ticket(None))
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 120):
+            self.assertIsNone(read_ticket(ticket))
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(read_ticket(ticket))
+        response = self.client.get(self.url, {'ticket': ticket}, **{'wsgi.multithread': True})
+        self.assertEqual(response.status_code, 403)
+
+    def test_ticket_view_requires_authentication(self):
+        ticket_url = f'{self.url}ticket/'
+        self.assertEqual(self.client.post(ticket_url).status_code, 401)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(read_ticket(self.client.post(ticket_url).data['ticket']), self.user)
+
+    def test_single_threaded_wsgi_server_is_refused(self):
+        response = self.client.get(self.url, {'ticket': issue_ticket(self.user)}, **{'wsgi.multithread': False})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.subscribed(), set())
+
+    def test_subscription_lives_with_the_response_body(self):
+        response = self.client.get(self.url, {'ticket': issue_ticket(self.user)}, **{'wsgi.multithread': True})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        # Corps jamais lu : aucun abonnement ouvert
+        self.assertEqual(self.subscribed(), set())
+        next(iter(response.streaming_content))
+        self.assertEqual(self.subscribed(), {user_channel(self.user.pk), role_channel('authority')})
+        response.close()
+        self.assertEqual(self.subscribed(), set())
+
+    def test_burst_of_events_is_counted_once(self):
+        stream = event_stream(self.user, channels_for(self.user))
+        self.assertTrue(next(stream).startswith('retry:'))
+        self.assertIn('"count": 0', next(stream))
+        self.notify(count=3)
+        with mock.patch.object(notification_stream, 'unread_count', wraps=notification_stream.unread_count) as count:
+            chunks = [next(stream) for _ in range(4)]
+        self.assertEqual([chunk.split('\n')[0] for chunk in chunks], ['event: notification'] * 3 + ['event: unread_count'])
+        self.assertIn('"count": 3', chunks[-1])
+        count.assert_called_once()
+        stream.close()
+        self.assertEqual(self.subscribed(), set())
+
+    def test_unchanged_count_is_not_resent(self):
+        self.notify()
+        stream = event_stream(self.user, channels_for(self.user))
+        next(stream)
+        self.assertIn('"count": 1', next(stream))
+        self.broker.publish(user_channel(self.user.pk), {'type': 'notifications_changed', 'data': None})
+        self.assertEqual(next(stream), ': keep-alive\n\n')
+        stream.close()
+
+    @override_settings(NOTIFICATION_STREAM_MAX_AGE=0.1)
+    def test_stream_ends_with_a_reconnect_event(self):
+        chunks = list(event_stream(self.user, channels_for(self.user)))
+        self.assertEqual(chunks[-1], 'event: reconnect\ndata: {}\n\n')
+        self.assertIn(': keep-alive\n\n', chunks)
+
+    def test_slow_client_does_not_block_publishers(self):
+        subscription = self.broker.subscribe([user_channel(self.user.pk)])
+        for index in range(QUEUE_SIZE + 10):
+            self.broker.publish(user_channel(self.user.pk), {'type': 'notifications_changed', 'data': index})
+        self.assertEqual(subscription._queue.qsize(), QUEUE_SIZE)
+        subscription.close()
+
+    async def test_async_stream_receives_events_from_other_threads(self):
+        stream = aevent_stream(self.user, channels_for(self.user))
+        self.assertTrue((await anext(stream)).startswith('retry:'))
+        self.assertIn('"count": 0', await anext(stream))
+        # Publication depuis un thread (validation d'une transaction dans une vue synchrone)
+        await asyncio.to_thread(
+            self.broker.publish, role_channel('authority'), {'type': 'requests_changed', 'data': {'id': 1}}
+        )
+        self.assertEqual(await anext(stream), 'event: requests_changed\ndata: {"id": 1}\n\n')
+        self.assertEqual(await anext(stream), ': keep-alive\n\n')
+        await stream.aclose()
+        self.assertEqual(self.subscribed(), set())
+
+    async def test_asgi_requests_get_an_asynchronous_body(self):
+        response = await self.async_client.get(self.url, {'ticket': issue_ticket(self.user)})
+        self.assertTrue(response.is_async)
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+        self.assertIn(b'"count": 0', await anext(chunks))
@@ -0,0 +1,106 @@
+import io
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase
+from PIL import Image
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from rest_framework.test import APIClient
+
+from .. import previews
+from ..models import SupportingDocument
+from ..previews import generate_preview, preview_name, render_preview
+from .base import TemporaryMediaMixin, create_request
+
+
+def image_bytes(size, format='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'green').save(buffer, format)
+    return buffer.getvalue()
+
+
+def pdf_bytes():
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    c.drawString(100, 700, 'Etude de conformité')
+    c.save()
+    return buffer.getvalue()
+
+
+class PreviewRenderingTests(TestCase):
+    """Vignettes des images et première page des PDF"""
+
+    def rendered_size(self, content):
+        self.assertIsNotNone(content)
+        with Image.open(io.BytesIO(content)) as image:
+            self.assertEqual(image.format, 'JPEG')
+            return image.size
+
+    def test_images_are_reduced_to_the_preview_size(self):
+        self.assertEqual(self.rendered_size(render_preview(io.BytesIO(image_bytes((1200, 600))), 'image/png')), (480, 240))
+        self.assertEqual(self.rendered_size(render_preview(io.BytesIO(image_bytes((100, 50), 'JPEG')), 'image/jpeg')), (100, 50))
+
+    def test_first_pdf_page_is_rasterized(self):
+        width, height = self.rendered_size(render_preview(io.BytesIO(pdf_bytes()), 'application/pdf'))
+        self.assertEqual(max(width, height), height)
+        self.assertLessEqual(height, 480)
+
+    def test_missing_pdf_rasterizer_is_reported(self):
+        previews._report_missing_rasterizer.cache_clear()
+        self.addCleanup(previews._report_missing_rasterizer.cache_clear)
+        with mock.patch.object(previews, 'pypdfium2', None), mock.patch.object(previews, 'fitz', None), \
+                mock.patch.object(previews.shutil, 'which', return_value=None), \
+                self.assertLogs(previews.logger, 'WARNING') as logs:
+            self.assertIsNone(render_preview(io.BytesIO(pdf_bytes()), 'application/pdf'))
+            self.assertIsNone(render_preview(io.BytesIO(pdf_bytes()), 'application/pdf'))
+        # Un seul avertissement par processus
+        self.assertEqual(len(logs.records), 1)
+
+    def test_other_types_have_no_preview(self):
+        self.assertIsNone(render_preview(io.BytesIO(b'texte'), 'text/plain'))
+
+
+class PreviewViewTests(TemporaryMediaMixin, TestCase):
+    """Action « preview » : aperçu servi avec ETag, revalidation en 304"""
+
+    def setUp(self):
+        super().setUp()
+        certification_request = create_request()
+        self.client = APIClient()
+        self.client.force_authenticate(certification_request.company.user)
+        self.document = SupportingDocument.objects.create(
+            certification_request=certification_request, file=ContentFile(image_bytes((800, 800)), name='photo.png')
+        )
+        self.url = f'/api/certifications/supporting-documents/{self.document.id}/preview/'
+
+    def test_preview_is_shared_by_identical_files(self):
+        twin = SupportingDocument.objects.create(
+            certification_request=self.document.certification_request,
+            file=ContentFile(image_bytes((800, 800)), name='copie.png')
+        )
+        generate_preview(self.document.id)
+        self.document.refresh_from_db()
+        twin.refresh_from_db()
+        self.assertEqual(self.document.preview.name, preview_name(self.document.file.name))
+        self.assertTrue(default_storage.exists(self.document.preview.name))
+        # Stockage adressé par contenu : même fichier, même aperçu
+        self.assertEqual(twin.file.name, self.document.file.name)
+        self.assertEqual(twin.preview.name, self.document.preview.name)
+
+    def test_missing_preview_is_not_found(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_preview_is_revalidated_by_etag(self):
+        generate_preview(self.document.id)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).size, (480, 480))
+
+        etag = response['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual((response['ETag'], response.content), (etag, b''))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"autre"').status_code, 200)
@@ -0,0 +1,105 @@
+from django.core.files.base import ContentFile
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import StoredBlob, SupportingDocument
+from ..storage import (
+    CAS_PREFIX, RESERVATION_TIMEOUT, acquire, delete_if_unreferenced, discard, document_storage, release,
+    unreferenced_blobs,
+)
+from .base import TemporaryMediaMixin, create_request
+
+
+class ContentAddressedReferenceTests(TemporaryMediaMixin, TestCase):
+    """Comptage des références aux documents adressés par contenu (StoredBlob)"""
+
+    def setUp(self):
+        super().setUp()
+        self.storage = document_storage()
+
+    def save(self, content=b'%PDF-1.4 contenu'):
+        return self.storage.save('etude.pdf', ContentFile(content))
+
+    def blob(self, name):
+        return StoredBlob.objects.get(name=name)
+
+    def test_identical_content_is_stored_once(self):
+        first = self.save()
+        second = self.save()
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith(CAS_PREFIX))
+        self.assertEqual(self.blob(first).pending, 2)
+
+    def test_acquire_converts_reservations_into_references(self):
+        name = self.save()
+        self.save()
+        acquire([name, name])
+        blob = self.blob(name)
+        self.assertEqual((blob.refcount, blob.pending), (2, 0))
+
+    def test_file_is_deleted_with_its_last_reference(self):
+        name = self.save()
+        acquire([name])
+        self.save()
+        acquire([name])
+        with self.captureOnCommitCallbacks(execute=True):
+            release([name])
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.blob(name).refcount, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            release([name])
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(StoredBlob.objects.filter(name=name).exists())
+
+    def test_reused_file_survives_release_before_its_reference(self):
+        name = self.save()
+        acquire([name])
+        # Même contenu réutilisé par un autre envoi, dont la ligne n'est pas encore enregistrée
+        self.assertEqual(self.save(), name)
+        with self.captureOnCommitCallbacks(execute=True):
+            release([name])
+        self.assertTrue(self.storage.exists(name))
+        acquire([name])
+        blob = self.blob(name)
+        self.assertEqual((blob.refcount, blob.pending), (1, 0))
+
+    def test_discard_keeps_shared_files(self):
+        name = self.save()
+        acquire([name])
+        self.save()
+        discard([name])
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.blob(name).pending, 0)
+
+    def test_discard_deletes_unshared_files(self):
+        name = self.save()
+        discard([name])
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(StoredBlob.objects.filter(name=name).exists())
+
+    def test_abandoned_reservation_expires(self):
+        name = self.save()
+        StoredBlob.objects.filter(name=name).update(reserved_at=timezone.now() - RESERVATION_TIMEOUT * 2)
+        self.assertEqual(list(unreferenced_blobs().values_list('name', flat=True)), [name])
+        self.assertTrue(delete_if_unreferenced(name))
+        self.assertFalse(self.storage.exists(name))
+
+    def test_model_rows_hold_references(self):
+        request = create_request()
+        documents = [
+            SupportingDocument.objects.create(
+                certification_request=request, name='Étude', document_type='environmental_study',
+                file=ContentFile(b'%PDF-1.4 contenu', name='etude.pdf')
+            )
+            for _ in range(2)
+        ]
+        name = documents[0].file.name
+        self.assertEqual(documents[1].file.name, name)
+        blob = self.blob(name)
+        self.assertEqual((blob.refcount, blob.pending), (2, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            documents[0].delete()
+        self.assertTrue(self.storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            documents[1].delete()
+        self.assertFalse(self.storage.exists(name))
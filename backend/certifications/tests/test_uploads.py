@@ -0,0 +1,154 @@
+import hashlib
+import os
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from ..models import SupportingDocument, UploadSession
+from .. import uploads
+from ..uploads import _inserted_documents, chain_checksum
+from .base import TemporaryMediaMixin, create_request
+
+
+class ResumableUploadTests(TemporaryMediaMixin, TestCase):
+    """Protocole de téléversement fractionné : ouverture, fragments, finalisation"""
+    url = '/api/certifications/upload-sessions/'
+
+    def setUp(self):
+        super().setUp()
+        # Aperçus générés en arrière-plan, hors de la transaction du test
+        preview = mock.patch('certifications.signals.enqueue_preview')
+        preview.start()
+        self.addCleanup(preview.stop)
+        self.request = create_request()
+        self.client = APIClient()
+        self.client.force_authenticate(self.request.company.user)
+        self.data = b'%PDF-1.4 ' + bytes(range(256)) * 40
+
+    def open_session(self):
+        response = self.client.post(self.url, {
+            'certification_request': self.request.id, 'filename': 'etude.pdf',
+            'total_size': len(self.data), 'document_type': 'environmental_study',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def put_chunk(self, session_id, start, end, checksum=None):
+        headers = {'HTTP_CONTENT_RANGE': f'bytes {start}-{end - 1}/{len(self.data)}'}
+        if checksum:
+            headers['HTTP_X_CHUNK_SHA256'] = checksum
+        return self.client.generic(
+            'PUT', f'{self.url}{session_id}/chunk/', self.data[start:end],
+            content_type='application/octet-stream', **headers
+        )
+
+    def finalize(self, session_id, checksum=None):
+        return self.client.post(
+            f'{self.url}{session_id}/finalize/', {'checksum': checksum} if checksum else {}, format='json'
+        )
+
+    def chained_checksum(self, bounds):
+        checksum = ''
+        for start, end in bounds:
+            checksum = chain_checksum(checksum, hashlib.sha256(self.data[start:end]).digest())
+        return checksum
+
+    def test_chunks_are_assembled_on_finalize(self):
+        session_id = self.open_session()
+        middle = len(self.data) // 2
+        self.assertEqual(self.put_chunk(session_id, 0, middle).status_code, 200)
+        response = self.put_chunk(session_id, middle, len(self.data))
+        self.assertEqual(response.json()['received_size'], len(self.data))
+        checksum = self.chained_checksum([(0, middle), (middle, len(self.data))])
+        self.assertEqual(response.json()['checksum'], checksum)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.finalize(session_id, checksum)
+        self.assertEqual(response.status_code, 201)
+        document = SupportingDocument.objects.get(id=response.json()['document']['id'])
+        with document.file.open('rb') as file:
+            self.assertEqual(file.read(), self.data)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads', 'partial')), [])
+
+    def test_chunk_at_wrong_offset_is_rejected(self):
+        session_id = self.open_session()
+        self.assertEqual(self.put_chunk(session_id, 0, 100).status_code, 200)
+        for start in (0, 200):
+            response = self.put_chunk(session_id, start, start + 100)
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.json()['received_size'], 100)
+        self.assertEqual(UploadSession.objects.get(id=session_id).parts, 1)
+
+    def test_chunk_checksum_mismatch_is_rejected(self):
+        session_id = self.open_session()
+        response = self.put_chunk(session_id, 0, 100, checksum='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        session = UploadSession.objects.get(id=session_id)
+        self.assertEqual((session.received_size, session.parts), (0, 0))
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads', 'partial', session_id)), [])
+
+    def test_finalize_rejects_incomplete_upload_and_wrong_checksum(self):
+        session_id = self.open_session()
+        self.put_chunk(session_id, 0, 100)
+        self.assertEqual(self.finalize(session_id).status_code, 409)
+        self.put_chunk(session_id, 100, len(self.data))
+        self.assertEqual(self.finalize(session_id, '0' * 64).status_code, 400)
+        self.assertFalse(SupportingDocument.objects.exists())
+
+    def test_stale_part_files_are_not_assembled(self):
+        session_id = self.open_session()
+        session = UploadSession.objects.get(id=session_id)
+        # Fragment laissé par un essai interrompu, sous le nom calculé d'un fragment
+        default_storage.save(session.part_name(0), ContentFile(b'x' * 100))
+        self.put_chunk(session_id, 0, 100)
+        self.put_chunk(session_id, 100, len(self.data))
+        response = self.finalize(session_id)
+        self.assertEqual(response.status_code, 201)
+        document = SupportingDocument.objects.get(id=response.json()['document']['id'])
+        with document.file.open('rb') as file:
+            self.assertEqual(file.read(), self.data)
+
+    def test_concurrent_finalize_keeps_a_single_document(self):
+        session_id = self.open_session()
+        self.put_chunk(session_id, 0, len(self.data))
+        record_metadata = uploads.record_metadata
+        concurrent = {}
+
+        def finalize_meanwhile(*args):
+            # Autre finalisation terminée pendant la copie, hors verrou, de celle-ci
+            if 'document' not in concurrent:
+                concurrent['document'] = None
+                concurrent['document'] = uploads.finalize(session_id)
+            return record_metadata(*args)
+
+        with mock.patch.object(uploads, 'record_metadata', side_effect=finalize_meanwhile):
+            document = uploads.finalize(session_id)
+        self.assertEqual(document, concurrent['document'])
+        self.assertEqual(SupportingDocument.objects.count(), 1)
+        with document.file.open('rb') as file:
+            self.assertEqual(file.read(), self.data)
+
+
+class BulkDocumentCreationTests(TestCase):
+    """Lignes créées par bulk_create relues sans les clés générées (MySQL)"""
+
+    def test_inserted_rows_are_reread_by_their_values(self):
+        request = create_request()
+
+        def document(name, file='documents/aa/aa/a.pdf'):
+            return SupportingDocument(
+                certification_request=request, name=name, file=file, document_type='environmental_study'
+            )
+
+        # Document identique déjà présent : ne doit pas être confondu avec les nouveaux
+        existing = SupportingDocument.objects.bulk_create([document('Etude')])[0]
+        documents = [document('Annexe', 'documents/bb/bb/b.pdf'), document('Etude'), document('Etude')]
+        SupportingDocument.objects.bulk_create(documents)
+        expected = [document.id for document in documents]
+        for document in documents:
+            document.id = None
+        inserted = _inserted_documents(request, documents)
+        self.assertEqual([document.id for document in inserted], expected)
+        self.assertNotIn(existing.id, expected)
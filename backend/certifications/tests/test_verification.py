@@ -0,0 +1,114 @@
+import json
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from .. import verification
+from ..models import Certificate
+from ..verification import VerificationFastPath
+from .base import create_request
+
+
+class VerificationMixin:
+    """Certificat valide et caches vidés"""
+
+    def setUp(self):
+        cache.clear()
+        verification._responses.clear()
+        self.addCleanup(verification._responses.clear)
+        self.certificate = Certificate.objects.create(
+            number='DEEE-TEST-0001', treatment_type='recycling', certification_request=create_request(),
+            expiry_date=timezone.now().date() + timedelta(days=365)
+        )
+
+    def url(self, token=None):
+        return f'/api/certifications/certificates/shared/{token or self.certificate.share_token}/'
+
+
+class PublicVerificationTests(VerificationMixin, TestCase):
+    """Vérification publique des certificats par jeton signé (QR code)"""
+
+    def test_valid_token_returns_public_data(self):
+        response = self.client.get(self.url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], f'public, max-age={verification.PUBLIC_CACHE_SECONDS}')
+        self.assertEqual(response['Access-Control-Allow-Origin'], '*')
+        data = response.json()
+        self.assertEqual((data['number'], data['company'], data['valid']), ('DEEE-TEST-0001', 'EcoTech', True))
+        # Données servies depuis le cache : aucune requête
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url()).json(), data)
+
+    def test_bad_signature_is_not_found_without_query(self):
+        forged = self.certificate.verification_token + ':signature'
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url(forged))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('Cache-Control', response)
+
+    def test_revoked_certificate_is_invalid(self):
+        self.assertTrue(self.client.get(self.url()).json()['valid'])
+        self.certificate.is_active = False
+        self.certificate.save()
+        data = self.client.get(self.url()).json()
+        self.assertEqual((data['revoked'], data['valid']), (True, False))
+
+    def test_expired_certificate_is_invalid(self):
+        Certificate.objects.filter(pk=self.certificate.pk).update(expiry_date=timezone.now().date() - timedelta(days=1))
+        data = self.client.get(self.url()).json()
+        self.assertEqual((data['revoked'], data['valid']), (False, False))
+
+
+class VerificationFastPathTests(VerificationMixin, TestCase):
+    """Même route servie par l'application WSGI placée devant Django"""
+
+    def setUp(self):
+        super().setUp()
+        # Connexion de la transaction du test : ne pas la fermer comme en fin de requête
+        patcher = mock.patch.object(verification, 'close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.application = VerificationFastPath(self.django_application)
+        self.delegated = []
+
+    def django_application(self, environ, start_response):
+        self.delegated.append(environ['PATH_INFO'])
+        start_response('200 OK', [])
+        return [b'django']
+
+    def call(self, path, method='GET'):
+        environ = getattr(RequestFactory(), method.lower())(path).environ
+        started = {}
+        body = b''.join(self.application(environ, lambda status, headers: started.update(status=status, headers=headers)))
+        return started['status'], dict(started['headers']), body
+
+    def test_fast_path_matches_the_view(self):
+        status, headers, body = self.call(self.url())
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(json.loads(body), self.client.get(self.url()).json())
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        self.assertEqual(headers['Cache-Control'], f'public, max-age={verification.PUBLIC_CACHE_SECONDS}')
+        self.assertEqual(self.call(self.url(), 'HEAD')[2], b'')
+        self.assertEqual(self.delegated, [])
+
+    def test_other_paths_are_passed_to_django(self):
+        for path in ['/api/certifications/certificates/', '/api/certifications/certificates/shared/a/b/']:
+            self.assertEqual(self.call(path)[2], b'django')
+        self.assertEqual(self.call(self.url(), 'POST')[2], b'django')
+        self.assertEqual(len(self.delegated), 3)
+
+    def test_rendered_response_is_kept_and_invalidated(self):
+        self.call(self.url())
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.call(self.url())[0], '200 OK')
+        self.certificate.is_active = False
+        self.certificate.save()
+        self.assertFalse(json.loads(self.call(self.url())[2])['valid'])
+
+    def test_forged_tokens_are_not_kept(self):
+        forged = self.certificate.verification_token + ':signature'
+        self.assertEqual(self.call(self.url(forged))[0], '404 Not Found')
+        self.assertEqual(list(verification._responses), [])
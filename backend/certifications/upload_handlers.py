@@ -0,0 +1,101 @@
+"""Validation des fichiers envoyés au fil de la réception
+
+Les gestionnaires d'upload de Django sont complétés d'une inspection des blocs reçus :
+signature (magic bytes) comparée à l'extension dès le premier bloc, limite de taille
+selon le type détecté, et calcul de l'empreinte et des métadonnées (file_metadata) dans
+la même passe. Un fichier refusé est abandonné immédiatement (SkipFile) : le reste de
+son contenu n'est ni conservé en mémoire ni écrit sur le disque. Les motifs de refus
+sont conservés sur la requête (upload_errors) pour être renvoyés par la vue.
+"""
+import os
+from django.conf import settings
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler, SkipFile, TemporaryFileUploadHandler
+)
+from .file_metadata import OLE_TYPES, ZIP_TYPES, FileInspector
+
+# Types acceptés pour chaque extension autorisée
+EXTENSION_TYPES = {
+    '.pdf': {'application/pdf'},
+    '.jpg': {'image/jpeg'},
+    '.jpeg': {'image/jpeg'},
+    '.png': {'image/png'},
+    **{extension: {mime_type} for extension, mime_type in {**OLE_TYPES, **ZIP_TYPES}.items()},
+}
+
+
+def size_limit(mime_type):
+    """Taille maximale d'un fichier de ce type (UPLOAD_SIZE_LIMITS, sinon UPLOAD_MAX_SIZE)"""
+    return getattr(settings, 'UPLOAD_SIZE_LIMITS', {}).get(mime_type, settings.UPLOAD_MAX_SIZE)
+
+
+def expected_types(filename):
+    """Types acceptés pour l'extension du fichier, ou None si l'extension n'est pas contrôlée ici"""
+    return EXTENSION_TYPES.get(os.path.splitext(filename or '')[1].lower())
+
+
+def content_error(filename, inspector):
+    """Motif de refus d'après les premiers octets et la taille reçue, ou None"""
+    allowed = expected_types(filename)
+    if allowed is None:
+        # Extension refusée par les validateurs des modèles ; pas de contrôle du contenu
+        return None
+    mime_type = inspector.mime_type()
+    if mime_type not in allowed:
+        return f'Le contenu de {filename} ne correspond pas à son extension'
+    if inspector.size > size_limit(mime_type):
+        return f'{filename} dépasse la taille maximale autorisée ({size_limit(mime_type) / (1024 * 1024):g} Mo)'
+    return None
+
+
+def upload_errors(request):
+    """Fichiers refusés pendant la réception de la requête (DRF ou Django)"""
+    if hasattr(request, '_request'):
+        # DRF n'analyse le corps qu'au premier accès à request.data
+        request.data
+        request = request._request
+    return getattr(request, 'upload_errors', [])
+
+
+class InspectingUploadMixin:
+    """Inspection des blocs d'un fichier par le gestionnaire qui le conserve"""
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        # Avant super() : le gestionnaire en mémoire interrompt la chaîne par une exception
+        self.inspector = FileInspector(file_name or '')
+        super().new_file(field_name, file_name, *args, **kwargs)
+
+    def inspects(self):
+        return True
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.inspects():
+            self.inspector.update(raw_data)
+            # Signature contrôlée sur le premier bloc, taille à chaque bloc
+            message = content_error(self.file_name, self.inspector)
+            if message:
+                errors = getattr(self.request, 'upload_errors', None)
+                if errors is None:
+                    errors = self.request.upload_errors = []
+                errors.append(message)
+                raise SkipFile(message)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None and self.inspects():
+            # Réutilisé par le stockage et les colonnes de métadonnées : pas de seconde lecture
+            file.metadata = self.inspector.result()
+        return file
+
+
+class ValidatingMemoryFileUploadHandler(InspectingUploadMixin, MemoryFileUploadHandler):
+    """Petits fichiers gardés en mémoire, validés au fil de la réception"""
+
+    def inspects(self):
+        # Requête trop volumineuse : les blocs sont transmis au gestionnaire suivant, qui les inspecte
+        return self.activated
+
+
+class ValidatingTemporaryFileUploadHandler(InspectingUploadMixin, TemporaryFileUploadHandler):
+    """Fichiers écrits dans un fichier temporaire, validés au fil de la réception"""
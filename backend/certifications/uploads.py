@@ -0,0 +1,398 @@
+"""Téléversements fractionnés et reprenables des documents justificatifs
+
+Protocole : POST (ouverture de la session) → PUT des fragments dans l'ordre, avec leur
+position dans l'en-tête Content-Range → POST de finalisation. Chaque fragment est
+écrit directement dans le stockage au fil de la lecture de la requête ; l'empreinte
+SHA-256 du fragment est calculée au passage et chaînée à celle des fragments
+précédents, ce qui permet de vérifier le fichier complet sans le relire.
+
+Session directe (direct=True) : le client dépose le fichier entier dans le stockage
+par un PUT signé (upload_url, object_storage) sans passer par l'application, puis
+finalise ; le contenu est alors contrôlé à la finalisation.
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .file_metadata import FileInspector, record_metadata
+from .models import SupportingDocument, UploadSession
+from .object_storage import supports_presigned_urls
+from .previews import enqueue_preview
+from .storage import acquire, discard
+from .upload_handlers import content_error, expected_types, size_limit
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png', 'xlsx', 'xls'}
+
+# Pool d'écriture partagé : borne le nombre d'écritures simultanées dans le stockage
+_write_executor = None
+_write_executor_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """Erreur de protocole, renvoyée au client avec son code HTTP"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class _HashingReader:
+    """Lecture bornée du corps de la requête, avec calcul de l'empreinte au passage"""
+    def __init__(self, stream, length):
+        self._stream = stream
+        self._remaining = length
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._stream.read(size)
+        self._remaining -= len(data)
+        if len(self.head) < 512:
+            self.head += data[:512 - len(self.head)]
+        self.size += len(data)
+        self.digest.update(data)
+        return data
+
+
+class _PartsReader:
+    """Lecture séquentielle des fragments stockés, ouverts l'un après l'autre"""
+    def __init__(self, storage, names):
+        self._storage = storage
+        self._names = iter(names)
+        self._current = None
+
+    def read(self, size=-1):
+        while True:
+            if self._current is None:
+                name = next(self._names, None)
+                if name is None:
+                    return b''
+                self._current = self._storage.open(name, 'rb')
+            data = self._current.read(size)
+            if data:
+                return data
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+
+
+def chain_checksum(previous, chunk_digest):
+    """Empreinte chaînée : SHA-256(empreinte précédente + SHA-256 du fragment)"""
+    return hashlib.sha256(bytes.fromhex(previous) + chunk_digest).hexdigest()
+
+
+def parse_content_range(header):
+    """Interpréter « bytes début-fin/total » ; renvoie (début, longueur, total) ou None"""
+    match = CONTENT_RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    start, end, total = (int(value) for value in match.groups())
+    if end < start or end >= total:
+        return None
+    return start, end - start + 1, total
+
+
+def _parts_storage():
+    # Fragments dans le stockage par défaut : leur nom (session, rang) doit être conservé
+    return default_storage
+
+
+def direct_upload_url(session):
+    """URL signée pour déposer le fichier entier dans le stockage, ou None"""
+    storage = _parts_storage()
+    if not session.direct or session.document_id or not supports_presigned_urls(storage):
+        return None
+    return storage.presigned_url(session.part_name(0), method='PUT', max_size=session.total_size)
+
+
+def validate_new_upload(filename, total_size, direct=False):
+    """Contrôles à l'ouverture : extension autorisée, taille annoncée et dépôt direct possible"""
+    extension = os.path.splitext(filename)[1].lstrip('.').lower()
+    if extension not in ALLOWED_EXTENSIONS:
+        raise UploadError(f'Extension non autorisée : {extension or "aucune"}')
+    # Limite du type attendu pour cette extension (le contenu est vérifié au premier fragment)
+    limit = max(size_limit(mime_type) for mime_type in expected_types(filename) or [None])
+    if total_size <= 0 or total_size > limit:
+        raise UploadError(f'Taille invalide (maximum {limit} octets)')
+    if direct and not supports_presigned_urls(_parts_storage()):
+        raise UploadError('Le stockage ne permet pas le dépôt direct')
+
+
+def _check_chunk(session, start, total):
+    if session.document_id:
+        raise UploadError('Téléversement déjà finalisé', status=409)
+    if session.direct:
+        raise UploadError('Session à dépôt direct : envoyer le fichier à upload_url', status=409)
+    if session.expires_at < timezone.now():
+        raise UploadError('Session de téléversement expirée', status=410)
+    if total != session.total_size:
+        raise UploadError('Taille totale différente de celle annoncée')
+    if start != session.received_size:
+        raise UploadError(f'Position attendue : {session.received_size}', status=409)
+
+
+def write_chunk(session_id, stream, content_range, chunk_checksum=None):
+    """Écrire un fragment à la position annoncée ; renvoie la session à jour
+
+    Les fragments doivent arriver dans l'ordre : un fragment dont la position ne
+    correspond pas aux octets déjà reçus est refusé (409) et le client reprend
+    depuis `received_size`.
+    """
+    parsed = parse_content_range(content_range)
+    if parsed is None:
+        raise UploadError('En-tête Content-Range invalide (bytes début-fin/total)')
+    start, length, total = parsed
+    if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+        raise UploadError(f'Fragment trop volumineux (maximum {settings.UPLOAD_CHUNK_MAX_SIZE} octets)')
+
+    session = UploadSession.objects.get(id=session_id)
+    _check_chunk(session, start, total)
+
+    # Lecture du corps hors transaction, sous un nom propre à cet envoi : le verrou de la
+    # session n'est pris que pour vérifier la position et enregistrer le fragment
+    storage = _parts_storage()
+    reader = _HashingReader(stream, length)
+    name = storage.save(session.chunk_name(start), File(reader, name=session.filename))
+    try:
+        digest = reader.digest.digest()
+        if reader.size != length:
+            raise UploadError('Fragment incomplet')
+        if chunk_checksum and chunk_checksum.lower() != digest.hex():
+            raise UploadError('Empreinte du fragment invalide')
+        if start == 0:
+            # Signature du fichier contrôlée dès le premier fragment
+            inspector = FileInspector(session.filename)
+            inspector.update(reader.head)
+            message = content_error(session.filename, inspector)
+            if message:
+                raise UploadError(message)
+
+        with transaction.atomic():
+            # Un autre envoi du même fragment a pu être enregistré pendant la lecture
+            session = UploadSession.objects.select_for_update().get(id=session_id)
+            _check_chunk(session, start, total)
+            session.checksum = chain_checksum(session.checksum or '', digest)
+            session.received_size += length
+            session.part_names = session.stored_part_names() + [name]
+            session.parts = len(session.part_names)
+            session.save(update_fields=['checksum', 'received_size', 'part_names', 'parts'])
+    except BaseException:
+        storage.delete(name)
+        raise
+    return session
+
+
+def finalize(session_id, expected_checksum=None):
+    """Assembler les fragments dans le fichier définitif et créer le SupportingDocument
+
+    La copie et le calcul des empreintes se font hors transaction : le verrou de la session
+    n'est pris que pour contrôler qu'elle est complète, puis pour rattacher le document.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(id=session_id)
+        if session.document_id:
+            return session.document
+        if session.direct and not session.parts:
+            _receive_direct(session)
+        if not session.is_complete:
+            raise UploadError(f'Téléversement incomplet : {session.received_size}/{session.total_size} octets', status=409)
+        if expected_checksum and not session.direct and expected_checksum.lower() != session.checksum:
+            raise UploadError('Empreinte du fichier invalide')
+
+    session = UploadSession.objects.select_related('certification_request__company').get(id=session_id)
+    part_names = session.stored_part_names()
+    document = SupportingDocument(
+        certification_request=session.certification_request,
+        name=session.name or session.filename,
+        document_type=session.document_type,
+        description=session.description
+    )
+    # Copie en flux des fragments vers l'emplacement définitif, sans tout charger en mémoire
+    field = SupportingDocument._meta.get_field('file')
+    reader = _PartsReader(_parts_storage(), part_names)
+    content = File(reader, name=session.filename)
+    try:
+        document.file.name = field.storage.save(field.generate_filename(document, session.filename), content)
+    finally:
+        reader.close()
+    try:
+        record_metadata(document, 'file', 'file_', content)
+        if session.direct and expected_checksum and expected_checksum.lower() != document.file_sha256:
+            # Dépôt direct : empreinte SHA-256 du fichier entier, connue après la copie
+            raise UploadError('Empreinte du fichier invalide')
+
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().get(id=session_id)
+            if session.document_id:
+                # Finalisation concurrente déjà enregistrée : cette copie est abandonnée
+                discard([document.file.name])
+                return session.document
+            document.save()
+            session.document = document
+            session.save(update_fields=['document'])
+            transaction.on_commit(lambda: delete_parts(part_names))
+    except BaseException:
+        # Fichier déjà référencé par un document enregistré : conservé par discard
+        discard([document.file.name])
+        raise
+    return document
+
+
+def _receive_direct(session):
+    """Contrôler le fichier déposé par PUT signé (taille, signature) et l'enregistrer comme fragment unique"""
+    storage = _parts_storage()
+    name = session.part_name(0)
+    if not storage.exists(name):
+        raise UploadError('Fichier non encore déposé dans le stockage', status=409)
+    size = storage.size(name)
+    if size != session.total_size:
+        storage.delete(name)
+        raise UploadError(f'Taille reçue différente de celle annoncée : {size}/{session.total_size} octets')
+    with storage.open(name, 'rb') as file:
+        inspector = FileInspector(session.filename)
+        inspector.update(file.read(512))
+    message = content_error(session.filename, inspector)
+    if message:
+        storage.delete(name)
+        raise UploadError(message)
+    session.received_size = size
+    session.part_names = [name]
+    session.parts = 1
+    session.save(update_fields=['received_size', 'part_names', 'parts'])
+
+
+def delete_parts(part_names):
+    """Supprimer les fragments d'une session finalisée ou abandonnée"""
+    storage = _parts_storage()
+    for name in part_names:
+        storage.delete(name)
+    if part_names:
+        # Stockage local : retirer aussi le dossier de la session, devenu vide
+        try:
+            os.rmdir(storage.path(os.path.dirname(part_names[0])))
+        except (NotImplementedError, OSError):
+            pass
+
+
+def get_write_executor():
+    """Pool de threads pour les écritures dans le stockage, créé à la première utilisation"""
+    global _write_executor
+    if _write_executor is None:
+        with _write_executor_lock:
+            if _write_executor is None:
+                _write_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'UPLOAD_WRITE_WORKERS', 4),
+                    thread_name_prefix='upload-write'
+                )
+    return _write_executor
+
+
+def _store(document, upload):
+    # Le stockage réserve le fichier en base (StoredBlob) : connexion propre au thread, fermée ensuite
+    close_old_connections()
+    try:
+        document.file.save(upload.name, upload, save=False)
+        record_metadata(document, 'file', 'file_', upload)
+        return document.file.name
+    finally:
+        close_old_connections()
+
+
+def _document_values(document):
+    return document.file.name, document.name, document.document_type, document.description
+
+
+def _inserted_documents(certification_request, documents):
+    """Documents insérés par bulk_create, relus d'après leurs valeurs exactes, dans l'ordre d'insertion
+
+    Des lignes identiques en tout point sont interchangeables : pour chaque combinaison de
+    valeurs, les plus récentes sont retenues, autant que de documents insérés.
+    """
+    query = Q()
+    for file, name, document_type, description in {_document_values(document) for document in documents}:
+        query |= Q(file=file, name=name, document_type=document_type, description=description)
+    counts = Counter(_document_values(document) for document in documents)
+    rows = {}
+    for row in SupportingDocument.objects.filter(query, certification_request=certification_request).order_by('-id'):
+        values = _document_values(row)
+        if len(rows.setdefault(values, [])) < counts[values]:
+            rows[values].append(row)
+    for inserted in rows.values():
+        inserted.reverse()
+    return [rows[_document_values(document)].pop(0) for document in documents]
+
+
+def create_documents(certification_request, entries):
+    """Créer plusieurs documents justificatifs en une fois
+
+    `entries` est une liste de (fichier, nom, type, description). Tous les fichiers
+    sont validés avant toute écriture ; ils sont ensuite écrits en parallèle dans le
+    stockage, puis les lignes sont insérées par un seul bulk_create dans une
+    transaction. En cas d'échec, les fichiers déjà écrits sont supprimés : il ne
+    reste jamais de téléversement à moitié enregistré.
+
+    Renvoie (documents, erreurs) ; aucun document n'est créé s'il y a des erreurs.
+    """
+    field = SupportingDocument._meta.get_field('file')
+    documents = []
+    errors = []
+    for upload, name, document_type, description in entries:
+        document = SupportingDocument(
+            certification_request=certification_request,
+            name=name or upload.name,
+            document_type=document_type,
+            description=description
+        )
+        try:
+            field.run_validators(upload)
+            document.clean_fields(exclude=['certification_request', 'file'])
+        except ValidationError as e:
+            errors.append(f'Erreur pour le fichier {upload.name}: {" ".join(e.messages)}')
+        documents.append(document)
+    if errors:
+        return [], errors
+
+    futures = [get_write_executor().submit(_store, document, upload) for document, (upload, *_) in zip(documents, entries)]
+    written = []
+    failure = None
+    for future in futures:
+        try:
+            written.append(future.result())
+        except Exception as e:
+            failure = failure or e
+    try:
+        if failure is not None:
+            raise failure
+        with transaction.atomic():
+            SupportingDocument.objects.bulk_create(documents)
+            # bulk_create n'envoie pas post_save : références comptées ici
+            acquire(written)
+            if not connection.features.can_return_rows_from_bulk_insert:
+                # MySQL ne renvoie pas les clés générées : lignes relues dans la transaction
+                documents = _inserted_documents(certification_request, documents)
+    except Exception:
+        discard(written)
+        raise
+
+    for document in documents:
+        enqueue_preview(document.id)
+    return documents, []
@@ -48,6 +48,7 @@ router.register(r'daily-info', views.DailyInfoViewSet, basename='daily-info')
 router.register(r'history', views.RequestHistoryViewSet, basename='request-history')
 router.register(r'rejection-reports', views.RejectionReportViewSet, basename='rejection-report')
 router.register(r'supporting-documents', views.SupportingDocumentViewSet, basename='supporting-document')
+router.register(r'upload-sessions', views.UploadSessionViewSet, basename='upload-session')
 
 # Nouvelles routes pour les employés
 router.register(r'employee/requests', views.CertificationRequestEmployeeViewSet, basename='employee-requests')
@@ -65,10 +66,14 @@ router.register(r'authority/compliance', views.ComplianceAuthorityViewSet, basen
 router.register(r'authority/notifications', views.AuthorityNotificationViewSet, basename='authority-notifications')
 
 urlpatterns = [
+    # Vérification publique, route la plus sollicitée : résolue avant les routes du routeur
+    path('certificates/shared/<str:token>/', views.shared_certificate, name='certificate-shared'),
     path('', include(router.urls)),
     path('test-employee/', test_employee_api, name='test-employee'),
-    # Custom URL for shared certificates
-    path('certificates/shared/<str:token>/', 
-         views.CertificateViewSet.as_view({'get': 'shared'}), 
-         name='certificate-shared'),
+    # URL signées du stockage local (téléchargements et dépôts directs)
+    path('storage/<str:token>/', views.SignedStorageView.as_view(), name='signed-storage'),
+    # Notifications en temps réel (Server-Sent Events)
+    path('notifications/stream/', views.NotificationStreamView.as_view(), name='notification-stream'),
+    path('notifications/stream/ticket/', views.NotificationStreamTicketView.as_view(),
+         name='notification-stream-ticket'),
 ] 
\ No newline at end of file
@@ -0,0 +1,162 @@
+"""Vérification publique des certificats par jeton signé
+
+Les données publiques sont mises en cache côté serveur et retirées du cache à chaque
+modification (invalidate). Le retrait n'atteint tous les processus que si le cache est
+partagé (CACHES, variable CACHE_URL) : avec le cache mémoire propre à chaque processus,
+la durée de cache est réduite à quelques secondes. Les caches publics (navigateurs,
+CDN) ne sont jamais invalidés : leur durée reste courte dans tous les cas.
+
+Sous WSGI, la route publique est servie par VerificationFastPath, placée devant
+l'application Django (backend/wsgi.py) : ni middlewares ni résolution d'URL, et les
+réponses sont gardées en mémoire du processus pendant PUBLIC_CACHE_SECONDS, la même
+durée que dans les caches publics.
+"""
+import json
+import time
+from django.core import signing
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import close_old_connections
+from django.urls import reverse
+from django.utils import timezone
+
+VERIFICATION_SALT = 'certifications.verification'
+CACHE_PREFIX = 'certificate-verification:'
+# Durée de mise en cache côté serveur (secondes) : cache partagé, puis cache propre au processus
+VERIFICATION_CACHE_SECONDS = 300
+LOCAL_CACHE_SECONDS = 5
+# Durée de mise en cache par les navigateurs et les CDN (Cache-Control), jamais invalidés
+PUBLIC_CACHE_SECONDS = 5
+# Réponses gardées par processus au plus (jetons à signature valide uniquement)
+RESPONSE_CACHE_SIZE = 10000
+
+PUBLIC_HEADERS = [
+    ('Cache-Control', f'public, max-age={PUBLIC_CACHE_SECONDS}'),
+    ('Access-Control-Allow-Origin', '*'),
+    ('X-Content-Type-Options', 'nosniff'),
+]
+
+# Réponses rendues par jeton public : {jeton: (expiration, statut, corps)}
+_responses = {}
+
+_signer = signing.Signer(salt=VERIFICATION_SALT)
+
+
+def sign_token(verification_token):
+    """Jeton public : jeton aléatoire du certificat suivi de sa signature"""
+    return _signer.sign(verification_token)
+
+
+def unsign_token(token):
+    """Vérifier la signature d'un jeton public ; None si elle est invalide"""
+    try:
+        return _signer.unsign(token)
+    except signing.BadSignature:
+        return None
+
+
+def cache_timeout():
+    """Durée de cache serveur : longue seulement si l'invalidation atteint tous les processus"""
+    return LOCAL_CACHE_SECONDS if isinstance(caches['default'], LocMemCache) else VERIFICATION_CACHE_SECONDS
+
+
+def verification_payload(verification_token):
+    """Données publiques d'un certificat (mises en cache) ; None s'il n'existe pas"""
+    from .models import Certificate
+
+    cache_key = CACHE_PREFIX + verification_token
+    payload = cache.get(cache_key)
+    if payload is not None:
+        return payload or None
+
+    row = Certificate.objects.filter(verification_token=verification_token).values_list(
+        'number', 'treatment_type', 'issue_date', 'expiry_date', 'is_active',
+        'certification_request__company__business_name',
+        'certification_request__company__ice_number',
+    ).first()
+    if row is None:
+        # Un jeton inconnu est aussi mis en cache pour ne pas solliciter la base
+        cache.set(cache_key, {}, cache_timeout())
+        return None
+
+    number, treatment_type, issue_date, expiry_date, is_active, business_name, ice_number = row
+    payload = {
+        'number': number,
+        'company': business_name,
+        'ice_number': ice_number,
+        'treatment_type': treatment_type,
+        'issue_date': issue_date.isoformat(),
+        'expiry_date': expiry_date.isoformat(),
+        'revoked': not is_active,
+    }
+    cache.set(cache_key, payload, cache_timeout())
+    return payload
+
+
+def with_validity(payload):
+    """Ajouter la validité calculée à la date du jour (non mise en cache)"""
+    today = timezone.localdate().isoformat()
+    return dict(payload, valid=not payload['revoked'] and payload['expiry_date'] >= today)
+
+
+def verification_response(verification_token):
+    """(statut HTTP, corps JSON) de la vérification publique ; None pour un jeton à signature invalide"""
+    payload = verification_payload(verification_token) if verification_token else None
+    if payload is None:
+        return 404, json.dumps({'detail': 'Certificat introuvable'}).encode()
+    return 200, json.dumps(with_validity(payload)).encode()
+
+
+class VerificationFastPath:
+    """Application WSGI servant la vérification publique avant l'application Django
+
+    Les autres requêtes sont transmises telles quelles à l'application Django.
+    """
+    STATUS_LINES = {200: '200 OK', 404: '404 Not Found'}
+
+    def __init__(self, application):
+        self.application = application
+        self._prefix = None
+
+    def prefix(self):
+        if self._prefix is None:
+            self._prefix = reverse('certificate-shared', kwargs={'token': '-'})[:-2]
+        return self._prefix
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        prefix = self.prefix()
+        token = path[len(prefix):-1]
+        if (not path.startswith(prefix) or not path.endswith('/') or not token or '/' in token
+                or environ.get('REQUEST_METHOD') not in ('GET', 'HEAD')):
+            return self.application(environ, start_response)
+
+        now = time.monotonic()
+        cached = _responses.get(token)
+        if cached is None or cached[0] < now:
+            # Signature vérifiée avant toute requête : les jetons forgés ne touchent pas la base
+            verification_token = unsign_token(token)
+            try:
+                status, body = verification_response(verification_token)
+            finally:
+                # Comme en fin de requête Django : connexion fermée si elle a servi (cache manqué)
+                close_old_connections()
+            cached = (now + PUBLIC_CACHE_SECONDS, status, body)
+            if verification_token is not None:
+                if len(_responses) >= RESPONSE_CACHE_SIZE:
+                    _responses.clear()
+                _responses[token] = cached
+        _, status, body = cached
+        start_response(self.STATUS_LINES[status], [
+            ('Content-Type', 'application/json'), ('Content-Length', str(len(body)))
+        ] + PUBLIC_HEADERS)
+        return [b''] if environ['REQUEST_METHOD'] == 'HEAD' else [body]
+
+
+def invalidate(verification_tokens):
+    """Retirer du cache les données publiques des certificats modifiés"""
+    tokens = [token for token in verification_tokens if token]
+    cache.delete_many([CACHE_PREFIX + token for token in tokens])
+    # Réponses de ce processus ; les autres expirent après PUBLIC_CACHE_SECONDS
+    for token in tokens:
+        _responses.pop(sign_token(token), None)
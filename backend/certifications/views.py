@@ -1,14 +1,15 @@
 from django.shortcuts import render, get_object_or_404
-from rest_framework import viewsets, permissions, status, serializers
+from rest_framework import viewsets, mixins, permissions, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import CertificationRequest, Certificate, RejectionReport, DailyInfo, Payment, RequestHistory, DynamicForm, LawChecklist, FormSubmission, DocumentArchive, SupportingDocument, AuthorityNotification
+from rest_framework.views import APIView
+from .models import CertificationRequest, Certificate, RejectionReport, DailyInfo, Payment, RequestHistory, DynamicForm, LawChecklist, FormSubmission, DocumentArchive, SupportingDocument, AuthorityNotification, UploadSession
 from .serializers import (
     CertificationRequestSerializer, CertificationRequestEmployeeSerializer,
     CertificateSerializer, CertificateEmployeeSerializer, PaymentSerializer,
     RejectionReportSerializer, DailyInfoSerializer, RequestHistorySerializer,
     DynamicFormSerializer, LawChecklistSerializer, FormSubmissionSerializer,
-    DocumentArchiveSerializer, EmployeeSerializer, SupportingDocumentSerializer,
+    DocumentArchiveSerializer, EmployeeSerializer, SupportingDocumentSerializer, UploadSessionSerializer,
     # Serializers pour l'autorité
     CertificateAuthoritySerializer, CertificationRequestAuthoritySerializer,
     AuditReportSerializer, CompanyAuditSerializer, AuthorityNotificationSerializer
@@ -20,6 +21,7 @@ from django.utils import timezone
 from datetime import timedelta
 import uuid
 from django.http import HttpResponse, Http404, FileResponse
+from django.views.decorators.http import require_safe
 
 # Create your views here.
 
@@ -398,11 +400,11 @@ class CertificationRequestEmployeeViewSet(viewsets.ModelViewSet):
         # Si il y a un document PDF joint, le télécharger
         if certification_request.supporting_documents:
             try:
-                response = FileResponse(
-                    certification_request.supporting_documents.open(),
+                from .file_serving import serve_file
+                response = serve_file(
+                    request, certification_request.supporting_documents,
                     content_type='application/octet-stream'
                 )
-                response['Content-Disposition'] = f'attachment; filename="{certification_request.supporting_documents.name}"'
                 response['Access-Control-Expose-Headers'] = 'Content-Disposition'
                 return response
             except Exception as e:
@@ -442,6 +444,30 @@ class CertificationRequestEmployeeViewSet(viewsets.ModelViewSet):
         
         return Response({'error': 'Aucun document ou donnée disponible pour le téléchargement'}, status=status.HTTP_404_NOT_FOUND)
 
+    @action(detail=False, methods=['get'])
+    def bundle(self, request):
+        """Télécharger en ZIP tous les documents d'une ou plusieurs demandes (?ids=1,2,3)"""
+        from .bundles import iter_request_bundle
+        from .streaming import zip_response
+
+        try:
+            ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()]
+        except ValueError:
+            return Response({'error': 'Identifiants de demandes invalides'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if not ids:
+            return Response({'error': 'Au moins une demande doit être sélectionnée'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        certification_requests = self.get_queryset().filter(id__in=ids).select_related(
+            'certificate'
+        ).prefetch_related('additional_documents').order_by('id')
+        if not certification_requests.exists():
+            return Response({'error': 'Aucune demande trouvée'}, status=status.HTTP_404_NOT_FOUND)
+
+        filename = f'demande_{ids[0]}_documents.zip' if len(ids) == 1 else f'demandes_documents_{timezone.now().strftime("%Y%m%d_%H%M%S")}.zip'
+        return zip_response(iter_request_bundle(certification_requests), filename)
+
 class DynamicFormViewSet(viewsets.ModelViewSet):
     """ViewSet pour la gestion des formulaires dynamiques"""
     queryset = DynamicForm.objects.all()
@@ -497,11 +523,12 @@ class DocumentArchiveViewSet(viewsets.ModelViewSet):
         archived_count = 0
         
         # Archiver les documents de support
+        # Les archives référencent les fichiers existants (stockage par contenu) : aucune copie
         if certification_request.supporting_documents:
             DocumentArchive.objects.create(
                 certification_request=certification_request,
                 document_type='supporting_document',
-                file_path=certification_request.supporting_documents,
+                file_path=certification_request.supporting_documents.name,
                 original_filename=certification_request.supporting_documents.name,
                 archived_by=request.user
             )
@@ -512,7 +539,7 @@ class DocumentArchiveViewSet(viewsets.ModelViewSet):
             DocumentArchive.objects.create(
                 certification_request=certification_request,
                 document_type='certificate',
-                file_path=certification_request.certificate.pdf_file,
+                file_path=certification_request.certificate.pdf_file.name,
                 original_filename=certification_request.certificate.pdf_file.name,
                 archived_by=request.user
             )
@@ -545,6 +572,15 @@ class CertificationRequestViewSet(viewsets.ModelViewSet):
         
         return CertificationRequest.objects.none()
 
+    def create(self, request, *args, **kwargs):
+        from .upload_handlers import upload_errors
+        
+        # Document refusé pendant la réception : la demande n'est pas créée sans lui
+        rejected = upload_errors(request)
+        if rejected:
+            return Response({'supporting_documents': rejected}, status=status.HTTP_400_BAD_REQUEST)
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         user = self.request.user
         
@@ -703,6 +739,36 @@ class CertificationRequestViewSet(viewsets.ModelViewSet):
             logger.error(f"User: {request.user.id}, has company_profile: {hasattr(request.user, 'company_profile')}")
             return Response({'error': 'Erreur lors de la récupération des statistiques'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=True, methods=['get'])
+    def download_rejection_report(self, request, pk=None):
+        """Télécharger le dernier rapport de refus de la demande en PDF"""
+        certification_request = self.get_object()
+        report = certification_request.rejection_reports.select_related(
+            'certification_request__company', 'rejected_by__user'
+        ).order_by('-date', '-id').first()
+        if report is None:
+            return Response({'error': 'Aucun rapport de refus pour cette demande'}, 
+                          status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            from .file_serving import serve_file, StoredFile
+            
+            response = serve_file(
+                request, StoredFile(report.generate()),
+                filename=f'rapport_refus_{certification_request.id}.pdf',
+                content_type='application/pdf'
+            )
+            response['Access-Control-Expose-Headers'] = 'Content-Disposition'
+            
+            return response
+            
+        except Exception as e:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error(f"Erreur lors du téléchargement du rapport de refus: {str(e)}")
+            return Response({'error': 'Erreur lors du téléchargement'}, 
+                          status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class SupportingDocumentViewSet(viewsets.ModelViewSet):
     """ViewSet pour la gestion des documents justificatifs multiples"""
     serializer_class = SupportingDocumentSerializer
@@ -724,6 +790,14 @@ class SupportingDocumentViewSet(viewsets.ModelViewSet):
         else:
             return SupportingDocument.objects.none()
     
+    def create(self, request, *args, **kwargs):
+        from .upload_handlers import upload_errors
+        
+        rejected = upload_errors(request)
+        if rejected:
+            return Response({'file': rejected}, status=status.HTTP_400_BAD_REQUEST)
+        return super().create(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         """Créer un nouveau document justificatif"""
         certification_request_id = self.request.data.get('certification_request')
@@ -764,7 +838,49 @@ class SupportingDocumentViewSet(viewsets.ModelViewSet):
         documents = self.get_queryset().filter(certification_request=certification_request)
         serializer = self.get_serializer(documents, many=True)
         return Response(serializer.data)
-    
+
+    @action(detail=True, methods=['get'])
+    def preview(self, request, pk=None):
+        """Aperçu JPEG du document (vignette ou première page), mis en cache par le navigateur"""
+        from django.conf import settings
+        from .file_serving import serve_file, StoredFile
+        from .previews import PREVIEW_CONTENT_TYPE
+
+        document = self.get_object()
+        if not document.preview:
+            return Response({'error': 'Aperçu non disponible'}, status=status.HTTP_404_NOT_FOUND)
+
+        # Le nom de l'aperçu dépend du fichier : il sert d'ETag et l'URL versionnée peut être figée
+        etag = f'"{document.preview.name.rsplit("/", 1)[-1]}"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponse(status=304)
+        else:
+            response = serve_file(
+                request, StoredFile(document.preview.name), as_attachment=False,
+                content_type=PREVIEW_CONTENT_TYPE
+            )
+            if response.status_code == status.HTTP_302_FOUND:
+                # Redirection vers une URL signée expirante : jamais mise en cache
+                return response
+        response['ETag'] = etag
+        response['Cache-Control'] = f'private, max-age={settings.DOCUMENT_PREVIEW_CACHE_SECONDS}, immutable'
+        return response
+
+    @action(detail=True, methods=['get'])
+    def download_url(self, request, pk=None):
+        """URL signée de courte durée pour télécharger le document directement depuis le stockage"""
+        from .file_serving import presigned_url
+        from .object_storage import url_expiry
+
+        document = self.get_object()
+        if not document.file:
+            return Response({'error': 'Fichier non trouvé'}, status=status.HTTP_404_NOT_FOUND)
+        url = presigned_url(request, document.file)
+        if url is None:
+            return Response({'error': 'Le stockage ne fournit pas d\'URL signée'},
+                          status=status.HTTP_501_NOT_IMPLEMENTED)
+        return Response({'url': url, 'expires_in': url_expiry()})
+
     @action(detail=False, methods=['post'])
     def upload_multiple(self, request):
         """Télécharger plusieurs documents à la fois"""
@@ -784,38 +900,186 @@ class SupportingDocumentViewSet(viewsets.ModelViewSet):
                 return Response({'error': 'Accès refusé'}, status=status.HTTP_403_FORBIDDEN)
         
         files = request.FILES.getlist('files')
+        from .upload_handlers import upload_errors
+        from .uploads import create_documents
+        
+        # Fichiers refusés pendant la réception (contenu, taille) : aucun document n'est créé
+        rejected = upload_errors(request)
+        if rejected:
+            return Response({
+                'created_documents': [],
+                'errors': rejected,
+                'total_created': 0,
+                'total_errors': len(rejected)
+            }, status=status.HTTP_400_BAD_REQUEST)
         if not files:
             return Response({'error': 'Aucun fichier fourni'}, status=status.HTTP_400_BAD_REQUEST)
         
-        created_documents = []
-        errors = []
+        entries = [
+            (
+                file,
+                request.data.get(f'name_{i}', ''),
+                request.data.get(f'document_type_{i}', 'other'),
+                request.data.get(f'description_{i}', '')
+            )
+            for i, file in enumerate(files)
+        ]
         
-        for i, file in enumerate(files):
-            try:
-                document_type = request.data.get(f'document_type_{i}', 'other')
-                name = request.data.get(f'name_{i}', '')
-                description = request.data.get(f'description_{i}', '')
-                
-                supporting_doc = SupportingDocument.objects.create(
-                    certification_request=certification_request,
-                    name=name or file.name,
-                    document_type=document_type,
-                    file=file,
-                    description=description
-                )
-                
-                serializer = self.get_serializer(supporting_doc)
-                created_documents.append(serializer.data)
-                
-            except Exception as e:
-                errors.append(f'Erreur pour le fichier {file.name}: {str(e)}')
+        try:
+            # Écritures parallèles dans le stockage puis une seule insertion, tout ou rien
+            documents, errors = create_documents(certification_request, entries)
+        except Exception as e:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error(f"Erreur dans upload_multiple: {str(e)}")
+            return Response({'error': 'Erreur lors de l\'enregistrement des documents'}, 
+                          status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        created_documents = self.get_serializer(documents, many=True).data
         
         return Response({
             'created_documents': created_documents,
             'errors': errors,
             'total_created': len(created_documents),
             'total_errors': len(errors)
-        })
+        }, status=status.HTTP_400_BAD_REQUEST if errors else status.HTTP_200_OK)
+
+class UploadSessionViewSet(mixins.CreateModelMixin,
+                          mixins.RetrieveModelMixin,
+                          mixins.DestroyModelMixin,
+                          viewsets.GenericViewSet):
+    """Téléversements fractionnés et reprenables : ouverture → fragments → finalisation"""
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        # Chaque utilisateur ne voit que ses propres sessions
+        return UploadSession.objects.filter(created_by=self.request.user).select_related('document')
+    
+    def perform_create(self, serializer):
+        """Ouvrir une session après contrôle de la demande, de l'extension et de la taille"""
+        from .uploads import validate_new_upload, UploadError
+        
+        certification_request = serializer.validated_data['certification_request']
+        user = self.request.user
+        if hasattr(user, 'company_profile'):
+            if certification_request.company != user.company_profile:
+                raise serializers.ValidationError("Vous ne pouvez ajouter des documents qu'à vos propres demandes")
+        
+        try:
+            validate_new_upload(
+                serializer.validated_data['filename'],
+                serializer.validated_data['total_size'],
+                serializer.validated_data.get('direct', False)
+            )
+        except UploadError as e:
+            raise serializers.ValidationError(e.message)
+        
+        serializer.save(created_by=user)
+    
+    def perform_destroy(self, instance):
+        """Abandonner la session et supprimer les fragments déjà reçus"""
+        from .uploads import delete_parts
+        
+        part_names = instance.stored_part_names()
+        instance.delete()
+        if not instance.document_id:
+            delete_parts(part_names)
+    
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, pk=None):
+        """Recevoir un fragment (corps brut, position dans Content-Range)"""
+        from .uploads import write_chunk, UploadError
+        
+        session = self.get_object()
+        try:
+            session = write_chunk(
+                session.id,
+                request._request,
+                request.META.get('HTTP_CONTENT_RANGE'),
+                request.META.get('HTTP_X_CHUNK_SHA256')
+            )
+        except UploadError as e:
+            current = UploadSession.objects.filter(id=session.id).values_list('received_size', flat=True).first()
+            return Response({'error': e.message, 'received_size': current}, status=e.status)
+        except Exception as e:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error(f"Erreur lors de l'écriture d'un fragment: {str(e)}")
+            return Response({'error': 'Erreur lors de l\'écriture du fragment'}, 
+                          status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        return Response(self.get_serializer(session).data)
+    
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        """Assembler les fragments et créer le document justificatif"""
+        from .uploads import finalize, UploadError
+        
+        session = self.get_object()
+        try:
+            finalize(session.id, request.data.get('checksum'))
+        except UploadError as e:
+            return Response({'error': e.message}, status=e.status)
+        except Exception as e:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error(f"Erreur lors de la finalisation du téléversement: {str(e)}")
+            return Response({'error': 'Erreur lors de la finalisation'}, 
+                          status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        session.refresh_from_db()
+        return Response(self.get_serializer(session).data, status=status.HTTP_201_CREATED)
+
+class SignedStorageView(APIView):
+    """Accès au stockage local par URL signée (équivalent local des URL présignées S3)
+
+    L'URL porte l'autorisation : ni jeton ni session ne sont demandés. Les droits ont été
+    vérifiés par la vue qui a émis l'URL.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    
+    def get(self, request, token):
+        from .file_serving import serve_file, StoredFile
+        from .object_storage import read_signed_url, SignedURLError
+        
+        try:
+            storage, grant = read_signed_url(token, request.method)
+        except SignedURLError as e:
+            return Response({'error': str(e)}, status=status.HTTP_403_FORBIDDEN)
+        if not storage.exists(grant['n']):
+            return Response({'error': 'Fichier non trouvé'}, status=status.HTTP_404_NOT_FOUND)
+        response = serve_file(
+            request, StoredFile(grant['n'], storage),
+            filename=grant['f'], as_attachment=grant['a'], content_type=grant['t']
+        )
+        response['Access-Control-Allow-Origin'] = '*'
+        response['Access-Control-Expose-Headers'] = 'Content-Disposition'
+        return response
+    
+    def put(self, request, token):
+        from django.core.files import File
+        from .object_storage import read_signed_url, SignedURLError
+        
+        try:
+            storage, grant = read_signed_url(token, request.method)
+        except SignedURLError as e:
+            return Response({'error': str(e)}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or '')
+        except ValueError:
+            return Response({'error': 'En-tête Content-Length requis'}, status=status.HTTP_411_LENGTH_REQUIRED)
+        if grant['x'] is not None and length > grant['x']:
+            return Response({'error': f'Fichier trop volumineux (maximum {grant["x"]} octets)'}, 
+                          status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        
+        # PUT : le dépôt remplace l'objet existant, comme sur S3 ; corps lu en flux
+        storage.delete(grant['n'])
+        storage.save(grant['n'], File(request._request, name=grant['n']))
+        response = Response(status=status.HTTP_200_OK)
+        response['Access-Control-Allow-Origin'] = '*'
+        return response
 
 class CertificateViewSet(viewsets.ModelViewSet):
     serializer_class = CertificateSerializer
@@ -823,12 +1087,13 @@ class CertificateViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
+        queryset = Certificate.objects.select_related('certification_request__company')
         if user.role == 'enterprise':
-            return Certificate.objects.filter(
+            return queryset.filter(
                 certification_request__company=user.company_profile
             ).order_by('-issue_date')
         elif user.role == 'employee':
-            return Certificate.objects.all().order_by('-issue_date')
+            return queryset.order_by('-issue_date')
         return Certificate.objects.none()
         
     @action(detail=False, methods=['get'])
@@ -861,13 +1126,15 @@ class CertificateViewSet(viewsets.ModelViewSet):
                         # Générer un numéro de certificat unique
                         certificate_number = f"DEEE-{timezone.now().year}-{str(uuid.uuid4())[:8].upper()}"
                         
-                        # Créer le certificat sans générer de PDF
+                        # Créer le certificat ; le PDF est rendu en arrière-plan
                         certificate = Certificate.objects.create(
                             number=certificate_number,
                             treatment_type=certification_request.treatment_type,
                             certification_request=certification_request,
                             expiry_date=timezone.now().date() + timezone.timedelta(days=365)
                         )
+                        from .tasks import enqueue_certificate_render
+                        enqueue_certificate_render(certificate.id)
                         
                         serializer = self.get_serializer(certificate)
                         return Response(serializer.data)
@@ -901,25 +1168,27 @@ class CertificateViewSet(viewsets.ModelViewSet):
                     return Response({'error': 'Accès non autorisé'}, 
                                   status=status.HTTP_403_FORBIDDEN)
             
-            # Générer le PDF si nécessaire
-            if not certificate.pdf_file:
-                certificate.generate()
+            # Générer le PDF si nécessaire (cache invalidé si les données imprimées changent)
+            certificate.generate()
             
             from django.http import HttpResponse
-            import os
-            
-            # Si le fichier existe sur le disque, l'utiliser
-            if certificate.pdf_file and os.path.exists(certificate.pdf_file.path):
-                with open(certificate.pdf_file.path, 'rb') as pdf_file:
-                    response = HttpResponse(pdf_file.read(), content_type='application/pdf')
+            from .file_serving import serve_file
+            
+            # Si le fichier existe dans le stockage, l'envoyer sans le charger en mémoire
+            if certificate.pdf_file and certificate.pdf_file.storage.exists(certificate.pdf_file.name):
+                response = serve_file(
+                    request, certificate.pdf_file,
+                    filename=f'certificat_{certificate.number}.pdf',
+                    content_type='application/pdf'
+                )
             else:
                 # Sinon, générer le PDF à la volée
                 from .certificate_generator import CertificateGenerator
                 generator = CertificateGenerator()
                 pdf_buffer = generator.generate_certificate_pdf(certificate)
                 response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
+                response['Content-Disposition'] = f'attachment; filename="certificat_{certificate.number}.pdf"'
             
-            response['Content-Disposition'] = f'attachment; filename="certificat_{certificate.number}.pdf"'
             response['Access-Control-Expose-Headers'] = 'Content-Disposition'
             response['Access-Control-Allow-Origin'] = '*'
             response['Access-Control-Allow-Headers'] = 'Content-Type'
@@ -945,25 +1214,28 @@ class CertificateViewSet(viewsets.ModelViewSet):
                     return Response({'error': 'Accès non autorisé'}, 
                                   status=status.HTTP_403_FORBIDDEN)
             
-            # Générer le PDF si nécessaire
-            if not certificate.pdf_file:
-                certificate.generate()
+            # Générer le PDF si nécessaire (cache invalidé si les données imprimées changent)
+            certificate.generate()
             
             from django.http import HttpResponse
-            import os
-            
-            # Si le fichier existe sur le disque, l'utiliser
-            if certificate.pdf_file and os.path.exists(certificate.pdf_file.path):
-                with open(certificate.pdf_file.path, 'rb') as pdf_file:
-                    response = HttpResponse(pdf_file.read(), content_type='application/pdf')
+            from .file_serving import serve_file
+            
+            # Si le fichier existe dans le stockage, l'envoyer sans le charger en mémoire
+            if certificate.pdf_file and certificate.pdf_file.storage.exists(certificate.pdf_file.name):
+                response = serve_file(
+                    request, certificate.pdf_file,
+                    filename=f'certificat_{certificate.number}.pdf',
+                    as_attachment=False,
+                    content_type='application/pdf'
+                )
             else:
                 # Sinon, générer le PDF à la volée
                 from .certificate_generator import CertificateGenerator
                 generator = CertificateGenerator()
                 pdf_buffer = generator.generate_certificate_pdf(certificate)
                 response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
+                response['Content-Disposition'] = f'inline; filename="certificat_{certificate.number}.pdf"'
             
-            response['Content-Disposition'] = f'inline; filename="certificat_{certificate.number}.pdf"'
             response['Access-Control-Allow-Origin'] = '*'
             response['Access-Control-Allow-Headers'] = 'Content-Type'
             
@@ -976,6 +1248,57 @@ class CertificateViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Erreur lors de l\'affichage'}, 
                           status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=True, methods=['get'])
+    def download_url(self, request, pk=None):
+        """URL signée de courte durée pour télécharger le PDF directement depuis le stockage"""
+        certificate = self.get_object()
+        
+        # Vérification des permissions d'accès
+        if request.user.role == 'enterprise':
+            if certificate.certification_request.company != request.user.company_profile:
+                return Response({'error': 'Accès non autorisé'}, 
+                              status=status.HTTP_403_FORBIDDEN)
+        
+        try:
+            from .file_serving import presigned_url
+            from .object_storage import url_expiry
+            
+            pdf_file = certificate.generate()
+            url = presigned_url(
+                request, pdf_file,
+                filename=f'certificat_{certificate.number}.pdf',
+                as_attachment=request.query_params.get('inline') != '1',
+                content_type='application/pdf'
+            )
+            if url is None:
+                return Response({'error': 'Le stockage ne fournit pas d\'URL signée'}, 
+                              status=status.HTTP_501_NOT_IMPLEMENTED)
+            return Response({'url': url, 'expires_in': url_expiry()})
+            
+        except Exception as e:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error(f"Erreur lors de la création du lien de téléchargement: {str(e)}")
+            return Response({'error': 'Erreur lors du téléchargement'}, 
+                          status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@require_safe
+def shared_certificate(request, token):
+    """Vérification publique d'un certificat à partir de son jeton signé
+
+    Vue Django sans DRF (négociation, authentification, rendu) : c'est la route publique
+    la plus sollicitée, appelée par chaque lecture de QR code. Sous WSGI, elle est servie
+    avant Django par verification.VerificationFastPath ; cette vue sert les autres serveurs.
+    """
+    from .verification import unsign_token, verification_response, PUBLIC_HEADERS
+
+    # Signature vérifiée avant toute requête : les jetons forgés ne touchent pas la base
+    status_code, body = verification_response(unsign_token(token))
+    response = HttpResponse(body, status=status_code, content_type='application/json')
+    for header, value in PUBLIC_HEADERS:
+        response[header] = value
+    return response
+
 class PaymentViewSet(viewsets.ModelViewSet):
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -1110,17 +1433,27 @@ class PaymentViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Le paiement n\'a pas été complété'}, 
                           status=status.HTTP_400_BAD_REQUEST)
         
-        # Générer le reçu (ici simplement retourner les données)
-        receipt_data = {
-            'payment_id': payment.id,
-            'transaction_id': payment.transaction_id,
-            'amount': payment.total_amount,
-            'date': payment.payment_date,
-            'company': payment.certification_request.company.business_name,
-            'treatment_type': payment.certification_request.treatment_type,
-        }
-        
-        return Response(receipt_data)
+        try:
+            from .documents import get_document, payment_receipt_data
+            from .file_serving import serve_file, StoredFile
+            
+            # Reçu rendu une fois puis servi depuis le cache
+            path = get_document('payment_receipt', payment_receipt_data(payment))
+            response = serve_file(
+                request, StoredFile(path),
+                filename=f'recu_paiement_{payment.id}.pdf',
+                content_type='application/pdf'
+            )
+            response['Access-Control-Expose-Headers'] = 'Content-Disposition'
+            
+            return response
+            
+        except Exception as e:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error(f"Erreur lors de la génération du reçu: {str(e)}")
+            return Response({'error': 'Erreur lors de la génération du reçu'}, 
+                          status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     @action(detail=False, methods=['get'])
     def enterprise_stats(self, request):
@@ -1256,6 +1589,30 @@ class RejectionReportViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(rejected_by=self.request.user.employee_profile)
 
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Télécharger le rapport de refus en PDF"""
+        report = self.get_object()
+        
+        try:
+            from .file_serving import serve_file, StoredFile
+            
+            response = serve_file(
+                request, StoredFile(report.generate()),
+                filename=f'rapport_refus_{report.certification_request_id}.pdf',
+                content_type='application/pdf'
+            )
+            response['Access-Control-Expose-Headers'] = 'Content-Disposition'
+            
+            return response
+            
+        except Exception as e:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error(f"Erreur lors du téléchargement du rapport de refus: {str(e)}")
+            return Response({'error': 'Erreur lors du téléchargement'}, 
+                          status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 # Permissions pour les autorités
 class AuthorityPermission(permissions.BasePermission):
     """Permission pour les autorités - accès en lecture seule avec quelques exceptions"""
@@ -1354,16 +1711,16 @@ class CertificateAuthorityViewSet(viewsets.ReadOnlyModelViewSet):
     def export_audit(self, request):
         """Exporter les données d'audit des certificats"""
         try:
-            from django.http import HttpResponse
-            import csv
-            from io import StringIO
+            from django.db.models import Case, When, Value, CharField
+            from django.db.models.functions import Concat, Trim
+            from .streaming import export_response, iter_csv
             
             # Paramètres de filtrage
             start_date = request.query_params.get('start_date')
             end_date = request.query_params.get('end_date')
             treatment_type = request.query_params.get('treatment_type')
             
-            queryset = self.get_queryset()
+            queryset = Certificate.objects.all()
             
             if start_date:
                 queryset = queryset.filter(issue_date__gte=start_date)
@@ -1372,36 +1729,65 @@ class CertificateAuthorityViewSet(viewsets.ReadOnlyModelViewSet):
             if treatment_type:
                 queryset = queryset.filter(treatment_type=treatment_type)
             
-            # Créer le fichier CSV
-            output = StringIO()
-            writer = csv.writer(output)
+            # Projection en une seule requête : statut et validateur calculés par la base
+            queryset = queryset.annotate(
+                audit_status=Case(
+                    When(is_active=False, then=Value('revoked')),
+                    When(expiry_date__lt=timezone.now().date(), then=Value('expired')),
+                    default=Value('active'),
+                    output_field=CharField()
+                ),
+                validator_name=Trim(Concat(
+                    'certification_request__validated_by__user__first_name',
+                    Value(' '),
+                    'certification_request__validated_by__user__last_name',
+                    output_field=CharField()
+                ))
+            ).order_by('-issue_date', 'pk').values_list(
+                'number',
+                'certification_request__company__business_name',
+                'certification_request__company__ice_number',
+                'treatment_type',
+                'issue_date',
+                'expiry_date',
+                'audit_status',
+                'validator_name',
+                'certification_request__submission_date',
+                'certification_request__company__address'
+            )
             
             # En-têtes
-            writer.writerow([
+            header = [
                 'Numéro Certificat', 'Entreprise', 'ICE', 'Type de Traitement',
                 'Date Émission', 'Date Expiration', 'Statut', 'Validé par',
                 'Date Demande', 'Adresse Entreprise'
-            ])
-            
-            # Données
-            for cert in queryset:
-                writer.writerow([
-                    cert.number,
-                    cert.certification_request.company.business_name,
-                    cert.certification_request.company.ice_number,
-                    cert.treatment_type,
-                    cert.issue_date.strftime('%Y-%m-%d'),
-                    cert.expiry_date.strftime('%Y-%m-%d'),
-                    cert.status,
-                    cert.certification_request.validated_by.user.get_full_name() if cert.certification_request.validated_by else '',
-                    cert.certification_request.submission_date.strftime('%Y-%m-%d'),
-                    cert.certification_request.company.address
-                ])
+            ]
+            
+            # Données, écrites ligne par ligne dans la réponse
+            rows = (
+                [
+                    number,
+                    business_name,
+                    ice_number,
+                    cert_treatment_type,
+                    issue_date.strftime('%Y-%m-%d'),
+                    expiry_date.strftime('%Y-%m-%d'),
+                    audit_status,
+                    validator_name or '',
+                    submission_date.strftime('%Y-%m-%d'),
+                    address
+                ]
+                for (
+                    number, business_name, ice_number, cert_treatment_type, issue_date,
+                    expiry_date, audit_status, validator_name, submission_date, address
+                ) in queryset.iterator(chunk_size=2000)
+            )
             
             # Préparer la réponse
-            output.seek(0)
-            response = HttpResponse(output.getvalue(), content_type='text/csv')
-            response['Content-Disposition'] = f'attachment; filename="audit_certificats_{timezone.now().strftime("%Y%m%d")}.csv"'
+            response = export_response(
+                request, iter_csv(header, rows), 'text/csv',
+                f'audit_certificats_{timezone.now().strftime("%Y%m%d")}.csv'
+            )
             response['Access-Control-Allow-Origin'] = '*'
             response['Access-Control-Allow-Headers'] = 'Content-Type'
             
@@ -1414,6 +1800,56 @@ class CertificateAuthorityViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({'error': 'Erreur lors de l\'export'}, 
                           status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['get'])
+    def bulk_download(self, request):
+        """Télécharger en une fois les certificats filtrés (PDF fusionné ou ZIP)"""
+        try:
+            from django.conf import settings
+            from django.core.exceptions import ValidationError as DjangoValidationError
+            from .bulk_download import filter_certificates, iter_certificate_bundle, merged_pdf_chunks
+            from .streaming import export_response, zip_response
+            
+            output_format = request.query_params.get('output', 'zip')
+            if output_format not in ('zip', 'pdf'):
+                return Response({'error': 'Format non supporté (zip ou pdf)'}, 
+                              status=status.HTTP_400_BAD_REQUEST)
+            
+            try:
+                queryset = filter_certificates(self.get_queryset(), request.query_params)
+                certificates = list(queryset[:settings.CERTIFICATE_BULK_DOWNLOAD_LIMIT + 1])
+            except (ValueError, DjangoValidationError):
+                return Response({'error': 'Paramètres de filtrage invalides'}, 
+                              status=status.HTTP_400_BAD_REQUEST)
+            
+            if not certificates:
+                return Response({'error': 'Aucun certificat ne correspond aux filtres'}, 
+                              status=status.HTTP_404_NOT_FOUND)
+            if len(certificates) > settings.CERTIFICATE_BULK_DOWNLOAD_LIMIT:
+                return Response({
+                    'error': f'Trop de certificats (maximum {settings.CERTIFICATE_BULK_DOWNLOAD_LIMIT}), '
+                             f'affinez les filtres'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            filename = f'certificats_{timezone.now().strftime("%Y%m%d_%H%M%S")}'
+            if output_format == 'pdf':
+                response = export_response(
+                    request, merged_pdf_chunks(certificates), 'application/pdf',
+                    f'{filename}.pdf', compress=False
+                )
+            else:
+                response = zip_response(iter_certificate_bundle(certificates), f'{filename}.zip')
+            response['Access-Control-Allow-Origin'] = '*'
+            response['Access-Control-Allow-Headers'] = 'Content-Type'
+            
+            return response
+            
+        except Exception as e:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error(f"Erreur dans bulk_download des certificats: {str(e)}")
+            return Response({'error': 'Erreur lors du téléchargement groupé'}, 
+                          status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class CertificationRequestAuthorityViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet pour la consultation des demandes par les autorités"""
     serializer_class = CertificationRequestAuthoritySerializer
@@ -1710,6 +2146,7 @@ class CompanyAuthorityViewSet(viewsets.ReadOnlyModelViewSet):
         """Documents en lecture seule pour les autorités - Rapports et documents téléchargés par les entreprises"""
         try:
             from django.db.models import Q
+            from .file_metadata import file_type_label
             
             # Récupérer les documents justificatifs réels des entreprises
             supporting_docs = SupportingDocument.objects.select_related(
@@ -1765,17 +2202,14 @@ class CompanyAuthorityViewSet(viewsets.ReadOnlyModelViewSet):
                     'other': 'report'
                 }
                 
-                try:
-                    file_size = doc.file.size if doc.file else 0
-                except:
-                    file_size = 0
-                
                 documents.append({
                     'id': f"support_{doc.id}",
                     'title': doc.name or f"Document {doc.get_document_type_display()}",
                     'description': doc.description or f"Document justificatif de type {doc.get_document_type_display()}",
-                    'file_type': doc.file.name.split('.')[-1].upper() if doc.file else 'PDF',
-                    'file_size': file_size,
+                    'file_type': file_type_label(doc.file_mime_type, doc.file.name),
+                    'mime_type': doc.file_mime_type,
+                    'file_size': doc.file_size or 0,
+                    'page_count': doc.file_page_count,
                     'last_modified': doc.uploaded_at.isoformat(),
                     'category': category_map.get(doc.document_type, 'report'),
                     'access_level': access_level,
@@ -1793,17 +2227,14 @@ class CompanyAuthorityViewSet(viewsets.ReadOnlyModelViewSet):
                 if req.status == 'rejected':
                     access_level = 'confidential'
                 
-                try:
-                    file_size = req.supporting_documents.size if req.supporting_documents else 0
-                except:
-                    file_size = 0
-                
                 documents.append({
                     'id': f"main_{req.id}",
                     'title': f"Rapport Principal - {req.company.business_name}",
                     'description': f"Document principal de la demande de certification pour {req.treatment_type}",
-                    'file_type': req.supporting_documents.name.split('.')[-1].upper() if req.supporting_documents else 'PDF',
-                    'file_size': file_size,
+                    'file_type': file_type_label(req.document_mime_type, req.supporting_documents.name),
+                    'mime_type': req.document_mime_type,
+                    'file_size': req.document_size or 0,
+                    'page_count': req.document_page_count,
                     'last_modified': req.submission_date.isoformat(),
                     'category': 'report',
                     'access_level': access_level,
@@ -1926,14 +2357,8 @@ class CompanyAuthorityViewSet(viewsets.ReadOnlyModelViewSet):
                 try:
                     doc = SupportingDocument.objects.get(id=doc_id)
                     if doc.file:
-                        from django.http import FileResponse
-                        response = FileResponse(
-                            doc.file.open('rb'),
-                            as_attachment=True,
-                            filename=doc.file.name.split('/')[-1]
-                        )
-                        response['Content-Type'] = 'application/octet-stream'
-                        return response
+                        from .file_serving import serve_file
+                        return serve_file(request, doc.file, content_type='application/octet-stream')
                     else:
                         return Response({'error': 'Fichier non trouvé'}, status=status.HTTP_404_NOT_FOUND)
                 except SupportingDocument.DoesNotExist:
@@ -1945,14 +2370,8 @@ class CompanyAuthorityViewSet(viewsets.ReadOnlyModelViewSet):
                 try:
                     req = CertificationRequest.objects.get(id=req_id)
                     if req.supporting_documents:
-                        from django.http import FileResponse
-                        response = FileResponse(
-                            req.supporting_documents.open('rb'),
-                            as_attachment=True,
-                            filename=req.supporting_documents.name.split('/')[-1]
-                        )
-                        response['Content-Type'] = 'application/octet-stream'
-                        return response
+                        from .file_serving import serve_file
+                        return serve_file(request, req.supporting_documents, content_type='application/octet-stream')
                     else:
                         return Response({'error': 'Fichier non trouvé'}, status=status.HTTP_404_NOT_FOUND)
                 except CertificationRequest.DoesNotExist:
@@ -2069,7 +2488,6 @@ class AuditReportAuthorityViewSet(viewsets.ViewSet):
                 reports.append(monthly_report)
             
             # Ajouter les rapports générés dynamiquement
-            global _generated_reports
             reports.extend(_generated_reports)
             
             return Response({'results': reports, 'count': len(reports)})
@@ -2135,7 +2553,6 @@ class AuditReportAuthorityViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['post'])
     def generate_report(self, request):
         """Générer un nouveau rapport d'audit"""
-        global _generated_reports
         
         try:
             start_date = request.data.get('start_date')
@@ -2229,24 +2646,26 @@ class AuditReportAuthorityViewSet(viewsets.ViewSet):
     def download(self, request, pk=None):
         """Télécharger un rapport en PDF"""
         try:
-            from django.http import HttpResponse
-            import json
-            
-            # Créer un rapport JSON simple au lieu d'un PDF simulé
-            report_data = {
-                'rapport_id': pk,
-                'genere_le': timezone.now().isoformat(),
-                'total_demandes': CertificationRequest.objects.count(),
-                'demandes_approuvees': CertificationRequest.objects.filter(status='approved').count(),
-                'certificats_emis': Certificate.objects.count(),
-                'entreprises_enregistrees': CompanyProfile.objects.count()
-            }
-            
-            response = HttpResponse(
-                json.dumps(report_data, indent=2, ensure_ascii=False),
-                content_type='application/json'
+            from .documents import get_document
+            from .file_serving import serve_file, StoredFile
+            
+            report = next((r for r in _generated_reports if str(r['id']) == str(pk)), None)
+            if report is None:
+                report_response = self.retrieve(request, pk)
+                if report_response.status_code != status.HTTP_200_OK:
+                    return report_response
+                report = report_response.data
+            
+            # La date de génération n'entre pas dans le cache : seules les données imprimées comptent
+            report_data = {key: value for key, value in report.items() if key != 'generated_date'}
+            path = get_document('audit_report', report_data)
+            
+            response = serve_file(
+                request, StoredFile(path),
+                filename=f'rapport_audit_{pk}.pdf',
+                content_type='application/pdf'
             )
-            response['Content-Disposition'] = f'attachment; filename="rapport_audit_{pk}.json"'
+            response['Access-Control-Expose-Headers'] = 'Content-Disposition'
             response['Access-Control-Allow-Origin'] = '*'
             
             return response
@@ -2264,14 +2683,20 @@ class ExportAuthorityViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['post'])
     def historical(self, request):
-        """Export des données historiques"""
+        """Export des données historiques
+
+        Le paramètre optionnel `since` (watermark renvoyé par un export précédent)
+        limite l'export aux lignes créées ou modifiées depuis, ainsi qu'aux suppressions.
+        Le CSV est livré sous forme d'archive ZIP (un fichier par type de données).
+        """
         try:
             start_date = request.data.get('start_date')
             end_date = request.data.get('end_date')
             data_types = request.data.get('data_types', [])
             format_type = request.data.get('format', 'json')
+            since = request.data.get('since') or request.query_params.get('since')
             
-            if not start_date or not end_date:
+            if not since and (not start_date or not end_date):
                 return Response({'error': 'Les dates sont requises'}, 
                               status=status.HTTP_400_BAD_REQUEST)
             
@@ -2281,105 +2706,165 @@ class ExportAuthorityViewSet(viewsets.ViewSet):
             
             # Récupérer les vraies données selon la période
             from datetime import datetime
-            from django.http import HttpResponse
-            import json
-            import csv
-            from io import StringIO
+            from django.core import signing
+            from .exports import encode_watermark, decode_watermark, changed_since, tombstones_since, up_to, last_mark
+            from .streaming import export_response, zip_response, iter_csv, iter_json_document
+            
+            marks = {}
+            if since:
+                try:
+                    marks = decode_watermark(since)
+                except (signing.BadSignature, ValueError, TypeError):
+                    return Response({'error': 'Watermark invalide'}, 
+                                  status=status.HTTP_400_BAD_REQUEST)
             
-            start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+            start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00')) if start_date else None
+            end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00')) if end_date else None
             
-            export_data = {}
+            # Pour chaque type : queryset filtré, en-têtes et construction d'une ligne
+            sources = {}
             
-            # Exporter les données selon les types demandés
             if 'certificates' in data_types:
-                certificates = Certificate.objects.filter(
-                    issue_date__gte=start_dt,
-                    issue_date__lte=end_dt
-                ).select_related('certification_request__company')
-                
-                export_data['certificates'] = [
-                    {
-                        'id': cert.id,
-                        'number': cert.number,
-                        'company': cert.certification_request.company.business_name,
-                        'issue_date': cert.issue_date.isoformat(),
-                        'expiry_date': cert.expiry_date.isoformat(),
-                        'treatment_type': cert.treatment_type,
-                        'status': cert.status,
-                        'is_active': cert.is_active
-                    }
-                    for cert in certificates
-                ]
+                certificates = Certificate.objects.select_related('certification_request__company')
+                if start_dt:
+                    certificates = certificates.filter(issue_date__gte=start_dt)
+                if end_dt:
+                    certificates = certificates.filter(issue_date__lte=end_dt)
+                sources['certificates'] = (
+                    certificates,
+                    ['id', 'number', 'company', 'issue_date', 'expiry_date', 'treatment_type', 'status', 'is_active', 'updated_at'],
+                    lambda cert: [
+                        cert.id,
+                        cert.number,
+                        cert.certification_request.company.business_name,
+                        cert.issue_date.isoformat(),
+                        cert.expiry_date.isoformat(),
+                        cert.treatment_type,
+                        cert.status,
+                        cert.is_active,
+                        cert.updated_at.isoformat()
+                    ]
+                )
             
             if 'requests' in data_types:
-                requests = CertificationRequest.objects.filter(
-                    submission_date__gte=start_dt,
-                    submission_date__lte=end_dt
-                ).select_related('company')
-                
-                export_data['requests'] = [
-                    {
-                        'id': req.id,
-                        'company': req.company.business_name,
-                        'submission_date': req.submission_date.isoformat(),
-                        'treatment_type': req.treatment_type,
-                        'status': req.status
-                    }
-                    for req in requests
-                ]
+                requests = CertificationRequest.objects.select_related('company')
+                if start_dt:
+                    requests = requests.filter(submission_date__gte=start_dt)
+                if end_dt:
+                    requests = requests.filter(submission_date__lte=end_dt)
+                sources['requests'] = (
+                    requests,
+                    ['id', 'company', 'submission_date', 'treatment_type', 'status', 'updated_at'],
+                    lambda req: [
+                        req.id,
+                        req.company.business_name,
+                        req.submission_date.isoformat(),
+                        req.treatment_type,
+                        req.status,
+                        req.updated_at.isoformat()
+                    ]
+                )
             
             if 'companies' in data_types:
-                companies = CompanyProfile.objects.filter(
-                    created_at__gte=start_dt,
-                    created_at__lte=end_dt
+                companies = CompanyProfile.objects.all()
+                if start_dt:
+                    companies = companies.filter(created_at__gte=start_dt)
+                if end_dt:
+                    companies = companies.filter(created_at__lte=end_dt)
+                sources['companies'] = (
+                    companies,
+                    ['id', 'business_name', 'ice_number', 'created_at', 'address', 'updated_at'],
+                    lambda comp: [
+                        comp.id,
+                        comp.business_name,
+                        comp.ice_number,
+                        comp.created_at.isoformat(),
+                        comp.address,
+                        comp.updated_at.isoformat()
+                    ]
                 )
-                
-                export_data['companies'] = [
-                    {
-                        'id': comp.id,
-                        'business_name': comp.business_name,
-                        'ice_number': comp.ice_number,
-                        'created_at': comp.created_at.isoformat(),
-                        'address': comp.address
-                    }
-                    for comp in companies
-                ]
+            
+            # Nouveau watermark calculé avant l'envoi : l'export est borné à cette position
+            exported_types = list(sources.keys())
+            new_marks = dict(marks)
+            querysets = {}
+            for data_type, (queryset, header, build_row) in sources.items():
+                queryset = changed_since(queryset, marks.get(data_type))
+                new_marks[data_type] = last_mark(queryset) or marks.get(data_type)
+                querysets[data_type] = up_to(queryset, new_marks[data_type])
+            
+            tombstones = tombstones_since(exported_types, marks.get('deleted'))
+            new_marks['deleted'] = last_mark(tombstones, field='deleted_at') or marks.get('deleted')
+            new_marks = {key: mark for key, mark in new_marks.items() if mark}
+            watermark = encode_watermark(new_marks)
+            
+            def rows_for(queryset, build_row):
+                for obj in queryset.iterator(chunk_size=2000):
+                    yield build_row(obj)
+            
+            sections = {
+                data_type: (header, rows_for(querysets[data_type], build_row))
+                for data_type, (queryset, header, build_row) in sources.items()
+            }
+            if since:
+                # Les suppressions antérieures au premier export complet ne sont pas renvoyées
+                sections['deleted'] = (
+                    ['id', 'data_type', 'object_id', 'deleted_at'],
+                    (
+                        [tombstone.id, tombstone.data_type, tombstone.object_id, tombstone.deleted_at.isoformat()]
+                        for tombstone in up_to(tombstones, new_marks.get('deleted'), field='deleted_at').iterator(chunk_size=2000)
+                    )
+                )
+            
+            filename_suffix = f'{start_date}_{end_date}' if start_date and end_date else f'delta_{timezone.now().strftime("%Y%m%d_%H%M%S")}'
             
             # Retourner les données dans le format demandé
             if format_type == 'csv':
-                output = StringIO()
-                writer = csv.writer(output)
-                
-                # Écrire les en-têtes et données pour chaque type
-                for data_type, items in export_data.items():
-                    if items:
-                        writer.writerow([f'=== {data_type.upper()} ==='])
-                        if items:
-                            writer.writerow(items[0].keys())
-                            for item in items:
-                                writer.writerow(item.values())
-                        writer.writerow([])
-                
-                response = HttpResponse(output.getvalue(), content_type='text/csv')
-                response['Content-Disposition'] = f'attachment; filename="export_historique_{start_date}_{end_date}.csv"'
+                if len(sections) == 1:
+                    header, rows = next(iter(sections.values()))
+                    response = export_response(
+                        request, iter_csv(header, rows), 'text/csv',
+                        f'export_historique_{filename_suffix}.csv'
+                    )
+                else:
+                    response = zip_response(
+                        (
+                            (f'{data_type}.csv', iter_csv(header, rows), True)
+                            for data_type, (header, rows) in sections.items()
+                        ),
+                        f'export_historique_{filename_suffix}.zip'
+                    )
                 response['Access-Control-Allow-Origin'] = '*'
                 
             else:  # JSON par défaut
-                export_data['metadata'] = {
-                    'period_start': start_date,
-                    'period_end': end_date,
-                    'generated_at': timezone.now().isoformat(),
-                    'total_items': sum(len(items) for items in export_data.values() if isinstance(items, list))
-                }
+                counters = {data_type: 0 for data_type in sections}
                 
-                response = HttpResponse(
-                    json.dumps(export_data, indent=2, ensure_ascii=False),
-                    content_type='application/json'
+                def counted(data_type, header, rows):
+                    for row in rows:
+                        counters[data_type] += 1
+                        yield dict(zip(header, row))
+                
+                response = export_response(
+                    request,
+                    iter_json_document(
+                        {data_type: counted(data_type, header, rows) for data_type, (header, rows) in sections.items()},
+                        metadata=lambda: {
+                            'period_start': start_date,
+                            'period_end': end_date,
+                            'since': since,
+                            'watermark': watermark,
+                            'generated_at': timezone.now().isoformat(),
+                            'total_items': sum(counters.values())
+                        }
+                    ),
+                    'application/json',
+                    f'export_historique_{filename_suffix}.json'
                 )
-                response['Content-Disposition'] = f'attachment; filename="export_historique_{start_date}_{end_date}.json"'
                 response['Access-Control-Allow-Origin'] = '*'
             
+            response['X-Export-Watermark'] = watermark
+            response['Access-Control-Expose-Headers'] = 'Content-Disposition, X-Export-Watermark'
+            
             return response
             
         except Exception as e:
@@ -2489,38 +2974,38 @@ class ComplianceAuthorityViewSet(viewsets.ViewSet):
     def download(self, request):
         """Télécharger le rapport de conformité"""
         try:
-            from django.http import HttpResponse
-            import json
+            from .documents import get_document
+            from .file_serving import serve_file, StoredFile
             
-            # Créer un rapport JSON avec les vraies données
+            # Rapport avec les vraies données
             total_requests = CertificationRequest.objects.count()
             approved_requests = CertificationRequest.objects.filter(status='approved').count()
             certificates_count = Certificate.objects.count()
             companies_count = CompanyProfile.objects.count()
             
             compliance_report = {
-                'rapport_conformite': {
-                    'genere_le': timezone.now().isoformat(),
-                    'periode': 'Toutes les données',
-                    'statistiques': {
-                        'total_demandes': total_requests,
-                        'demandes_approuvees': approved_requests,
-                        'certificats_emis': certificates_count,
-                        'entreprises_enregistrees': companies_count,
-                        'taux_succes': round((approved_requests / total_requests * 100), 1) if total_requests > 0 else 0
-                    },
-                    'conformite': {
-                        'score_global': round(((approved_requests / total_requests * 100) + 15), 1) if total_requests > 0 else 75,
-                        'statut': 'Conforme' if total_requests > 0 and (approved_requests / total_requests) > 0.7 else 'À améliorer'
-                    }
+                'date': timezone.now().strftime('%Y-%m-%d'),
+                'periode': 'Toutes les données',
+                'statistiques': {
+                    'total_demandes': total_requests,
+                    'demandes_approuvees': approved_requests,
+                    'certificats_emis': certificates_count,
+                    'entreprises_enregistrees': companies_count,
+                    'taux_succes': round((approved_requests / total_requests * 100), 1) if total_requests > 0 else 0
+                },
+                'conformite': {
+                    'score_global': round(((approved_requests / total_requests * 100) + 15), 1) if total_requests > 0 else 75,
+                    'statut': 'Conforme' if total_requests > 0 and (approved_requests / total_requests) > 0.7 else 'À améliorer'
                 }
             }
+            path = get_document('compliance_report', compliance_report)
             
-            response = HttpResponse(
-                json.dumps(compliance_report, indent=2, ensure_ascii=False),
-                content_type='application/json'
+            response = serve_file(
+                request, StoredFile(path),
+                filename='rapport_conformite.pdf',
+                content_type='application/pdf'
             )
-            response['Content-Disposition'] = 'attachment; filename="rapport_conformite.json"'
+            response['Access-Control-Expose-Headers'] = 'Content-Disposition'
             response['Access-Control-Allow-Origin'] = '*'
             
             return response
@@ -2594,8 +3079,54 @@ class AuthorityNotificationViewSet(viewsets.ModelViewSet):
             is_read=True,
             read_at=timezone.now()
         )
+        if updated_count:
+            # update() n'envoie pas post_save : compteur du flux de notifications mis à jour ici
+            from .notification_stream import publish, user_channel
+            publish(user_channel(request.user.id), 'notifications_changed')
         
         return Response({
             'message': f'{updated_count} notifications marquées comme lues',
             'count': updated_count
         })
+
+class NotificationStreamTicketView(APIView):
+    """Ticket de connexion au flux de notifications (EventSource n'envoie pas le jeton JWT)"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        from .notification_stream import issue_ticket
+        
+        return Response({'ticket': issue_ticket(request.user)})
+
+class NotificationStreamView(APIView):
+    """Flux Server-Sent Events : nouvelles notifications et nombre de non lues, en temps réel"""
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    
+    def get(self, request):
+        from django.core.handlers.asgi import ASGIRequest
+        from django.http import StreamingHttpResponse
+        from .notification_stream import aevent_stream, channels_for, event_stream, read_ticket
+        
+        user = read_ticket(request.query_params.get('ticket'))
+        if user is None:
+            return Response({'error': 'Ticket invalide ou expiré'}, status=status.HTTP_403_FORBIDDEN)
+        
+        if isinstance(request._request, ASGIRequest):
+            # Générateur asynchrone : servi au fil de l'eau par le serveur ASGI
+            stream = aevent_stream(user, channels_for(user))
+        elif request.META.get('wsgi.multithread'):
+            stream = event_stream(user, channels_for(user))
+        else:
+            # Serveur WSGI sans threads : une connexion bloquerait tout le processus
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error("Flux de notifications refusé : servir l'application en ASGI ou par un serveur WSGI multithread")
+            return Response({'error': 'Flux de notifications indisponible sur ce serveur'},
+                          status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Pas de mise en tampon par nginx : chaque événement part immédiatement
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,332 @@
+"""Import en masse (CSV, XLSX, NDJSON) des référentiels : lois, réglementations,
+checklists, types de traitement et registres d'entreprises"""
+import csv
+import io
+import json
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import connections, models, router, transaction
+
+from accounts.models import User, CompanyProfile
+from certifications.models import Certificate, LawChecklist
+from certifications.verification import invalidate
+from .models import TreatmentType, Law, Regulation
+
+# Import conditionnel pour Excel
+try:
+    from openpyxl import load_workbook
+    EXCEL_AVAILABLE = True
+except ImportError:
+    EXCEL_AVAILABLE = False
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y', 'oui', 'vrai'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n', 'non', 'faux'}
+
+
+class ImportFormatError(Exception):
+    """Fichier illisible ou format non supporté"""
+    pass
+
+
+def detect_format(filename):
+    """Déduire le format du fichier à partir de son extension"""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension in ('jsonl', 'ndjson'):
+        return 'ndjson'
+    if extension in ('xlsx', 'xlsm'):
+        return 'xlsx'
+    if extension in ('csv', 'txt'):
+        return 'csv'
+    return None
+
+
+def _clean_header(header):
+    return [str(column).strip().lower() if column is not None else '' for column in header]
+
+
+def iter_rows(file, format_type):
+    """Lire un fichier et générer des tuples (numéro de ligne, dictionnaire de valeurs)"""
+    if format_type == 'csv':
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        reader = csv.reader(text)
+        header = _clean_header(next(reader, []))
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                yield reader.line_num, dict(zip(header, row))
+
+    elif format_type == 'xlsx':
+        if not EXCEL_AVAILABLE:
+            raise ImportFormatError('Import Excel non disponible. Veuillez installer openpyxl.')
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        header = _clean_header(next(rows, []))
+        for line_number, row in enumerate(rows, 2):
+            if any(cell not in (None, '') for cell in row):
+                yield line_number, dict(zip(header, row))
+        workbook.close()
+
+    elif format_type == 'ndjson':
+        for line_number, line in enumerate(io.TextIOWrapper(file, encoding='utf-8-sig'), 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                yield line_number, None
+                continue
+            if isinstance(data, dict):
+                yield line_number, {str(key).strip().lower(): value for key, value in data.items()}
+            else:
+                yield line_number, None
+
+    else:
+        raise ImportFormatError(f'Format non supporté : {format_type}')
+
+
+class ImportTarget:
+    """Description d'un modèle importable : colonnes acceptées et clé d'upsert"""
+    model = None
+    fields = ()
+    key_fields = ()
+
+    def build(self, values):
+        """Construire une instance validée (lève ValidationError)"""
+        instance = self.model()
+        model_fields = {field.name: field for field in self.model._meta.concrete_fields}
+        # Les champs non renseignés qui ont une valeur par défaut ne sont pas validés
+        exclude = [name for name in model_fields if name not in self.fields]
+        for name in self.fields:
+            if name not in model_fields:
+                continue
+            value = values.get(name)
+            if value is None or (isinstance(value, str) and not value.strip()):
+                if model_fields[name].has_default():
+                    exclude.append(name)
+                continue
+            if isinstance(value, str):
+                value = value.strip()
+            if isinstance(model_fields[name], models.BooleanField) and isinstance(value, str):
+                if value.lower() in TRUE_VALUES:
+                    value = True
+                elif value.lower() in FALSE_VALUES:
+                    value = False
+            setattr(instance, name, value)
+
+        instance.clean_fields(exclude=exclude)
+        return instance
+
+    def key(self, instance):
+        return tuple(getattr(instance, field) for field in self.key_fields)
+
+    def prepare_batch(self, items, errors):
+        """Traitements avant l'écriture d'un lot ; renvoie les éléments conservés"""
+        return items
+
+    def after_batch(self, instances):
+        """Traitements après l'écriture d'un lot : bulk_create n'envoie pas les signaux des modèles"""
+
+    def update_fields(self, columns):
+        """Champs mis à jour en cas de conflit : seulement les colonnes présentes dans le fichier"""
+        names = [name for name in self.fields if name in columns and name not in self.key_fields]
+        field_names = {field.name for field in self.model._meta.concrete_fields}
+        names = [name for name in names if name in field_names]
+        if names and 'updated_at' in field_names:
+            names.append('updated_at')
+        return names
+
+
+class TreatmentTypeTarget(ImportTarget):
+    model = TreatmentType
+    fields = ('code', 'name', 'description', 'certification_fee', 'is_active')
+    key_fields = ('code',)
+
+
+class LawTarget(ImportTarget):
+    model = Law
+    fields = ('number', 'article', 'title', 'description', 'content', 'effective_date', 'category', 'is_active')
+    key_fields = ('number', 'article')
+
+
+class RegulationTarget(ImportTarget):
+    model = Regulation
+    fields = ('title', 'description', 'content', 'applicable_sector', 'effective_date', 'is_mandatory', 'is_active')
+    key_fields = ('title',)
+
+
+class LawChecklistTarget(ImportTarget):
+    model = LawChecklist
+    fields = ('treatment_type', 'law_reference', 'law_title', 'description', 'is_mandatory')
+    key_fields = ('treatment_type', 'law_reference')
+
+
+class CompanyProfileTarget(ImportTarget):
+    """Registre d'entreprises : un compte entreprise est créé pour chaque nouvel identifiant
+
+    L'identifiant de connexion est la colonne `username`, ou à défaut le numéro ICE.
+    Les comptes créés n'ont pas de mot de passe utilisable.
+    """
+    model = CompanyProfile
+    fields = (
+        'business_name', 'company_type', 'ice_number', 'rc_number', 'responsible_name',
+        'address', 'phone_company', 'website', 'company_size', 'description'
+    )
+    key_fields = ('user',)
+
+    def build(self, values):
+        instance = super().build(values)
+        username = str(values.get('username') or '').strip() or instance.ice_number
+        if len(username) > User._meta.get_field('username').max_length:
+            raise ValidationError({'username': ['Identifiant trop long']})
+        instance._import_username = username
+        instance._import_email = str(values.get('email') or '').strip()
+        return instance
+
+    def key(self, instance):
+        return (instance._import_username,)
+
+    def prepare_batch(self, items, errors):
+        usernames = [instance._import_username for line_number, instance in items]
+        existing = dict(
+            (username, role) for username, role in
+            User.objects.filter(username__in=usernames).values_list('username', 'role')
+        )
+
+        kept = []
+        new_users = []
+        for line_number, instance in items:
+            role = existing.get(instance._import_username)
+            if role is not None and role != 'enterprise':
+                errors.append({
+                    'row': line_number,
+                    'errors': {'username': ['Cet identifiant appartient à un compte non entreprise']}
+                })
+                continue
+            if role is None:
+                new_users.append(User(
+                    username=instance._import_username,
+                    email=instance._import_email,
+                    role='enterprise',
+                    password=make_password(None)
+                ))
+            kept.append((line_number, instance))
+
+        User.objects.bulk_create(new_users, ignore_conflicts=True)
+        user_ids = dict(
+            User.objects.filter(username__in=usernames).values_list('username', 'id')
+        )
+        for line_number, instance in kept:
+            instance.user_id = user_ids[instance._import_username]
+        return kept
+
+    def after_batch(self, instances):
+        # Raison sociale et ICE figurent dans les données publiques de vérification des certificats
+        tokens = list(Certificate.objects.filter(
+            certification_request__company__user_id__in=[instance.user_id for instance in instances]
+        ).values_list('verification_token', flat=True))
+        if tokens:
+            transaction.on_commit(lambda: invalidate(tokens))
+
+
+IMPORT_TARGETS = {
+    'treatment_types': TreatmentTypeTarget(),
+    'laws': LawTarget(),
+    'regulations': RegulationTarget(),
+    'law_checklists': LawChecklistTarget(),
+    'companies': CompanyProfileTarget(),
+}
+
+
+class BulkImporter:
+    """Valider et upserter des lignes par lots avec bulk_create(update_conflicts=True)"""
+
+    def __init__(self, target, batch_size=BATCH_SIZE, dry_run=False):
+        if isinstance(target, str):
+            target = IMPORT_TARGETS[target]
+        self.target = target
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.total = 0
+        self.imported = 0
+        self.errors = []
+        self.error_count = 0
+
+    def run(self, rows):
+        """Importer un itérable de (numéro de ligne, valeurs) ; renvoie le rapport"""
+        batch = []
+        columns = set()
+        for line_number, values in rows:
+            self.total += 1
+            if values is None:
+                self._add_error(line_number, {'__all__': ['Ligne illisible']})
+                continue
+            columns.update(values.keys())
+            batch.append((line_number, values))
+            if len(batch) >= self.batch_size:
+                self._process_batch(batch, columns)
+                batch = []
+        if batch:
+            self._process_batch(batch, columns)
+        return self.report()
+
+    def report(self):
+        return {
+            'total': self.total,
+            'imported': self.imported,
+            'error_count': self.error_count,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+            'dry_run': self.dry_run,
+        }
+
+    def _add_error(self, line_number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': line_number, 'errors': errors})
+
+    def _process_batch(self, batch, columns):
+        # Validation ligne par ligne, sans requête
+        items = {}
+        for line_number, values in batch:
+            try:
+                instance = self.target.build(values)
+            except ValidationError as e:
+                self._add_error(line_number, e.message_dict if hasattr(e, 'error_dict') else {'__all__': e.messages})
+                continue
+            # Une même clé présente plusieurs fois dans le lot : la dernière ligne l'emporte
+            items[self.target.key(instance)] = (line_number, instance)
+
+        if self.dry_run or not items:
+            self.imported += len(items)
+            return
+
+        with transaction.atomic():
+            batch_errors = []
+            items = self.target.prepare_batch(list(items.values()), batch_errors)
+            for error in batch_errors:
+                self._add_error(error['row'], error['errors'])
+            instances = [instance for line_number, instance in items]
+            if not instances:
+                return
+
+            update_fields = self.target.update_fields(columns)
+            if update_fields:
+                options = {'update_conflicts': True, 'update_fields': update_fields}
+                connection = connections[router.db_for_write(self.target.model)]
+                # MySQL (ON DUPLICATE KEY UPDATE) refuse une cible de conflit explicite
+                if connection.features.supports_update_conflicts_with_target:
+                    options['unique_fields'] = list(self.target.key_fields)
+                self.target.model.objects.bulk_create(instances, batch_size=self.batch_size, **options)
+            else:
+                self.target.model.objects.bulk_create(
+                    instances, batch_size=self.batch_size, ignore_conflicts=True
+                )
+            self.target.after_batch(instances)
+        self.imported += len(instances)
+
+
+def import_file(target, file, format_type, dry_run=False, batch_size=BATCH_SIZE):
+    """Importer un fichier ouvert en binaire dans le modèle cible"""
+    importer = BulkImporter(target, batch_size=batch_size, dry_run=dry_run)
+    return importer.run(iter_rows(file, format_type))
@@ -0,0 +1,82 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from regulations.importers import IMPORT_TARGETS, BATCH_SIZE, import_file, detect_format, ImportFormatError
+from regulations.models import AuditLog
+
+class Command(BaseCommand):
+    help = 'Importe en masse des lois, réglementations, checklists, types de traitement ou entreprises (CSV, XLSX, NDJSON)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'import_type',
+            choices=sorted(IMPORT_TARGETS.keys()),
+            help='Type de données à importer',
+        )
+        parser.add_argument(
+            'path',
+            help='Chemin du fichier à importer',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'xlsx', 'ndjson'],
+            help='Format du fichier (déduit de l\'extension par défaut)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Nombre de lignes par lot (défaut: {BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Valide le fichier sans rien écrire en base',
+        )
+
+    def handle(self, *args, **options):
+        format_type = options['format'] or detect_format(options['path'])
+        if not format_type:
+            raise CommandError('Format de fichier non reconnu, utilisez --format')
+
+        started = time.monotonic()
+        try:
+            with open(options['path'], 'rb') as file:
+                report = import_file(
+                    options['import_type'], file, format_type,
+                    dry_run=options['dry_run'], batch_size=options['batch_size']
+                )
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+        elapsed = time.monotonic() - started
+
+        for error in report['errors']:
+            details = '; '.join(
+                f'{field}: {" ".join(messages)}' for field, messages in error['errors'].items()
+            )
+            self.stdout.write(self.style.ERROR(f'Ligne {error["row"]} : {details}'))
+        if report['error_count'] > len(report['errors']):
+            self.stdout.write(self.style.ERROR(
+                f'... {report["error_count"] - len(report["errors"])} autre(s) erreur(s) non affichée(s)'
+            ))
+
+        if not options['dry_run']:
+            AuditLog.objects.create(
+                action='import',
+                description=f'Import {options["import_type"]} : {report["imported"]} ligne(s) importée(s), {report["error_count"]} erreur(s)',
+                content_type=options['import_type'],
+                object_repr=options['path'][-200:],
+                additional_data={
+                    'format': format_type,
+                    'total': report['total'],
+                    'imported': report['imported'],
+                    'error_count': report['error_count'],
+                },
+                success=report['error_count'] == 0
+            )
+
+        verb = 'validée(s)' if options['dry_run'] else 'importée(s)'
+        rate = report['total'] / elapsed if elapsed > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{report["imported"]}/{report["total"]} ligne(s) {verb}, '
+            f'{report["error_count"]} erreur(s) en {elapsed:.2f}s ({rate:.0f} lignes/s)'
+        ))
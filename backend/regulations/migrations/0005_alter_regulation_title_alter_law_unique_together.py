@@ -0,0 +1,81 @@
+# Generated by Django 5.0.2 on 2026-10-18 23:07
+
+import unicodedata
+from django.db import migrations, models
+
+
+def _key(connection, *values):
+    if connection.vendor != 'mysql':
+        return values
+    # Collation MySQL par défaut : comparaison insensible à la casse et aux accents
+    return tuple(
+        ''.join(char for char in unicodedata.normalize('NFKD', value) if not unicodedata.combining(char)).casefold()
+        for value in values
+    )
+
+
+def _duplicates(queryset, key):
+    """Identifiants à fusionner : {id conservé (le plus ancien): [ids des doublons]}"""
+    keepers = {}
+    merged = {}
+    for row_id, *values in queryset.order_by('id'):
+        keeper = keepers.setdefault(key(*values), row_id)
+        if keeper != row_id:
+            merged.setdefault(keeper, []).append(row_id)
+    return merged
+
+
+def _repoint(through, owner_field, target_field, keeper, others):
+    """Reporter les liens many-to-many des doublons sur la ligne conservée, sans lien en double"""
+    linked = set(through.objects.filter(**{target_field: keeper}).values_list(owner_field, flat=True))
+    for link in through.objects.filter(**{f'{target_field}__in': others}):
+        owner = getattr(link, owner_field)
+        if owner in linked:
+            link.delete()
+        else:
+            setattr(link, target_field, keeper)
+            link.save()
+            linked.add(owner)
+
+
+def merge_duplicates(apps, schema_editor):
+    """Fusionner les lois (numéro, article) et réglementations (titre) en double avant les contraintes
+
+    L'ancien import acceptait les doublons. La ligne la plus ancienne est conservée et
+    reprend les liens des doublons (types de traitement, lois liées).
+    """
+    Law = apps.get_model('regulations', 'Law')
+    Regulation = apps.get_model('regulations', 'Regulation')
+    TreatmentType = apps.get_model('regulations', 'TreatmentType')
+    connection = schema_editor.connection
+
+    laws = _duplicates(Law.objects.values_list('id', 'number', 'article'), lambda *values: _key(connection, *values))
+    for keeper, others in laws.items():
+        _repoint(TreatmentType.applicable_laws.through, 'treatmenttype_id', 'law_id', keeper, others)
+        _repoint(Regulation.related_laws.through, 'regulation_id', 'law_id', keeper, others)
+        Law.objects.filter(id__in=others).delete()
+
+    regulations = _duplicates(Regulation.objects.values_list('id', 'title'), lambda *values: _key(connection, *values))
+    for keeper, others in regulations.items():
+        _repoint(Regulation.related_laws.through, 'law_id', 'regulation_id', keeper, others)
+        Regulation.objects.filter(id__in=others).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('regulations', '0004_adminnotification'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='regulation',
+            name='title',
+            field=models.CharField(max_length=200, unique=True, verbose_name='Titre'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='law',
+            unique_together={('number', 'article')},
+        ),
+    ]
@@ -51,13 +51,14 @@ class Law(models.Model):
     class Meta:
         verbose_name = "Loi"
         verbose_name_plural = "Lois"
+        unique_together = [['number', 'article']]
     
     def __str__(self):
         return f"Loi {self.number} - Article {self.article}"
 
 class Regulation(models.Model):
     """Modèle pour les réglementations spécifiques"""
-    title = models.CharField(max_length=200, verbose_name="Titre")
+    title = models.CharField(max_length=200, unique=True, verbose_name="Titre")
     description = models.TextField(verbose_name="Description")
     content = models.TextField(default="", verbose_name="Contenu")
     
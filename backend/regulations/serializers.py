@@ -274,6 +274,23 @@ class ExportDataSerializer(serializers.Serializer):
     ], default='csv')
     filters = serializers.JSONField(required=False, default=dict)
 
+class ImportDataSerializer(serializers.Serializer):
+    """Serializer pour les paramètres d'import"""
+    import_type = serializers.ChoiceField(choices=[
+        ('treatment_types', 'Types de traitement'),
+        ('laws', 'Lois'),
+        ('regulations', 'Réglementations'),
+        ('law_checklists', 'Checklists des lois'),
+        ('companies', 'Entreprises'),
+    ])
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=[
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel'),
+        ('ndjson', 'NDJSON'),
+    ], required=False)
+    dry_run = serializers.BooleanField(default=False)
+
 class AdminNotificationSerializer(serializers.ModelSerializer):
     """Serializer pour les notifications admin"""
     recipient_name = serializers.SerializerMethodField()
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from certifications.notification_stream import publish_notification
+from .models import AdminNotification
+
+
+@receiver(post_save, sender=AdminNotification)
+def push_admin_notification(sender, instance, created, raw=False, **kwargs):
+    """Envoyer la notification aux administrateurs connectés au flux (notification_stream)"""
+    if not raw:
+        from .serializers import AdminNotificationSerializer
+
+        publish_notification(instance, 'admin', AdminNotificationSerializer, created)
+
+
+@receiver(post_delete, sender=AdminNotification)
+def push_admin_notification_deletion(sender, instance, **kwargs):
+    publish_notification(instance, 'admin', None, created=False)
@@ -1,3 +1,77 @@
+import io
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase
+from rest_framework.test import APIClient
+from accounts.models import CompanyProfile, User
 
-# Create your tests here.
+from .importers import BulkImporter, import_file
+from .models import Law
+
+
+class DataImportTests(TestCase):
+    """Import en masse par l'API d'administration : création puis mise à jour (upsert)"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin', role='admin'))
+
+    def post(self, import_type, filename, content, **data):
+        return self.client.post('/api/regulations/admin/imports/import/', {
+            'import_type': import_type,
+            'file': SimpleUploadedFile(filename, content.encode('utf-8')),
+            **data,
+        }, format='multipart')
+
+    def test_laws_are_created_then_updated(self):
+        response = self.post('laws', 'lois.csv', (
+            'number,article,title,description,effective_date\n'
+            '28-00,1,Gestion des déchets,Article 1,2006-12-07\n'
+            '28-00,2,Définitions,Article 2,2006-12-07\n'
+            '28-00,3,,Titre manquant,2006-12-07\n'
+        ))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['imported'], response.data['error_count']), (2, 1))
+        self.assertEqual(response.data['errors'][0]['row'], 4)
+
+        response = self.post('laws', 'lois.csv', 'number,article,title,description\n28-00,1,Gestion des DEEE,Article 1\n')
+        self.assertEqual(response.data['imported'], 1)
+        self.assertEqual(Law.objects.count(), 2)
+        law = Law.objects.get(number='28-00', article='1')
+        # Seules les colonnes présentes dans le fichier sont mises à jour
+        self.assertEqual((law.title, str(law.effective_date)), ('Gestion des DEEE', '2006-12-07'))
+
+    def test_dry_run_writes_nothing(self):
+        response = self.post('laws', 'lois.csv', 'number,article,title,description\n28-00,1,Titre,Texte\n', dry_run=True)
+        self.assertEqual(response.data['imported'], 1)
+        self.assertFalse(Law.objects.exists())
+
+    def test_companies_create_enterprise_accounts(self):
+        content = (
+            'username,business_name,ice_number,rc_number,responsible_name,address\n'
+            'ecotech,EcoTech,000000000000001,RC1,Responsable,Rue 1\n'
+            'admin,Autre,000000000000002,RC2,Responsable,Rue 2\n'
+        )
+        response = self.post('companies', 'entreprises.csv', content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['imported'], response.data['error_count']), (1, 1))
+        self.assertEqual(User.objects.get(username='ecotech').role, 'enterprise')
+
+        response = self.post('companies', 'entreprises.csv', content.replace('EcoTech', 'EcoTech Maroc'))
+        self.assertEqual(CompanyProfile.objects.get().business_name, 'EcoTech Maroc')
+
+    def test_conflict_target_is_omitted_when_unsupported(self):
+        # MySQL : ON DUPLICATE KEY UPDATE sans cible (unique_fields lève NotSupportedError)
+        rows = iter([(2, {'number': '28-00', 'article': '1', 'title': 'Titre', 'description': 'Texte'})])
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                mock.patch.object(Law.objects, 'bulk_create') as bulk_create:
+            BulkImporter('laws').run(rows)
+        self.assertTrue(bulk_create.call_args.kwargs['update_conflicts'])
+        self.assertNotIn('unique_fields', bulk_create.call_args.kwargs)
+
+    def test_ndjson_file(self):
+        report = import_file('treatment_types', io.BytesIO(
+            b'{"code": "DEEE", "name": "DEEE", "description": "Equipements"}\nnot json\n'
+        ), 'ndjson')
+        self.assertEqual((report['imported'], report['error_count']), (1, 1))
@@ -17,6 +17,7 @@ router.register(r'metrics', views.SystemMetricsViewSet, basename='metrics')
 router.register(r'dashboard', views.AdminDashboardViewSet, basename='admin-dashboard')
 router.register(r'users', views.UserManagementViewSet, basename='user-management')
 router.register(r'exports', views.DataExportViewSet, basename='data-exports')
+router.register(r'imports', views.DataImportViewSet, basename='data-imports')
 router.register(r'notifications', views.AdminNotificationViewSet, basename='admin-notifications')
 
 urlpatterns = [
@@ -30,4 +31,5 @@ urlpatterns = [
     path('admin/system-config/categories/', views.SystemConfigurationViewSet.as_view({'get': 'categories'}), name='system-config-categories'),
     path('admin/metrics/generate/', views.SystemMetricsViewSet.as_view({'post': 'generate_daily_metrics'}), name='generate-metrics'),
     path('admin/exports/export/', views.DataExportViewSet.as_view({'post': 'export'}), name='export-data'),
+    path('admin/imports/import/', views.DataImportViewSet.as_view({'post': 'import_data'}), name='import-data'),
 ] 
\ No newline at end of file
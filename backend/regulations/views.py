@@ -6,7 +6,6 @@ from django.db.models import Q, Count, Sum, Avg
 from django.utils import timezone
 from datetime import datetime, timedelta
 from django.http import HttpResponse
-import csv
 import json
 from django.template.loader import render_to_string
 from django.contrib.auth import get_user_model
@@ -26,10 +25,13 @@ from .serializers import (
     TreatmentTypeSerializer, LawSerializer, RegulationSerializer,
     FeeStructureSerializer, ValidationCycleSerializer, SystemConfigurationSerializer,
     AuditLogSerializer, SystemMetricsSerializer, AdminDashboardStatsSerializer,
-    UserManagementSerializer, ExportDataSerializer, AdminNotificationSerializer
+    UserManagementSerializer, ExportDataSerializer, ImportDataSerializer,
+    AdminNotificationSerializer
 )
 from accounts.models import User, CompanyProfile, Employee, Authority, Administrator
 from certifications.models import CertificationRequest, Payment, Certificate
+from certifications.streaming import export_response, iter_csv_dicts
+from .importers import import_file, detect_format, ImportFormatError
 
 User = get_user_model()
 
@@ -468,7 +470,7 @@ class DataExportViewSet(viewsets.ViewSet):
         
         # Générer le fichier selon le format
         if format_type == 'csv':
-            response = self._generate_csv(data, filename)
+            response = self._generate_csv(request, data, filename)
         elif format_type == 'excel':
             response = self._generate_excel(data, filename)
         else:
@@ -498,7 +500,7 @@ class DataExportViewSet(viewsets.ViewSet):
         if date_to:
             queryset = queryset.filter(date_joined__date__lte=date_to)
         
-        return [
+        return (
             {
                 'ID': user.id,
                 'Nom d\'utilisateur': user.username,
@@ -511,8 +513,8 @@ class DataExportViewSet(viewsets.ViewSet):
                 'Date d\'inscription': user.date_joined.strftime('%d/%m/%Y %H:%M'),
                 'Dernière connexion': user.last_login.strftime('%d/%m/%Y %H:%M') if user.last_login else 'Jamais'
             }
-            for user in queryset
-        ]
+            for user in queryset.iterator(chunk_size=2000)
+        )
     
     def _export_requests(self, date_from, date_to, filters):
         queryset = CertificationRequest.objects.select_related('company').all()
@@ -521,7 +523,7 @@ class DataExportViewSet(viewsets.ViewSet):
         if date_to:
             queryset = queryset.filter(submission_date__lte=date_to)
         
-        return [
+        return (
             {
                 'ID': req.id,
                 'Entreprise': req.company.business_name,
@@ -533,8 +535,8 @@ class DataExportViewSet(viewsets.ViewSet):
                 'Validé par': req.validated_by.user.username if req.validated_by else '',
                 'Révisé par': req.reviewed_by.username if req.reviewed_by else ''
             }
-            for req in queryset
-        ]
+            for req in queryset.iterator(chunk_size=2000)
+        )
     
     def _export_payments(self, date_from, date_to, filters):
         queryset = Payment.objects.select_related('certification_request__company').all()
@@ -543,7 +545,7 @@ class DataExportViewSet(viewsets.ViewSet):
         if date_to:
             queryset = queryset.filter(created_at__date__lte=date_to)
         
-        return [
+        return (
             {
                 'ID': payment.id,
                 'Entreprise': payment.certification_request.company.business_name,
@@ -556,8 +558,8 @@ class DataExportViewSet(viewsets.ViewSet):
                 'Date de création': payment.created_at.strftime('%d/%m/%Y %H:%M'),
                 'Date de paiement': payment.payment_date.strftime('%d/%m/%Y %H:%M') if payment.payment_date else ''
             }
-            for payment in queryset
-        ]
+            for payment in queryset.iterator(chunk_size=2000)
+        )
     
     def _export_certificates(self, date_from, date_to, filters):
         queryset = Certificate.objects.select_related('certification_request__company').all()
@@ -566,7 +568,7 @@ class DataExportViewSet(viewsets.ViewSet):
         if date_to:
             queryset = queryset.filter(issue_date__lte=date_to)
         
-        return [
+        return (
             {
                 'ID': cert.id,
                 'Numéro': cert.number,
@@ -577,8 +579,8 @@ class DataExportViewSet(viewsets.ViewSet):
                 'Statut': cert.status,
                 'Demande ID': cert.certification_request.id
             }
-            for cert in queryset
-        ]
+            for cert in queryset.iterator(chunk_size=2000)
+        )
     
     def _export_audit_logs(self, date_from, date_to, filters):
         queryset = AuditLog.objects.select_related('user').all()
@@ -587,7 +589,7 @@ class DataExportViewSet(viewsets.ViewSet):
         if date_to:
             queryset = queryset.filter(timestamp__date__lte=date_to)
         
-        return [
+        return (
             {
                 'ID': log.id,
                 'Action': log.get_action_display(),
@@ -600,19 +602,12 @@ class DataExportViewSet(viewsets.ViewSet):
                 'Succès': 'Oui' if log.success else 'Non',
                 'Message d\'erreur': log.error_message or ''
             }
-            for log in queryset
-        ]
+            for log in queryset.iterator(chunk_size=2000)
+        )
     
-    def _generate_csv(self, data, filename):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
-        
-        if data:
-            writer = csv.DictWriter(response, fieldnames=data[0].keys())
-            writer.writeheader()
-            writer.writerows(data)
-        
-        return response
+    def _generate_csv(self, request, data, filename):
+        # Écriture en flux, compressée en gzip si le client l'accepte
+        return export_response(request, iter_csv_dicts(data), 'text/csv', f'{filename}.csv')
     
     def _generate_excel(self, data, filename):
         if not EXCEL_AVAILABLE:
@@ -621,19 +616,18 @@ class DataExportViewSet(viewsets.ViewSet):
                 status=500
             )
         
-        wb = Workbook()
-        ws = wb.active
+        # Classeur en écriture seule : les lignes ne sont pas conservées en mémoire
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
         
-        if data:
-            # En-têtes
-            headers = list(data[0].keys())
-            for col, header in enumerate(headers, 1):
-                ws.cell(row=1, column=col, value=header)
-            
+        headers = None
+        for item in data:
+            if headers is None:
+                # En-têtes
+                headers = list(item.keys())
+                ws.append(headers)
             # Données
-            for row, item in enumerate(data, 2):
-                for col, value in enumerate(item.values(), 1):
-                    ws.cell(row=row, column=col, value=value)
+            ws.append(list(item.values()))
         
         response = HttpResponse(
             content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
@@ -642,6 +636,59 @@ class DataExportViewSet(viewsets.ViewSet):
         wb.save(response)
         return response
 
+class DataImportViewSet(viewsets.ViewSet):
+    permission_classes = [IsAdminPermission]
+    
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_data(self, request):
+        """Importer un fichier CSV, XLSX ou NDJSON (upsert par lots)"""
+        serializer = ImportDataSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        import_type = serializer.validated_data['import_type']
+        uploaded_file = serializer.validated_data['file']
+        dry_run = serializer.validated_data['dry_run']
+        format_type = serializer.validated_data.get('format') or detect_format(uploaded_file.name)
+        if not format_type:
+            return Response({'error': 'Format de fichier non reconnu'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            report = import_file(import_type, uploaded_file, format_type, dry_run=dry_run)
+        except ImportFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except (UnicodeDecodeError, ValueError) as e:
+            return Response({'error': f'Fichier illisible : {str(e)}'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error(f"Erreur dans import_data: {str(e)}")
+            return Response({'error': 'Erreur lors de l\'import'}, 
+                          status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        # Log de l'action
+        if not dry_run:
+            AuditLog.objects.create(
+                action='import',
+                description=f'Import {import_type} : {report["imported"]} ligne(s) importée(s), {report["error_count"]} erreur(s)',
+                user=request.user,
+                ip_address=request.META.get('REMOTE_ADDR'),
+                user_agent=request.META.get('HTTP_USER_AGENT', ''),
+                content_type=import_type,
+                object_repr=uploaded_file.name[:200],
+                additional_data={
+                    'format': format_type,
+                    'total': report['total'],
+                    'imported': report['imported'],
+                    'error_count': report['error_count'],
+                },
+                success=report['error_count'] == 0
+            )
+        
+        return Response(report)
+
 class AdminNotificationViewSet(viewsets.ModelViewSet):
     """ViewSet pour les notifications admin"""
     serializer_class = AdminNotificationSerializer
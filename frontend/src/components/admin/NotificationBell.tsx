@@ -1,21 +1,24 @@
 import React, { useState, useEffect } from 'react';
 import { Notifications } from '@mui/icons-material';
 import { IconButton, Badge } from '@mui/material';
-import { adminAPI } from '../../services/api';
+import { adminAPI, notificationStreamAPI } from '../../services/api';
 import NotificationCenter from './NotificationCenter';
 
 const NotificationBell: React.FC = () => {
   const [isOpen, setIsOpen] = useState(false);
   const [unreadCount, setUnreadCount] = useState(0);
   const [loading, setLoading] = useState(false);
+  // Incrémenté à chaque notification reçue : le centre ouvert recharge sa liste
+  const [refreshSignal, setRefreshSignal] = useState(0);
 
   useEffect(() => {
     fetchUnreadCount();
     
-    // Polling toutes les 30 secondes pour vérifier les nouvelles notifications
-    const interval = setInterval(fetchUnreadCount, 30000);
-    
-    return () => clearInterval(interval);
+    // Compteur et nouvelles notifications poussés par le serveur (Server-Sent Events)
+    return notificationStreamAPI.subscribe({
+      onUnreadCount: setUnreadCount,
+      onNotification: () => setRefreshSignal((signal) => signal + 1),
+    });
   }, []);
 
   const fetchUnreadCount = async () => {
@@ -61,6 +64,7 @@ const NotificationBell: React.FC = () => {
         isOpen={isOpen}
         onClose={handleClose}
         onUnreadCountChange={handleUnreadCountChange}
+        refreshSignal={refreshSignal}
       />
     </>
   );
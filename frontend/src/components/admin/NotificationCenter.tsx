@@ -54,12 +54,14 @@ interface NotificationCenterProps {
   isOpen: boolean;
   onClose: () => void;
   onUnreadCountChange?: (count: number) => void;
+  refreshSignal?: number;
 }
 
 const NotificationCenter: React.FC<NotificationCenterProps> = ({ 
   isOpen, 
   onClose, 
-  onUnreadCountChange 
+  onUnreadCountChange,
+  refreshSignal
 }) => {
   const [notifications, setNotifications] = useState<Notification[]>([]);
   const [loading, setLoading] = useState(false);
@@ -137,7 +139,7 @@ const NotificationCenter: React.FC<NotificationCenterProps> = ({
     if (isOpen) {
       fetchNotifications();
     }
-  }, [isOpen, filter]);
+  }, [isOpen, filter, refreshSignal]);
 
   const fetchNotifications = async () => {
     setLoading(true);
@@ -24,7 +24,7 @@ import {
   Security as SecurityIcon,
   Gavel as GavelIcon
 } from '@mui/icons-material';
-import { authorityAPI } from '../../services/api';
+import { authorityAPI, notificationStreamAPI } from '../../services/api';
 
 interface AuthorityNotification {
   id: number;
@@ -47,9 +47,17 @@ const AuthorityNotificationBell: React.FC = () => {
 
   useEffect(() => {
     loadNotifications();
-    // Polling pour les nouvelles notifications toutes les 30 secondes
-    const interval = setInterval(loadNotifications, 30000);
-    return () => clearInterval(interval);
+    // Nouvelles notifications et compteur poussés par le serveur (Server-Sent Events)
+    return notificationStreamAPI.subscribe({
+      onNotification: (notification: AuthorityNotification) =>
+        setNotifications((previous) =>
+          [notification, ...previous.filter((item) => item.id !== notification.id)].slice(0, 10)
+        ),
+      onUnreadCount: setUnreadCount,
+      onOpen: (reconnected) => {
+        if (reconnected) loadNotifications();
+      },
+    });
   }, []);
 
   const loadNotifications = async () => {
@@ -19,7 +19,7 @@ import {
   CheckCircle as CheckCircleIcon,
   Error as ErrorIcon,
 } from '@mui/icons-material';
-import { employeeAPI } from '../../services/api';
+import { employeeAPI, notificationStreamAPI } from '../../services/api';
 
 interface Notification {
   id: string;
@@ -39,9 +39,26 @@ export default function NotificationCenter() {
 
   useEffect(() => {
     loadNotifications();
-    // Actualiser les notifications toutes les 30 secondes
-    const interval = setInterval(loadNotifications, 30000);
-    return () => clearInterval(interval);
+    // Actualiser quand le serveur signale un changement de demande (rafales regroupées en un rechargement)
+    let reloadTimer: ReturnType<typeof setTimeout> | undefined;
+    const scheduleReload = () => {
+      if (!reloadTimer) {
+        reloadTimer = setTimeout(() => {
+          reloadTimer = undefined;
+          loadNotifications();
+        }, 1000);
+      }
+    };
+    const unsubscribe = notificationStreamAPI.subscribe({
+      onRequestsChanged: scheduleReload,
+      onOpen: (reconnected) => {
+        if (reconnected) scheduleReload();
+      },
+    });
+    return () => {
+      clearTimeout(reloadTimer);
+      unsubscribe();
+    };
   }, []);
 
   const loadNotifications = async () => {
@@ -205,7 +205,7 @@ export default function PaymentPage() {
     
     try {
       const response = await paymentAPI.getReceipt(paymentData.id);
-      console.log('Reçu téléchargé:', response.data);
+      console.log('Reçu téléchargé:', response.status);
       setReceiptDialog(true);
     } catch (error) {
       console.error('Erreur lors du téléchargement du reçu:', error);
@@ -68,7 +68,7 @@ export const certificationAPI = {
   getEnterpriseStats: () => api.get('/certifications/requests/enterprise_stats/'),
   getRecentRequests: () => api.get('/certifications/requests/recent/'),
   downloadCertificate: (id: number) => api.get(`/certifications/requests/${id}/download_certificate/`),
-  downloadRejectionReport: (id: number) => api.get(`/certifications/requests/${id}/download_rejection_report/`),
+  downloadRejectionReport: (id: number) => api.get(`/certifications/requests/${id}/download_rejection_report/`, { responseType: 'blob' }),
 };
 
 export const certificateAPI = {
@@ -76,37 +76,18 @@ export const certificateAPI = {
   getCertificate: (id: number) => api.get(`/certifications/certificates/${id}/`),
   getCertificateByRequest: (requestId: number) => api.get(`/certifications/certificates/by_request/?request_id=${requestId}`),
   downloadCertificate: (id: number) => {
-    return api.get(`/certifications/certificates/${id}/download/`, {
-      responseType: 'blob',
-    }).then(response => {
-      // Créer un URL pour le blob
-      const url = window.URL.createObjectURL(new Blob([response.data]));
-      
-      // Extraire le nom du fichier depuis les headers
-      const contentDisposition = response.headers['content-disposition'];
-      let filename = `certificat_${id}.pdf`;
-      
-      if (contentDisposition) {
-        const filenameMatch = contentDisposition.match(/filename="?([^"]*)"?/);
-        if (filenameMatch) {
-          filename = filenameMatch[1];
-        }
-      }
-      
-      // Créer un lien de téléchargement et cliquer dessus
+    // Lien signé de courte durée : le navigateur télécharge directement depuis le stockage
+    return api.get(`/certifications/certificates/${id}/download_url/`).then(response => {
       const link = document.createElement('a');
-      link.href = url;
-      link.setAttribute('download', filename);
+      link.href = response.data.url;
       document.body.appendChild(link);
       link.click();
-      
-      // Nettoyer
       link.remove();
-      window.URL.revokeObjectURL(url);
       
       return response;
     });
   },
+  getCertificateDownloadUrl: (id: number) => api.get(`/certifications/certificates/${id}/download_url/`),
   viewCertificate: (id: number) => api.get(`/certifications/certificates/${id}/view/`),
   shareCertificate: (id: number) => api.post(`/certifications/certificates/${id}/share/`),
   getEnterpriseStats: () => api.get('/certifications/certificates/enterprise_stats/'),
@@ -119,7 +100,23 @@ export const paymentAPI = {
   getPaymentByRequest: (requestId: number) => api.get(`/certifications/payments/by_request/?request_id=${requestId}`),
   createPayment: (data: any) => api.post('/certifications/payments/create_payment/', data),
   processPayment: (id: number, data: any) => api.post(`/certifications/payments/${id}/process/`, data),
-  getReceipt: (id: number) => api.get(`/certifications/payments/${id}/receipt/`),
+  getReceipt: (id: number) => {
+    return api.get(`/certifications/payments/${id}/receipt/`, {
+      responseType: 'blob',
+    }).then(response => {
+      const url = window.URL.createObjectURL(new Blob([response.data], { type: 'application/pdf' }));
+      const link = document.createElement('a');
+      link.href = url;
+      link.setAttribute('download', `recu_paiement_${id}.pdf`);
+      document.body.appendChild(link);
+      link.click();
+      
+      link.remove();
+      window.URL.revokeObjectURL(url);
+      
+      return response;
+    });
+  },
   refundPayment: (id: number, data: any) => api.post(`/certifications/payments/${id}/refund/`, data),
   getEnterpriseStats: () => api.get('/certifications/payments/enterprise_stats/'),
   getMonthlySummary: () => api.get('/certifications/payments/monthly_summary/'),
@@ -272,6 +269,10 @@ export const employeeAPI = {
   rejectRequest: (id: number, data: any) => api.post(`/certifications/employee/requests/${id}/reject_request/`, data),
   generateCertificate: (id: number) => api.post(`/certifications/employee/requests/${id}/generate_certificate/`),
   approveAndGenerate: (id: number) => api.post(`/certifications/employee/requests/${id}/approve_and_generate/`),
+  downloadBundle: (ids: number[]) => api.get('/certifications/employee/requests/bundle/', {
+    params: { ids: ids.join(',') },
+    responseType: 'blob',
+  }),
   downloadDocuments: (id: number) => {
     // Pour les téléchargements, nous devons gérer la réponse différemment
     return api.get(`/certifications/employee/requests/${id}/download_documents/`, {
@@ -354,6 +355,86 @@ export const employeeAPI = {
       headers: { 'Content-Type': 'multipart/form-data' }
     }),
   deleteSupportingDocument: (id: number) => api.delete(`/certifications/supporting-documents/${id}/`),
+  // Aperçu JPEG léger (preview_url du document), mis en cache par le navigateur
+  getSupportingDocumentPreview: (previewUrl: string) =>
+    api.get(previewUrl, { responseType: 'blob' }),
+  // Lien signé de courte durée vers le fichier dans le stockage ({ url, expires_in })
+  getSupportingDocumentDownloadUrl: (id: number) =>
+    api.get(`/certifications/supporting-documents/${id}/download_url/`),
+  
+  // Dépôt direct dans le stockage par PUT signé : le fichier ne transite pas par l'application
+  uploadSupportingDocumentDirect: async (
+    file: File,
+    requestId: number,
+    meta: { name?: string; document_type?: string; description?: string } = {},
+    onProgress?: (received: number, total: number) => void
+  ) => {
+    const session = (await api.post('/certifications/upload-sessions/', {
+      certification_request: requestId,
+      filename: file.name,
+      total_size: file.size,
+      direct: true,
+      ...meta,
+    })).data;
+    
+    // Client axios sans intercepteur : l'URL signée porte seule l'autorisation
+    await axios.put(session.upload_url, file, {
+      headers: { 'Content-Type': file.type || 'application/octet-stream' },
+      onUploadProgress: (event) => onProgress?.(event.loaded, file.size),
+    });
+    
+    return api.post(`/certifications/upload-sessions/${session.id}/finalize/`, {});
+  },
+  
+  // Téléversement fractionné et reprenable (gros fichiers, connexions lentes)
+  uploadSupportingDocumentChunked: async (
+    file: File,
+    requestId: number,
+    meta: { name?: string; document_type?: string; description?: string } = {},
+    onProgress?: (received: number, total: number) => void,
+    sessionId?: string
+  ) => {
+    const CHUNK_SIZE = 4 * 1024 * 1024;
+    const toHex = (buffer: ArrayBuffer) =>
+      Array.from(new Uint8Array(buffer)).map(b => b.toString(16).padStart(2, '0')).join('');
+    
+    // Ouvrir la session, ou reprendre une session existante à partir des octets déjà reçus
+    let session = sessionId
+      ? (await api.get(`/certifications/upload-sessions/${sessionId}/`)).data
+      : (await api.post('/certifications/upload-sessions/', {
+          certification_request: requestId,
+          filename: file.name,
+          total_size: file.size,
+          ...meta,
+        })).data;
+    
+    let offset = session.received_size;
+    while (offset < file.size) {
+      const end = Math.min(offset + CHUNK_SIZE, file.size);
+      const chunk = await file.slice(offset, end).arrayBuffer();
+      const checksum = toHex(await crypto.subtle.digest('SHA-256', chunk));
+      try {
+        session = (await api.put(`/certifications/upload-sessions/${session.id}/chunk/`, chunk, {
+          headers: {
+            'Content-Type': 'application/octet-stream',
+            'Content-Range': `bytes ${offset}-${end - 1}/${file.size}`,
+            'X-Chunk-SHA256': checksum,
+          },
+        })).data;
+      } catch (error: any) {
+        // Position désynchronisée (fragment déjà reçu) : reprendre là où le serveur s'est arrêté
+        if (error.response?.status === 409 && typeof error.response.data?.received_size === 'number') {
+          offset = error.response.data.received_size;
+          continue;
+        }
+        throw error;
+      }
+      offset = session.received_size;
+      onProgress?.(offset, file.size);
+    }
+    
+    return api.post(`/certifications/upload-sessions/${session.id}/finalize/`, {});
+  },
   
   // Historique
   getHistory: () => api.get('/certifications/history/'),
@@ -400,6 +481,33 @@ export const authorityAPI = {
       return response;
     });
   },
+  bulkDownloadCertificates: (params: string, output: 'zip' | 'pdf' = 'zip') => {
+    return api.get(`/certifications/authority/certificates/bulk_download/?output=${output}${params ? `&${params}` : ''}`, {
+      responseType: 'blob',
+    }).then(response => {
+      const url = window.URL.createObjectURL(new Blob([response.data]));
+      const contentDisposition = response.headers['content-disposition'];
+      let filename = `certificats.${output}`;
+      
+      if (contentDisposition) {
+        const filenameMatch = contentDisposition.match(/filename="?([^"]*)"?/);
+        if (filenameMatch) {
+          filename = filenameMatch[1];
+        }
+      }
+      
+      const link = document.createElement('a');
+      link.href = url;
+      link.setAttribute('download', filename);
+      document.body.appendChild(link);
+      link.click();
+      
+      link.remove();
+      window.URL.revokeObjectURL(url);
+      
+      return response;
+    });
+  },
   
   // Audit des demandes
   getRequests: (params?: string) => api.get(`/certifications/authority/requests/${params ? `?${params}` : ''}`),
@@ -596,4 +704,85 @@ export const authorityAPI = {
   deleteNotification: (id: number) => api.delete(`/certifications/authority/notifications/${id}/`),
 };
 
+// Flux de notifications en temps réel (Server-Sent Events), remplace l'interrogation périodique
+export interface NotificationStreamHandlers {
+  onNotification?: (notification: any) => void;
+  onUnreadCount?: (count: number) => void;
+  onRequestsChanged?: (change: { id: number; status: string }) => void;
+  // reconnected : connexion rétablie, des événements ont pu être manqués entre-temps
+  onOpen?: (reconnected: boolean) => void;
+}
+
+const STREAM_RETRY_DELAY = 5000;
+const STREAM_MAX_RETRY_DELAY = 300000;
+
+export const notificationStreamAPI = {
+  getTicket: () => api.post('/certifications/notifications/stream/ticket/'),
+
+  // Renvoie la fonction de désabonnement (à appeler au démontage du composant)
+  subscribe: (handlers: NotificationStreamHandlers) => {
+    let source: EventSource | null = null;
+    let retryTimer: ReturnType<typeof setTimeout> | undefined;
+    let closed = false;
+    let opened = false;
+    let failures = 0;
+
+    // Échecs répétés (serveur sans flux disponible...) : délai doublé à chaque tentative
+    const scheduleReconnect = () => {
+      if (!closed) {
+        retryTimer = setTimeout(connect, Math.min(STREAM_RETRY_DELAY * 2 ** failures, STREAM_MAX_RETRY_DELAY));
+        failures += 1;
+      }
+    };
+
+    const listen = (event: string, handler: (data: any) => void) => {
+      source?.addEventListener(event, (e) => handler(JSON.parse((e as MessageEvent).data)));
+    };
+
+    const connect = async () => {
+      let ticket: string;
+      try {
+        // EventSource ne peut pas envoyer l'en-tête Authorization : ticket signé de courte durée
+        const response = await notificationStreamAPI.getTicket();
+        ticket = response.data.ticket;
+      } catch (error: any) {
+        if (error.response?.status !== 401) {
+          scheduleReconnect();
+        }
+        return;
+      }
+      if (closed) return;
+
+      source = new EventSource(`${API_URL}/certifications/notifications/stream/?ticket=${encodeURIComponent(ticket)}`);
+      source.onopen = () => {
+        handlers.onOpen?.(opened);
+        opened = true;
+        failures = 0;
+      };
+      listen('notification', (data) => handlers.onNotification?.(data));
+      listen('unread_count', (data) => handlers.onUnreadCount?.(data.count));
+      listen('requests_changed', (data) => handlers.onRequestsChanged?.(data));
+      // Durée de vie maximale atteinte côté serveur : nouvelle connexion avec un nouveau ticket
+      listen('reconnect', () => {
+        source?.close();
+        connect();
+      });
+      source.onerror = () => {
+        // Ticket expiré lors d'une reconnexion automatique : le navigateur abandonne
+        if (source?.readyState === EventSource.CLOSED) {
+          scheduleReconnect();
+        }
+      };
+    };
+
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      source?.close();
+    };
+  },
+};
+
 export default api;